@@ -1,26 +1,111 @@
 import streamlit as st
-from dotenv import load_dotenv
-import os, json, tempfile
+import os, io, json, tempfile
 
 from modules.input_processor import handle_input
-from modules.summarizer import summarize_text
-from modules.qa_engine import ask_question
-from modules.vocab_helper import extract_key_terms, get_vocab_explanation
-from modules.quiz_generator import generate_mcq, generate_fill_blank
+from modules.summarizer import summarize_with_stats
+from modules.qa_engine import ask_question_stream, ask_library_stream
+from modules.vocab_helper import (KEY_TERMS_MODE, LOCAL_MODES, extract_key_terms, get_vocab_explanations,
+                                  term_store_stats)
+from modules.quiz_generator import generate_quiz_batch
 from modules.flashcard_generator import export_flashcards_to_csv
-from modules.study_plan import generate_study_plan
-from modules.resource_recommender import search_wikipedia, get_google_scholar_resources, get_arxiv_papers
-from modules.docx_exporter import export_docx
-
-# Load .env only in local dev
-if not st.secrets:
-    load_dotenv()
+from modules.study_plan import generate_study_plan_stream
+from modules.resource_recommender import fetch_resources
+from modules.docx_exporter import export_docx, build_report_sections
+from modules.model_registry import warm, warm_from_env, model_stats, resident_mb
+from modules.inference_server import metrics as inference_metrics
+from modules.dedup import dedup_stats
+from modules.jobs import get_job_manager, job_key, DONE, FAILED
+from modules.doc_store import get_document_store, StoreSession
+from modules.library import get_library
+from modules.llm_client import router_stats
 
 st.set_page_config("Smart Learning Companion 2.0", layout="wide")
 st.title("📚 Smart Learning Companion\u00a02.0")
 
-if "doc_text" not in st.session_state:
-    st.session_state.doc_text = ""
+# Texts and derived artifacts live in the disk-backed store; the session keeps
+# only its StoreSession, and `doc` is a handle that decodes slices on demand.
+store = get_document_store()
+if "store" not in st.session_state:
+    st.session_state.store = StoreSession(store)
+sess = st.session_state.store
+sess.touch()
+doc = sess.doc
+
+# Models load on first use; WARM_MODELS=name,... pre-loads them at startup
+warm_from_env()
+
+with st.sidebar.expander("⚙️ Models"):
+    if st.button("🔥 Warm all models"):
+        with st.spinner("Loading models…"):
+            warm()
+    st.caption(f"Resident: {resident_mb()} MB")
+    skipped = dedup_stats()
+    st.caption(f"Near-duplicate chunks skipped: {skipped['duplicates']} "
+               f"({skipped['saved_ratio']:.0%} of chunk tokens, ≈{skipped['seconds_saved']} s of model time)")
+    if skipped["stages"]:
+        st.table([{"stage": name, **t} for name, t in skipped["stages"].items()])
+    st.table([{"model": name, **stats} for name, stats in model_stats().items()])
+    served = inference_metrics()
+    if served["workers"]:
+        # Models live in the inference workers; these are the shared micro-batches
+        st.caption(f"Inference workers: {served['busy_workers']}/{served['workers']} busy, "
+                   f"{served['queued']} queued")
+        st.table([{"model": name, **m} for name, m in served["models"].items()])
+
+with st.sidebar.expander("🧭 LLM routing"):
+    # Which backend served each task, how often it failed, and its latency EWMA
+    routed = router_stats()
+    if routed:
+        st.table(routed)
+    else:
+        st.caption("No LLM calls yet.")
+
+with st.sidebar.expander("💾 Session memory"):
+    st.json(sess.report(st.session_state))
+
+# ─────────── Background jobs ──────────────────────────
+# Long steps run on a worker pool shared by all sessions; the session keeps only
+# the job ID, and reruns (e.g. moving a slider) just poll it.
+jobs = get_job_manager()
+
+
+def start_job(slot: str, key: str, fn, label: str) -> None:
+    st.session_state[f"job_{slot}"] = jobs.submit(key, fn, label=label, session=sess.id).id
+
+
+@st.fragment(run_every=1.0)
+def poll_job(slot: str, on_done) -> None:
+    job = jobs.get(st.session_state.get(f"job_{slot}"))
+    if job is None:
+        return
+    if not job.done:
+        st.progress(job.progress, text=f"{job.label}… {job.message}")
+        if job.partials:
+            st.markdown("\n\n".join(job.partials))
+        if st.button("✖ Cancel", key=f"cancel_{slot}"):
+            jobs.cancel(job.id, session=sess.id)
+            del st.session_state[f"job_{slot}"]
+            st.rerun()
+        return
+    del st.session_state[f"job_{slot}"]
+    if job.status == DONE:
+        on_done(job.result)
+    elif job.status == FAILED:
+        st.session_state[f"job_error_{slot}"] = job.error
+    st.rerun()
+
+
+def show_job_error(slot: str) -> None:
+    error = st.session_state.pop(f"job_error_{slot}", None)
+    if error:
+        st.error(f"❌ {error}")
+
+
+def show_latency(first_s, total_s, first_label="Time to first token") -> None:
+    c1, c2 = st.columns(2)
+    c1.metric(first_label, f"{first_s:.2f} s" if first_s is not None else "–")
+    c2.metric("Total latency", f"{total_s:.2f} s" if total_s is not None else "–")
+
 
 # ─────────── 1. INPUT  ─────────────────────────────────
 st.header("① Provide Your Content")
@@ -30,92 +115,166 @@ with st.expander("Upload / Paste / Link", expanded=True):
     youtube_url = col1.text_input("YouTube URL")
     uploaded_file = col1.file_uploader("Upload PDF, DOCX, TXT, MP3/WAV", type=["pdf", "docx", "txt", "mp3", "wav"])
     raw_text = col2.text_area("Or paste text here")
+    whisper_model = col2.selectbox("Transcription model (audio / no-transcript videos)",
+                                   ["tiny", "base", "small"], index=1,
+                                   help="tiny is fastest, small is most accurate")
 
     if st.button("🔍 Extract Text"):
-        with st.spinner("Processing…"):
-            st.session_state.doc_text = handle_input(
-                youtube_url=youtube_url,
-                uploaded_file=uploaded_file,
-                raw_text=raw_text,
-            )
-        if st.session_state.doc_text:
+        st.session_state.extract_source = (uploaded_file.name if uploaded_file is not None
+                                           else youtube_url or "Pasted text")
+        # The job gets its own copy of the upload; the widget's buffer belongs to this run
+        upload = None
+        if uploaded_file is not None:
+            upload = io.BytesIO(uploaded_file.getvalue())
+            upload.name = uploaded_file.name
+
+        def extract(job, upload=upload, youtube_url=youtube_url, raw_text=raw_text,
+                    whisper_model=whisper_model):
+            job.report(0.05, "extracting")
+
+            # Streamed Whisper transcripts show up piece by piece in the progress
+            # area, and each piece is a point where Cancel takes effect
+            def on_partial(piece):
+                job.emit(piece)
+                job.report(job.progress, f"transcribed {len(job.partials)} pieces")
+
+            text = handle_input(youtube_url=youtube_url, uploaded_file=upload,
+                                raw_text=raw_text, whisper_model=whisper_model,
+                                on_partial=on_partial)
+            job.report(0.95, "storing")
+            return store.put(text) if text else None
+
+        start_job("extract",
+                  job_key("extract", youtube_url, upload.getvalue() if upload else b"", raw_text, whisper_model),
+                  extract, "Processing")
+
+    def on_extracted(handle):
+        if handle:
+            sess.attach(handle)
+            sess.set("source", st.session_state.pop("extract_source", ""))
+        st.session_state.extract_ok = bool(handle)
+
+    poll_job("extract", on_extracted)
+    show_job_error("extract")
+    if "extract_ok" in st.session_state:
+        if st.session_state.pop("extract_ok"):
             st.success("Text extracted ✓")
         else:
             st.error("No valid input detected.")
 
-if st.session_state.doc_text:
+if doc:
     with st.expander("🔗 Raw Extract (first 10 000 chars)"):
-        st.write(st.session_state.doc_text[:10000] + (" ..." if len(st.session_state.doc_text) > 10000 else ""))
+        st.write(doc.preview(10000))
 
 # ─────────── 2. SUMMARIES  ───────────────────────
-if st.session_state.doc_text:
+if doc:
     st.header("② Summaries")
 
     if st.button("🧠 Generate Summaries"):
-        with st.spinner("Summarizing…"):
-            summary = summarize_text(st.session_state.doc_text)
-            st.session_state.concise = summary
-        st.success("Summaries ready!")
+        def summarize(job, doc=doc):
+            return summarize_with_stats(
+                doc.text(),
+                progress_callback=lambda done, total, level: job.report(
+                    done / max(total, 1), f"level {level}: {done}/{total} chunks"),
+                partial_callback=job.emit,
+            )
+
+        start_job("summary", job_key("summary", doc.doc_id), summarize, "Summarizing")
 
-    if "concise" in st.session_state:
+    def on_summarized(result):
+        summary, stats = result
+        sess.set("summary", summary)
+        st.session_state.summary_stats = stats
+
+    poll_job("summary", on_summarized)
+    show_job_error("summary")
+    if "summary_stats" in st.session_state:
+        stats = st.session_state.pop("summary_stats")
+        st.success(f"Summaries ready! ({stats['chunks']} chunks: {stats['recomputed']} summarized "
+                   f"at {stats['chunks_per_sec']} chunks/s, {stats['reused']} reused; "
+                   f"{stats['duplicates']} near-duplicates skipped)")
+        show_latency(stats["first_partial_seconds"], stats["seconds"], "Time to first partial")
+
+    if "summary" in sess:
         st.subheader("Concise Summary")
-        st.markdown(st.session_state.concise)
+        st.markdown(sess.get("summary"))
 
 # ─────────── 3. Q&A  ──────────────────────
-if st.session_state.doc_text:
+if doc:
     st.header("③ Ask Questions")
     q = st.text_input("Your question")
     if st.button("❓ Answer"):
         if not q.strip():
             st.warning("Type a question first.")
         else:
-            with st.spinner("Searching answer…"):
-                ans = ask_question(st.session_state.doc_text, q)
-            st.write(f"**Answer:** {ans}")
-            if "qa_pairs" not in st.session_state:
-                st.session_state.qa_pairs = []
-            st.session_state.qa_pairs.append((q, ans))
+            st.markdown("**Answer:**")
+            qa_stats = {}
+            ans = st.write_stream(ask_question_stream(doc.text(), q, stats=qa_stats))
+            show_latency(qa_stats.get("ttft_s"), qa_stats.get("total_s"))
+            sess.set("qa_pairs", sess.get("qa_pairs", []) + [(q, ans)])
 
 # ─────────── 4. VOCAB  ─────────────────────
-if "concise" in st.session_state:
+vocab = sess.get("vocab")
+if "summary" in sess:
     st.header("④ Vocabulary Helper")
+    # Starts on the configured KEY_TERMS_MODE; "LLM" keeps a configured LLM mode (single / map_reduce)
+    term_modes = {"LLM": "auto" if KEY_TERMS_MODE in LOCAL_MODES else KEY_TERMS_MODE,
+                  "Offline · TF-IDF": "tfidf", "Offline · TextRank": "textrank"}
+    term_mode = st.radio("Term extraction", list(term_modes), horizontal=True,
+                         index=list(term_modes.values()).index(KEY_TERMS_MODE)
+                         if KEY_TERMS_MODE in LOCAL_MODES else 0)
     if st.button("📚 Extract Terms"):
-        terms = extract_key_terms(st.session_state.concise, top_k=10)
-        explanations = {t: get_vocab_explanation(t) for t in terms}
-        st.session_state.vocab = explanations
+        terms = extract_key_terms(sess.get("summary"), top_k=10, mode=term_modes[term_mode])
+        vocab = get_vocab_explanations(terms)
+        sess.set("vocab", vocab)
         st.success("Vocabulary ready!")
+        st.caption(f"Term store hit rate: {term_store_stats()['hit_rate']:.0%}")
 
-    if "vocab" in st.session_state:
-        for term, expl in st.session_state.vocab.items():
+    if vocab is not None:
+        for term, expl in vocab.items():
             st.markdown(f"**{term}** — {expl}")
 
-        bad_terms = [t for t in st.session_state.vocab if len(t) <= 4 or t.lower() in ["lot", "thing", "goal", "trusty"]]
+        bad_terms = [t for t in vocab if len(t) <= 4 or t.lower() in ["lot", "thing", "goal", "trusty"]]
         if bad_terms:
             st.warning(f"⚠️ Some extracted terms may be too generic: {', '.join(bad_terms)}")
 
 # ─────────── 5. QUIZ & FLASHCARDS  ─────────────────
-if "vocab" in st.session_state:
+if vocab is not None:
     st.header("⑤ Quiz & Flashcards")
 
     if st.button("📝 Create Quiz"):
-        mcqs = []
-        blanks = []
-        for term, definition in st.session_state.vocab.items():
-            mcqs.append(generate_mcq(term, definition))
-            blanks.append(generate_fill_blank(term, definition))
-
-        st.session_state.mcqs = mcqs
-        st.session_state.blanks = blanks
+        def create_quiz(job, vocab=vocab):
+            job.report(0.05, f"{len(vocab)} terms")
+
+            def on_item(term, mcq, blank):
+                # Questions show up in the progress area as soon as they parse
+                job.report((len(job.partials) + 1) / len(vocab), term)
+                job.emit(f"**{mcq['question']}**  \n" + " · ".join(mcq["options"]))
+
+            return generate_quiz_batch(vocab, on_item=on_item)
+
+        start_job("quiz", job_key("quiz", json.dumps(vocab, sort_keys=True)),
+                  create_quiz, "Generating quiz")
+
+    def on_quiz(result):
+        mcqs, blanks = result
+        sess.set("mcqs", mcqs)
+        sess.set("blanks", blanks)
+        st.session_state.quiz_ready = True
+
+    poll_job("quiz", on_quiz)
+    show_job_error("quiz")
+    if st.session_state.pop("quiz_ready", False):
         st.success("Quiz generated!")
 
-    if "mcqs" in st.session_state:
-        for i, q in enumerate(st.session_state.mcqs, 1):
+    if "mcqs" in sess:
+        for i, q in enumerate(sess.get("mcqs"), 1):
             st.markdown(f"**Q{i}. {q['question']}**")
             st.write(q["options"])
             with st.expander("Answer"):
                 st.write(q["answer"])
 
-        flashcards = [{"term": t, "definition": d} for t, d in st.session_state.vocab.items()]
+        flashcards = [{"term": t, "definition": d} for t, d in vocab.items()]
         csv_path = export_flashcards_to_csv(flashcards)
         st.download_button(
             label="⬇️ Download Flashcards CSV",
@@ -125,25 +284,25 @@ if "vocab" in st.session_state:
         )
 
 # ─────────── 6. STUDY PLAN  ─────────────────
-if "vocab" in st.session_state:
+if vocab is not None:
     st.header("⑥ Personalized Study Plan")
     hours = st.slider("Hours per day", 1, 6, 2)
     goal = st.selectbox("Goal", ["exam", "project", "general understanding"])
 
     if st.button("🗓️ Generate Study Plan"):
-        with st.spinner("AI is planning…"):
-            terms = list(st.session_state.vocab.keys())
-            plan = generate_study_plan(terms, hours, goal)
-            st.session_state.plan = plan
-        st.markdown(st.session_state.plan)
+        terms = list(vocab.keys())
+        plan_stats = {}
+        sess.set("plan", st.write_stream(generate_study_plan_stream(terms, hours, goal, stats=plan_stats)))
+        show_latency(plan_stats.get("ttft_s"), plan_stats.get("total_s"))
 
 # ─────────── 7. RELATED RESOURCES  ─────────────
-if "vocab" in st.session_state:
+if vocab is not None:
     st.header("⑦ Related Resources")
-    query = st.text_input("Topic keyword for extra resources", value=list(st.session_state.vocab.keys())[0] if st.session_state.vocab else "")
+    query = st.text_input("Topic keyword for extra resources", value=next(iter(vocab), ""))
 
     if st.button("🔗 Fetch Resources"):
-        wiki_summary, wiki_link = search_wikipedia(query.strip())
+        resources = fetch_resources(query.strip())
+        wiki_summary, wiki_link = resources["wikipedia"]["summary"], resources["wikipedia"]["link"]
 
         st.subheader("📘 Wikipedia Summary")
         if "failed" in wiki_summary.lower():
@@ -154,11 +313,11 @@ if "vocab" in st.session_state:
                 st.markdown(f"[🔗 Read more on Wikipedia]({wiki_link})")
 
         st.subheader("📄 Recommended Papers")
-        arxiv_results = get_arxiv_papers(query)
-        scholar_results = get_google_scholar_resources(query)
+        if resources["timed_out"]:
+            st.caption(f"⏱️ Skipped slow sources: {', '.join(resources['timed_out'])}")
 
-        all_resources = arxiv_results + scholar_results
-        st.session_state.related_resources = all_resources
+        all_resources = resources["papers"]
+        sess.set("related_resources", all_resources)
         if all_resources:
             for paper in all_resources:
                 st.markdown(
@@ -170,81 +329,18 @@ if "vocab" in st.session_state:
             st.warning("❌ No papers found.")
 
 # ─────────── 8. EXPORT DOCX  ─────────────────
-if st.session_state.doc_text:
+if doc:
     st.header("⑧ Export Full Report")
     if st.button("📄 Build Word Report (.docx)"):
-        sections = []
-
-        # ① Input Content Preview
-        preview = st.session_state.doc_text[:1000]
-        sections.append({
-            "title": "① Input Content Preview",
-            "content": preview + ("..." if len(st.session_state.doc_text) > 1000 else "")
-        })
-
-        # ② Concise Summary
-        summary = st.session_state.get("concise", "No summary generated.")
-        sections.append({
-            "title": "② Concise Summary",
-            "content": summary.strip()
-        })
-
-        # ③ Q&A Section
-        qa_pairs = st.session_state.get("qa_pairs", [])
-        if qa_pairs:
-            qa_content = "\n\n".join([f"Q{i+1}: {q}\nA{i+1}: {a}" for i, (q, a) in enumerate(qa_pairs)])
-        else:
-            qa_content = "No questions asked."
-        sections.append({
-            "title": "③ Q&A Section",
-            "content": qa_content
-        })
-
-        # ④ Vocabulary
-        vocab = st.session_state.get("vocab", {})
-        if vocab:
-            vocab_content = "\n".join([f"{term}: {definition}" for term, definition in vocab.items()])
-        else:
-            vocab_content = "No terms extracted."
-        sections.append({
-            "title": "④ Vocabulary",
-            "content": vocab_content
-        })
-
-        # ⑤ Quiz (MCQs)
-        mcqs = st.session_state.get("mcqs", [])
-        if mcqs:
-            quiz_content = ""
-            for i, q in enumerate(mcqs, 1):
-                opts = "\n".join([f"  - {opt}" for opt in q['options']])
-                quiz_content += f"Q{i}: {q['question']}\n{opts}\nAnswer: {q['answer']}\n\n"
-        else:
-            quiz_content = "No quiz generated."
-        sections.append({
-            "title": "⑤ Quiz",
-            "content": quiz_content
-        })
-
-        # ⑥ Personalized Study Plan
-        plan = st.session_state.get("plan", "No study plan generated.")
-        sections.append({
-            "title": "⑥ Personalized Study Plan",
-            "content": plan.strip()
-        })
-
-        # ⑦ Related Resources
-        resources = st.session_state.get("related_resources", [])
-        if resources:
-            resource_content = "\n\n".join([
-                f"{r['title']} ({r.get('source', 'Unknown')})\n{r['summary']}\nLink: {r['link']}"
-                for r in resources
-            ])
-        else:
-            resource_content = "No resources found."
-        sections.append({
-            "title": "⑦ Related Resources",
-            "content": resource_content
-        })
+        sections = build_report_sections(
+            doc,                          # handle: the preview slice is read from disk
+            summary=sess.get("summary"),
+            qa_pairs=sess.get("qa_pairs"),
+            vocab=vocab,
+            mcqs=sess.get("mcqs"),
+            plan=sess.get("plan"),
+            resources=sess.get("related_resources"),
+        )
 
         # Generate DOCX file
         with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
@@ -255,3 +351,29 @@ if st.session_state.doc_text:
                 data=docx_bytes,
                 file_name="study_report.docx"
             )
+
+# ─────────── 9. STUDY LIBRARY  ─────────────────
+st.header("⑨ Study Library")
+library = get_library()
+
+if doc and st.button("📥 Save this document to the library"):
+    doc_id = library.add_document(
+        doc.text(), title=sess.get("source") or None, source=sess.get("source", ""),
+        summary=sess.get("summary"), vocab=vocab,
+        quiz={"mcqs": sess.get("mcqs"), "fill_in_the_blanks": sess.get("blanks")} if "mcqs" in sess else None)
+    st.success(f"Saved as library document #{doc_id}")
+
+lib_stats = library.stats()
+st.caption(f"{lib_stats['documents']} documents, {lib_stats['chunks']} indexed chunks")
+lib_query = st.text_input("Search everything you have studied")
+col1, col2 = st.columns(2)
+if col1.button("🔎 Search library") and lib_query.strip():
+    for hit in library.search(lib_query, limit=10):
+        st.markdown(f"**{hit['title']}** · chars {hit['start']}–{hit['end']} · score {hit['score']}  \n"
+                    f"{hit['snippet']}")
+if col2.button("💬 Ask across library") and lib_query.strip():
+    hits = library.search(lib_query, limit=6)
+    ask_stats = {}
+    st.write_stream(ask_library_stream(lib_query, hits, stats=ask_stats))
+    show_latency(ask_stats.get("ttft_s"), ask_stats.get("total_s"))
+    st.caption("Sources: " + ", ".join(dict.fromkeys(h["title"] for h in hits)))
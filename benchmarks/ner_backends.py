@@ -0,0 +1,74 @@
+# ✅ benchmarks/ner_backends.py
+"""
+NER backend benchmark: fp32 vs int8 (vs ONNX Runtime if installed)
+----------------------------------
+Run from the repo root:
+
+    python -m benchmarks.ner_backends [path/to/text.txt] [--repeat N]
+
+Reports load time, chunked-NER throughput (chars/s) and entity agreement
+(precision / recall / F1 of (start, end, label) against the fp32 backend).
+Chunk dedup is off, so the repeated built-in sample is tagged in full.
+"""
+
+import argparse
+import time
+
+from modules.flashcard_generator import NER_BACKENDS, extract_entities, _ner_pipeline
+
+SAMPLE = (
+    "Alan Turing worked at Bletchley Park during the Second World War before joining "
+    "the University of Manchester. In 1950 he published a paper in Mind proposing what "
+    "is now called the Turing test. Grace Hopper, a rear admiral in the United States Navy, "
+    "led the team at Remington Rand that built the first compiler for UNIVAC. "
+)
+
+
+def _spans(entities):
+    return {(e["start"], e["end"], e["entity_group"]) for e in entities}
+
+
+def _agreement(reference: set, candidate: set) -> dict:
+    hits = len(reference & candidate)
+    precision = hits / len(candidate) if candidate else 1.0
+    recall = hits / len(reference) if reference else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 3), "recall": round(recall, 3), "f1": round(f1, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", help="text file to run NER over (default: built-in sample)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per backend")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    text = open(args.path, encoding="utf-8").read() if args.path else SAMPLE * 40
+    reference = None
+    print(f"{len(text):,} chars, {args.repeat} runs per backend\n")
+    print(f"{'backend':<8} {'load s':>8} {'chars/s':>10} {'entities':>9}  agreement vs fp32")
+
+    for backend in NER_BACKENDS:
+        start = time.perf_counter()
+        try:
+            _ner_pipeline(backend)
+        except ImportError as e:
+            print(f"{backend:<8} skipped: {e}")
+            continue
+        load_s = time.perf_counter() - start
+
+        extract_entities(text[:2000], backend=backend, dedup=False)         # warm-up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            entities = extract_entities(text, backend=backend, batch_size=args.batch_size, dedup=False)
+        per_run = (time.perf_counter() - start) / args.repeat
+
+        spans = _spans(entities)
+        if reference is None:
+            reference = spans
+        print(f"{backend:<8} {load_s:>8.1f} {len(text) / per_run:>10,.0f} {len(spans):>9}  "
+              f"{_agreement(reference, spans)}")
+
+
+if __name__ == "__main__":
+    main()
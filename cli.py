@@ -0,0 +1,199 @@
+"""
+Headless batch processing for Smart Learning Companion
+----------------------------------
+Runs the full pipeline (ingest → summary → vocab → quiz → flashcards → DOCX)
+over a corpus without Streamlit, one document per worker process.
+
+    python cli.py lectures/ --out results/ --workers 4
+    python cli.py manifest.txt --out results/ --steps ingest,summary,vocab
+
+Inputs are a directory (PDF, DOCX, TXT, MP3, WAV files) or a manifest file
+with one file path, YouTube URL or YouTube video ID per line. Each document
+gets its own folder under --out; results/journal.jsonl records finished
+documents so an interrupted run resumes where it stopped. With --library,
+finished documents and their artifacts are also added to the study library
+(modules/library.py) for full-text search across runs. Configuration
+(OPENAI_API_KEY, HF_TOKEN, ...) comes from env or SLC_CONFIG, see modules/config.py.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+FILE_TYPES = (".pdf", ".docx", ".txt", ".mp3", ".wav")
+STEPS = ("ingest", "summary", "vocab", "quiz", "flashcards", "docx")
+_YT_ID = re.compile(r"^[\w-]{11}$")
+
+
+class LocalUpload(io.BytesIO):
+    """File on disk shaped like a Streamlit UploadedFile, for handle_input."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+
+
+# ─────────── Inputs & journal ─────────────────────────
+def collect_inputs(source: str) -> list[str]:
+    """File paths from a directory, or entries (paths / YouTube URLs / IDs) from a manifest."""
+    if os.path.isdir(source):
+        return sorted(os.path.join(root, name)
+                      for root, _, names in os.walk(source)
+                      for name in names if name.lower().endswith(FILE_TYPES))
+    with open(source, encoding="utf-8") as f:
+        if source.endswith(".json"):
+            return list(json.load(f))
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def doc_id(entry: str) -> str:
+    """Stable, filesystem-safe folder name for an input entry."""
+    stem = re.sub(r"[^\w.-]+", "_", os.path.basename(entry.rstrip("/")))[-60:]
+    return f"{stem}-{hashlib.sha1(entry.encode('utf-8')).hexdigest()[:8]}"
+
+
+def load_journal(path: str) -> set[str]:
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("status") == "done":
+                    done.add(record["entry"])
+    return done
+
+
+# ─────────── Per-document pipeline (worker) ───────────
+def process_document(entry: str, out_dir: str, steps: tuple[str, ...]) -> dict:
+    """Run the selected steps for one input; returns per-step timings."""
+    from modules.input_processor import handle_input
+    from modules.summarizer import summarize_text
+    from modules.vocab_helper import extract_key_terms, get_vocab_explanations
+    from modules.quiz_generator import generate_quiz_batch
+    from modules.flashcard_generator import export_flashcards_to_csv
+    from modules.docx_exporter import export_docx, build_report_sections
+
+    os.makedirs(out_dir, exist_ok=True)
+    timings = {}
+
+    def timed(step, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[step] = round(time.perf_counter() - start, 2)
+        return result
+
+    def write(name, content):
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content, indent=2))
+
+    if os.path.exists(entry):
+        text = timed("ingest", lambda: handle_input(uploaded_file=LocalUpload(entry)))
+    else:
+        url = entry if "://" in entry or not _YT_ID.match(entry) else f"https://www.youtube.com/watch?v={entry}"
+        text = timed("ingest", lambda: handle_input(youtube_url=url))
+    if not text:
+        raise ValueError("no text extracted")
+    write("text.txt", text)
+
+    summary = vocab = mcqs = None
+    if "summary" in steps:
+        summary = timed("summary", lambda: summarize_text(text))
+        write("summary.md", summary)
+    if "vocab" in steps:
+        terms = timed("vocab_terms", lambda: extract_key_terms(summary or text, top_k=10))
+        vocab = timed("vocab_explain", lambda: get_vocab_explanations(terms))
+        write("vocab.json", vocab)
+    if "quiz" in steps and vocab:
+        mcqs, blanks = timed("quiz", lambda: generate_quiz_batch(vocab))
+        write("quiz.json", {"mcqs": mcqs, "fill_in_the_blanks": blanks})
+    if "flashcards" in steps and vocab:
+        cards = [{"term": t, "definition": d} for t, d in vocab.items()]
+        timed("flashcards", lambda: export_flashcards_to_csv(cards, os.path.join(out_dir, "flashcards.csv")))
+    if "docx" in steps:
+        sections = build_report_sections(text, summary=summary, vocab=vocab, mcqs=mcqs)
+        timed("docx", lambda: export_docx(sections, os.path.join(out_dir, "report.docx")))
+
+    timings["total"] = round(sum(timings.values()), 2)
+    write("timings.json", timings)
+    return timings
+
+
+def add_to_library(library, entry: str, out_dir: str) -> int:
+    """Add a processed document's outputs to the library (from the parent process: one writer)."""
+    def read(name, as_json=False):
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f) if as_json else f.read()
+
+    return library.add_document(read("text.txt"), title=os.path.basename(entry.rstrip("/")),
+                                source=entry, summary=read("summary.md"),
+                                vocab=read("vocab.json", True), quiz=read("quiz.json", True))
+
+
+# ─────────── Driver ───────────────────────────────────
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the study pipeline over a corpus.")
+    parser.add_argument("source", help="directory of documents or manifest file (.txt / .json)")
+    parser.add_argument("--out", default="slc_output", help="output directory (default: slc_output)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--steps", default=",".join(STEPS),
+                        help=f"comma-separated subset of {','.join(STEPS)} (ingest always runs)")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the journal and redo everything")
+    parser.add_argument("--library", action="store_true",
+                        help="also add finished documents to the study library (SLC_LIBRARY)")
+    args = parser.parse_args(argv)
+
+    steps = tuple(s.strip() for s in args.steps.split(",") if s.strip())
+    unknown = set(steps) - set(STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    os.makedirs(args.out, exist_ok=True)
+    journal_path = os.path.join(args.out, "journal.jsonl")
+    done = set() if args.no_resume else load_journal(journal_path)
+    entries = [e for e in collect_inputs(args.source) if e not in done]
+    print(f"{len(entries)} to process, {len(done)} already done", file=sys.stderr)
+
+    library = None
+    if args.library:
+        from modules.library import get_library
+        library = get_library()
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, \
+            open(journal_path, "a", encoding="utf-8") as journal:
+        futures = {pool.submit(process_document, e, os.path.join(args.out, doc_id(e)), steps): e
+                   for e in entries}
+        for fut in as_completed(futures):
+            entry = futures[fut]
+            record = {"entry": entry, "dir": doc_id(entry), "finished": time.time()}
+            try:
+                record.update(status="done", timings=fut.result())
+                print(f"✓ {entry}  {record['timings']}", file=sys.stderr)
+                if library is not None:
+                    record["library_id"] = add_to_library(library, entry, os.path.join(args.out, doc_id(entry)))
+            except Exception as e:
+                failures += 1
+                record.update(status="failed", error=str(e))
+                print(f"✗ {entry}: {e}", file=sys.stderr)
+                traceback.print_exception(e, file=sys.stderr)
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+
+    if library is not None:
+        library.optimize()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# ✅ chunker.py
+"""
+Shared token-aware chunker
+----------------------------------
+• One linear pass over a string or a stream of string pieces (pages, transcript parts)
+• Packs whole sentences where it can; over-long sentences are split on word boundaries
+• Budgets are measured in model tokens (HF tokenizer, tiktoken, or plain words)
+• Configurable token overlap between consecutive chunks
+• Every chunk carries its character offsets into the original text
+• iter_content_chunks: content-defined boundaries, so an edit only moves
+  the chunks around it (used for memoized, incremental summaries)
+"""
+
+import hashlib
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+# Sentence end: terminal punctuation (+ closing quotes/brackets) then whitespace, or a blank line
+_SENT_END = re.compile(r"[.!?…]+[\"')\]]*\s+|\n\s*\n")
+_WORD = re.compile(r"\S+\s*")
+# Unpunctuated transcripts would otherwise be one giant "sentence"
+MAX_SENTENCE_CHARS = 2000
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int      # char offset of text[0] in the source
+    end: int        # char offset just past text[-1]
+    tokens: int
+
+
+# ─────────── Token counting ───────────────────────────
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str = "words") -> Callable[[str], int]:
+    """
+    Token counter for `tokenizer`: "words", "chars", "openai" / an OpenAI model
+    name (tiktoken), or any HuggingFace model id (its own tokenizer).
+    """
+    if tokenizer == "words":
+        return lambda s: len(s.split())
+    if tokenizer == "chars":
+        return len
+    if tokenizer == "openai" or tokenizer.startswith("gpt-"):
+        import tiktoken
+        enc = tiktoken.encoding_for_model("gpt-3.5-turbo" if tokenizer == "openai" else tokenizer)
+        return lambda s: len(enc.encode(s, disallowed_special=()))
+
+    from transformers import AutoTokenizer
+    tok = AutoTokenizer.from_pretrained(tokenizer)
+    return lambda s: len(tok(s, add_special_tokens=False)["input_ids"])
+
+
+# ─────────── Sentences ────────────────────────────────
+def iter_sentences(source: str | Iterable[str]) -> Iterator[tuple[str, int]]:
+    """
+    Yields (raw_sentence, start_offset) where raw_sentence keeps its trailing
+    whitespace, so consecutive sentences tile the input exactly. Only the
+    unfinished tail of the input is buffered.
+    """
+    pieces = [source] if isinstance(source, str) else source
+    buf, base = "", 0
+    for piece in pieces:
+        buf += piece
+        pos = 0
+        for m in _SENT_END.finditer(buf):
+            while m.end() - pos > MAX_SENTENCE_CHARS:
+                pos = yield from _hard_split(buf, pos, base)
+            yield buf[pos:m.end()], base + pos
+            pos = m.end()
+        while len(buf) - pos > MAX_SENTENCE_CHARS:
+            pos = yield from _hard_split(buf, pos, base)
+        buf, base = buf[pos:], base + pos
+    if buf:
+        yield buf, base
+
+
+def _hard_split(buf: str, pos: int, base: int):
+    cut = buf.rfind(" ", pos, pos + MAX_SENTENCE_CHARS) + 1
+    if cut <= pos:
+        cut = pos + MAX_SENTENCE_CHARS
+    yield buf[pos:cut], base + pos
+    return cut
+
+
+def _iter_units(source, max_tokens: int, count) -> Iterator[tuple[str, int, int]]:
+    """(raw, start, tokens) units no larger than max_tokens, each counted once."""
+    for raw, start in iter_sentences(source):
+        if not raw.strip():
+            continue
+        n = count(raw)
+        if n <= max_tokens:
+            yield raw, start, n
+            continue
+        # Over-long sentence: regroup its words into ≤ max_tokens pieces
+        piece_start, piece_tokens = 0, 0
+        for m in _WORD.finditer(raw):
+            w = count(m.group())
+            if piece_tokens and piece_tokens + w > max_tokens:
+                yield raw[piece_start:m.start()], start + piece_start, piece_tokens
+                piece_start, piece_tokens = m.start(), 0
+            piece_tokens += w
+        if piece_tokens:
+            yield raw[piece_start:], start + piece_start, piece_tokens
+
+
+# ─────────── Chunks ───────────────────────────────────
+def _make_chunk(window) -> Chunk:
+    raw = "".join(u[0] for u in window)
+    text = raw.strip()
+    start = window[0][1] + (len(raw) - len(raw.lstrip()))
+    return Chunk(text, start, start + len(text), sum(u[2] for u in window))
+
+
+def iter_chunks(source: str | Iterable[str],
+                max_tokens: int = 400,
+                overlap_tokens: int = 0,
+                tokenizer: str = "words") -> Iterator[Chunk]:
+    """
+    Streams Chunk(text, start, end, tokens) over `source` in one pass.
+    Sentences are packed up to `max_tokens`; the last ≤ `overlap_tokens`
+    worth of sentences is repeated at the start of the next chunk.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    count = get_token_counter(tokenizer)
+    window: deque = deque()
+    total = 0
+
+    for unit in _iter_units(source, max_tokens, count):
+        n = unit[2]
+        if window and total + n > max_tokens:
+            yield _make_chunk(window)
+            kept, total = deque(), 0
+            while window and total + window[-1][2] <= overlap_tokens:
+                u = window.pop()
+                kept.appendleft(u)
+                total += u[2]
+            window = kept
+            while window and total + n > max_tokens:
+                total -= window.popleft()[2]
+        window.append(unit)
+        total += n
+
+    if window:
+        yield _make_chunk(window)
+
+
+def _is_anchor(raw: str, tokens: int, target_tokens: int) -> bool:
+    """
+    Content-defined cut point: a sentence is an anchor with probability
+    tokens / target_tokens, decided by a hash of its own text only, so the
+    same sentence is an anchor wherever it appears.
+    """
+    digest = hashlib.blake2b(raw.strip().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") < (tokens / target_tokens) * 2 ** 64
+
+
+def iter_content_chunks(source: str | Iterable[str],
+                        target_tokens: int = 600,
+                        max_tokens: int = 900,
+                        min_tokens: int | None = None,
+                        tokenizer: str = "words") -> Iterator[Chunk]:
+    """
+    Chunks whose boundaries are chosen by content rather than position: a
+    chunk ends after an anchor sentence (see _is_anchor) once it holds at
+    least `min_tokens` (default target_tokens // 4), or when the next
+    sentence would exceed `max_tokens`. Inserting or deleting text changes
+    only the chunks up to the next anchor; everything after re-aligns.
+    Chunks average about `target_tokens` and never overlap.
+    """
+    if not 0 < target_tokens <= max_tokens:
+        raise ValueError("target_tokens must be positive and at most max_tokens")
+    min_tokens = target_tokens // 4 if min_tokens is None else min_tokens
+    count = get_token_counter(tokenizer)
+    window, total = [], 0
+
+    for unit in _iter_units(source, max_tokens, count):
+        raw, _, n = unit
+        if window and total + n > max_tokens:
+            yield _make_chunk(window)
+            window, total = [], 0
+        window.append(unit)
+        total += n
+        if total >= min_tokens and _is_anchor(raw, n, target_tokens):
+            yield _make_chunk(window)
+            window, total = [], 0
+
+    if window:
+        yield _make_chunk(window)
@@ -0,0 +1,49 @@
+# ✅ config.py
+"""
+Settings without a Streamlit runtime
+----------------------------------
+Lookup order for get_setting(name):
+  1. Environment variables (a local .env is loaded first)
+  2. Config file named by SLC_CONFIG (TOML or JSON), default ./slc_config.toml if present
+  3. st.secrets, only when running inside `streamlit run`
+Modules import cleanly from the CLI, tests or worker processes.
+"""
+
+import json
+import os
+import tomllib
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def _file_settings() -> dict:
+    path = os.getenv("SLC_CONFIG", "slc_config.toml")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        return json.load(f) if path.endswith(".json") else tomllib.load(f)
+
+
+def _streamlit_secrets() -> dict:
+    try:
+        import streamlit as st
+        from streamlit import runtime
+        if runtime.exists():
+            return dict(st.secrets)
+    except Exception:
+        pass            # no streamlit installed, no runtime, or no secrets.toml
+    return {}
+
+
+def get_setting(name: str, default=None):
+    """Value of setting `name` from env, config file, then Streamlit secrets."""
+    if name in os.environ:
+        return os.environ[name]
+    settings = _file_settings()
+    if name in settings:
+        return settings[name]
+    return _streamlit_secrets().get(name, default)
@@ -0,0 +1,135 @@
+# ✅ dedup.py
+"""
+Near-duplicate chunk elimination (MinHash + LSH)
+----------------------------------
+• Transcripts and slide decks repeat themselves (intros, recaps, headers and
+  footers, re-shown slides); every copy would otherwise be summarized,
+  tagged and embedded again
+• Each chunk gets a MinHash signature over its word 3-shingles; LSH bands
+  bucket the signatures, so a chunk is compared only with earlier chunks
+  sharing a bucket: one pass, linear in the number of chunks
+• A chunk whose estimated Jaccard similarity to an earlier kept chunk reaches
+  the threshold (DEDUP_JACCARD, read per call, default 0.8; 0 disables) is
+  dropped, and the first copy stands in for it
+• Per-call stats and per-stage process totals (dedup_stats) report the
+  chunks, model tokens and signature comparisons; stages that record_cost()
+  their model time also get an estimate of the seconds the skipped tokens saved
+"""
+
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from modules.config import get_setting
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 64                 # MinHash permutations (signature length)
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240601)
+# a, b < 2**31 and crc32 hashes < 2**32, so a·x + b never overflows uint64
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+_STATS = ("chunks", "duplicates", "tokens", "tokens_saved", "comparisons")
+_totals: dict[str, dict] = {}                    # stage -> summed per-call stats
+_costs: dict[str, list] = {}                     # stage -> [tokens, seconds] of model work done
+_totals_lock = threading.Lock()
+
+
+def dedup_threshold() -> float:
+    return float(get_setting("DEDUP_JACCARD", DEFAULT_THRESHOLD))
+
+
+def _bands(threshold: float) -> tuple[int, int]:
+    """(bands, rows) splitting NUM_PERM whose LSH threshold (1/b)^(1/r) is closest below `threshold`."""
+    options = [(b, NUM_PERM // b) for b in range(1, NUM_PERM + 1) if NUM_PERM % b == 0]
+    below = [o for o in options if (1 / o[0]) ** (1 / o[1]) <= threshold]
+    return max(below or options, key=lambda o: (1 / o[0]) ** (1 / o[1]))
+
+
+def signature(text: str) -> np.ndarray | None:
+    """MinHash signature of the word shingles of `text`; None when it has no words."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    n = min(SHINGLE_WORDS, len(words))
+    shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def dedup_chunks(chunks, threshold: float | None = None, stats: dict | None = None,
+                 stage: str = "other") -> list:
+    """
+    `chunks` (chunker.Chunk objects or plain strings) in order, minus those
+    near-identical to an earlier one; `threshold` defaults to DEDUP_JACCARD.
+    `stats`, if given, receives chunks, duplicates, tokens and tokens_saved
+    (Chunk.tokens, or words for strings) and comparisons (signatures
+    compared); they are also added to the totals of `stage`.
+    """
+    threshold = dedup_threshold() if threshold is None else threshold
+    stats = {} if stats is None else stats
+    stats.update(dict.fromkeys(_STATS, 0))
+    bands, rows = _bands(threshold) if threshold > 0 else (0, 0)
+    buckets: dict[tuple[int, bytes], list[int]] = {}
+    signatures, kept = [], []
+
+    for chunk in chunks:
+        text = getattr(chunk, "text", chunk)
+        tokens = getattr(chunk, "tokens", None) or len(text.split())
+        stats["chunks"] += 1
+        stats["tokens"] += tokens
+        sig = signature(text) if bands else None
+        if sig is None:
+            kept.append(chunk)
+            continue
+        keys = [(b, sig[b * rows:(b + 1) * rows].tobytes()) for b in range(bands)]
+        candidates = {k for key in keys for k in buckets.get(key, ())}
+        stats["comparisons"] += len(candidates)
+        if any(np.mean(signatures[k] == sig) >= threshold for k in candidates):
+            stats["duplicates"] += 1
+            stats["tokens_saved"] += tokens
+            continue
+        for key in keys:
+            buckets.setdefault(key, []).append(len(signatures))
+        signatures.append(sig)
+        kept.append(chunk)
+
+    with _totals_lock:
+        totals = _totals.setdefault(stage, dict.fromkeys(_STATS, 0))
+        for name in _STATS:
+            totals[name] += stats[name]
+    return kept
+
+
+def record_cost(stage: str, tokens: int, seconds: float) -> None:
+    """Report model time spent on `tokens` kept tokens of `stage`, to price the skipped ones."""
+    with _totals_lock:
+        cost = _costs.setdefault(stage, [0, 0.0])
+        cost[0] += tokens
+        cost[1] += seconds
+
+
+def dedup_stats() -> dict:
+    """
+    Process-wide totals with the share of model tokens saved, and per stage
+    the same plus seconds_saved: tokens_saved at the stage's recorded
+    seconds per token (None until the stage has recorded a cost).
+    """
+    with _totals_lock:
+        stages = {name: dict(t) for name, t in _totals.items()}
+        costs = {name: tuple(c) for name, c in _costs.items()}
+    for name, t in stages.items():
+        tokens, seconds = costs.get(name, (0, 0.0))
+        t["seconds_saved"] = round(t["tokens_saved"] * seconds / tokens, 2) if tokens else None
+    totals = {name: sum(t[name] for t in stages.values()) for name in _STATS}
+    totals["saved_ratio"] = round(totals["tokens_saved"] / totals["tokens"], 4) if totals["tokens"] else 0.0
+    totals["seconds_saved"] = round(sum(t["seconds_saved"] or 0.0 for t in stages.values()), 2)
+    totals["stages"] = stages
+    return totals
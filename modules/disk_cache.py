@@ -0,0 +1,165 @@
+# ✅ disk_cache.py
+"""
+Persistent key/value cache on SQLite
+----------------------------------
+• JSON-serialisable values, optionally zlib-compressed
+• Per-entry TTL and size-bounded LRU eviction
+• Safe across threads and worker processes (WAL + atomic transactions)
+• Optional in-process LRU front, pre-filled from disk with warm()
+• Hit / miss / eviction statistics
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+CACHE_DIR = os.getenv("SLC_CACHE_DIR", ".cache")
+
+_MISSING = object()
+
+
+class DiskCache:
+    def __init__(self, name: str, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: float | None = None, compress: bool = False,
+                 memory_items: int = 0):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress = compress
+        self.memory_items = memory_items
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (value, created)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key      TEXT PRIMARY KEY,
+                value    BLOB NOT NULL,
+                size     INTEGER NOT NULL,
+                created  REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+    # ─────────── Read / Write ─────────────────────────
+    def get(self, key: str, default=None):
+        with self._lock:
+            if key in self._memory:
+                value, created = self._memory[key]
+                if self.ttl is None or time.time() - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return default
+            value, created = row
+            now = time.time()
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return default
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            value = self._decode(value)
+            self._remember_locked(key, value, created)
+        return value
+
+    def set(self, key: str, value) -> None:
+        blob = self._encode(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now))
+                self._evict_locked()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._remember_locked(key, value, now)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM entries")
+
+    # ─────────── Memory front ─────────────────────────
+    def warm(self, limit: int | None = None) -> int:
+        """Load the most recently used entries from disk into memory; return count."""
+        limit = limit or self.memory_items
+        if not limit:
+            return 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, created FROM entries ORDER BY accessed DESC LIMIT ?",
+                (limit,)).fetchall()
+            for key, blob, created in reversed(rows):
+                self._remember_locked(key, self._decode(blob), created)
+        return len(rows)
+
+    def _remember_locked(self, key: str, value, created: float) -> None:
+        if not self.memory_items:
+            return
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # ─────────── Eviction & Stats ─────────────────────
+    def _evict_locked(self) -> None:
+        if self.ttl is not None:
+            cur = self._conn.execute("DELETE FROM entries WHERE created < ?",
+                                     (time.time() - self.ttl,))
+            self.stats["expired"] += cur.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def info(self) -> dict:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": count, "bytes": size, "in_memory": len(self._memory),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
+
+    # ─────────── Encoding ─────────────────────────────
+    def _encode(self, value) -> bytes:
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        return zlib.compress(raw, 6) if self.compress else raw
+
+    def _decode(self, blob: bytes):
+        raw = zlib.decompress(blob) if self.compress else blob
+        return json.loads(raw.decode("utf-8"))
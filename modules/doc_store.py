@@ -0,0 +1,318 @@
+# ✅ doc_store.py
+"""
+Disk-backed document store
+----------------------------------
+• Each text is written once, content-addressed, as UTF-32-LE under
+  CACHE_DIR/docs; fixed-width code points make char offsets byte offsets
+• Sessions hold a DocHandle (id + length); slices and previews decode only
+  the requested range straight out of a read-only mmap shared by every session
+• Derived artifacts (summary, vocab, quiz, ...) live in SQLite per session and
+  are dropped when the session ends or idles out, along with documents no
+  session references any more
+• StoreSession.report() estimates what a session costs in memory and on disk
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import weakref
+
+import psutil
+
+from modules.config import get_setting
+from modules.disk_cache import CACHE_DIR
+
+STORE_DIR = os.path.join(CACHE_DIR, "docs")
+SESSION_IDLE_S = float(get_setting("SESSION_IDLE_S", 7200))   # sweep sessions idle this long
+SWEEP_INTERVAL_S = 60
+BLOCK_CHARS = 1 << 20         # chars per write / iter_blocks piece
+_WIDTH = 4                    # bytes per char in UTF-32
+
+
+class DocHandle:
+    """
+    Lightweight reference to a stored text. Supports len() and slicing
+    (handle[a:b] decodes only that range), so it can stand in for a str
+    wherever only previews or offsets are needed.
+    """
+    __slots__ = ("doc_id", "length", "_store")
+
+    def __init__(self, store: "DocumentStore", doc_id: str, length: int):
+        self.doc_id = doc_id
+        self.length = length
+        self._store = store
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __getitem__(self, key) -> str:
+        if isinstance(key, int):
+            key = slice(key, key + 1 if key != -1 else None)
+        start, stop, step = key.indices(self.length)
+        if step != 1:
+            raise ValueError("DocHandle slices do not support a step")
+        return self._store._read(self.doc_id, start, stop)
+
+    def __repr__(self) -> str:
+        return f"DocHandle({self.doc_id[:12]}…, {self.length:,} chars)"
+
+    def preview(self, n: int) -> str:
+        return self[:n] + (" ..." if self.length > n else "")
+
+    def text(self) -> str:
+        """The full text, decoded for callers (models, indexes) that need a str."""
+        return self[:]
+
+    def iter_blocks(self, block_chars: int = BLOCK_CHARS):
+        """The text in pieces, e.g. for chunker.iter_chunks' streaming input."""
+        for start in range(0, self.length, block_chars):
+            yield self[start:start + block_chars]
+
+
+class DocumentStore:
+    def __init__(self, root: str = STORE_DIR, idle_s: float = SESSION_IDLE_S):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.idle_s = idle_s
+        self._maps: dict[str, mmap.mmap] = {}
+        self._retired: list[mmap.mmap] = []     # swept maps a reader still had a view of
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id  TEXT PRIMARY KEY,
+                chars   INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                doc_id     TEXT,
+                last_seen  REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS artifacts (
+                session_id TEXT NOT NULL,
+                name       TEXT NOT NULL,
+                value      BLOB NOT NULL,
+                size       INTEGER NOT NULL,
+                PRIMARY KEY (session_id, name)
+            );
+        """)
+
+    # ─────────── Documents ─────────────────────────────
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.root, f"{doc_id}.u32")
+
+    def put(self, text: str) -> DocHandle:
+        """Store `text` (once per distinct content) and return its handle."""
+        doc_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = self._path(doc_id)
+        # Registered (or its age reset) before the file is checked, so a
+        # concurrent sweep cannot delete a text that is being stored again
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents VALUES (?, ?, ?) "
+                "ON CONFLICT(doc_id) DO UPDATE SET created = excluded.created",
+                (doc_id, len(text), time.time()))
+        if not os.path.exists(path):
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                for start in range(0, len(text), BLOCK_CHARS):
+                    f.write(text[start:start + BLOCK_CHARS].encode("utf-32-le"))
+            os.replace(tmp, path)           # atomic; concurrent writers produce the same bytes
+        return DocHandle(self, doc_id, len(text))
+
+    def open(self, doc_id: str) -> DocHandle | None:
+        with self._lock:
+            row = self._conn.execute("SELECT chars FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return DocHandle(self, doc_id, row[0]) if row else None
+
+    def _map(self, doc_id: str) -> mmap.mmap:
+        with self._lock:
+            mm = self._maps.get(doc_id)
+            if mm is None:
+                with open(self._path(doc_id), "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[doc_id] = mm
+            return mm
+
+    def _read(self, doc_id: str, start: int, stop: int) -> str:
+        if start >= stop:
+            return ""
+        with memoryview(self._map(doc_id)) as view, view[start * _WIDTH:stop * _WIDTH] as part:
+            return str(part, "utf-32-le")
+
+    # ─────────── Sessions & artifacts ──────────────────
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions VALUES (?, NULL, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, time.time()))
+
+    def attach(self, session_id: str, handle: DocHandle) -> None:
+        """Make `handle` the session's document; a different previous document's artifacts go."""
+        with self._lock:
+            row = self._conn.execute("SELECT doc_id FROM sessions WHERE session_id = ?",
+                                     (session_id,)).fetchone()
+            if row is None or row[0] != handle.doc_id:
+                self._conn.execute("DELETE FROM artifacts WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET doc_id = excluded.doc_id, last_seen = excluded.last_seen",
+                (session_id, handle.doc_id, time.time()))
+
+    def session_doc(self, session_id: str) -> DocHandle | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT d.doc_id, d.chars FROM sessions s JOIN documents d ON d.doc_id = s.doc_id "
+                "WHERE s.session_id = ?", (session_id,)).fetchone()
+        return DocHandle(self, *row) if row else None
+
+    def set_artifact(self, session_id: str, name: str, value) -> None:
+        blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+                               (session_id, name, blob, len(blob)))
+
+    def get_artifact(self, session_id: str, name: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM artifacts WHERE session_id = ? AND name = ?",
+                                     (session_id, name)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def end_session(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM artifacts WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self, force: bool = False) -> int:
+        """
+        End sessions idle longer than idle_s and delete documents no session
+        uses (older than idle_s, so a just-extracted text survives until it is
+        attached). Runs at most every SWEEP_INTERVAL_S unless forced. A map
+        that a reader is still slicing is closed on a later sweep instead.
+        Returns the number of documents deleted.
+        """
+        now = time.time()
+        if not force and now - self._last_sweep < SWEEP_INTERVAL_S:
+            return 0
+        self._last_sweep = now
+        cutoff = now - self.idle_s
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM artifacts WHERE session_id IN "
+                                   "(SELECT session_id FROM sessions WHERE last_seen < ?)", (cutoff,))
+                self._conn.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+                orphans = [r[0] for r in self._conn.execute(
+                    "SELECT doc_id FROM documents WHERE created < ? AND doc_id NOT IN "
+                    "(SELECT doc_id FROM sessions WHERE doc_id IS NOT NULL)", (cutoff,))]
+                self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(d,) for d in orphans])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            retired, self._retired = self._retired, []
+            for doc_id in orphans:
+                mm = self._maps.pop(doc_id, None)
+                if mm is not None:
+                    retired.append(mm)
+                try:
+                    os.remove(self._path(doc_id))
+                except FileNotFoundError:
+                    pass
+            for mm in retired:
+                try:
+                    mm.close()
+                except BufferError:         # a _read still holds a view; the unlinked file stays mapped
+                    self._retired.append(mm)
+        return len(orphans)
+
+    def report(self, session_id: str) -> dict:
+        """Per-session footprint: document size, artifact bytes, and process-wide context."""
+        doc = self.session_doc(session_id)
+        with self._lock:
+            artifact_count, artifact_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts WHERE session_id = ?",
+                (session_id,)).fetchone()
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            mapped = sum(len(mm) for mm in self._maps.values())
+        return {
+            "doc_chars": len(doc) if doc else 0,
+            "doc_disk_bytes": len(doc) * _WIDTH if doc else 0,
+            "artifacts": artifact_count,
+            "artifact_bytes": artifact_bytes,
+            "sessions": sessions,
+            "mapped_bytes": mapped,          # page cache, shared by all sessions
+            "process_rss_mb": round(psutil.Process(os.getpid()).memory_info().rss / 2 ** 20, 1),
+        }
+
+
+class StoreSession:
+    """
+    One user session's view of the store. Keep this object (not texts) in
+    st.session_state; when Streamlit drops the session state the object is
+    collected and the session's artifacts are deleted.
+    """
+
+    def __init__(self, store: "DocumentStore"):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        store.touch(self.id)
+        self._finalizer = weakref.finalize(self, store.end_session, self.id)
+
+    @property
+    def doc(self) -> DocHandle | None:
+        return self.store.session_doc(self.id)
+
+    def attach(self, handle: DocHandle) -> None:
+        self.store.attach(self.id, handle)
+
+    def get(self, name: str, default=None):
+        return self.store.get_artifact(self.id, name, default)
+
+    def set(self, name: str, value) -> None:
+        self.store.set_artifact(self.id, name, value)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def touch(self) -> None:
+        """Mark the session active and sweep idle ones; a failed sweep is retried on a later touch."""
+        self.store.touch(self.id)
+        try:
+            self.store.sweep()
+        except Exception:
+            pass                            # housekeeping must never break a page render
+
+    def report(self, session_state=None) -> dict:
+        """store.report for this session, plus the shallow size of `session_state` if given."""
+        report = self.store.report(self.id)
+        if session_state is not None:
+            report["session_state_bytes"] = sum(sys.getsizeof(v) for v in session_state.values())
+        return report
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """The process-wide store shared by every session."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DocumentStore()
+        return _store
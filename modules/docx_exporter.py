@@ -2,6 +2,84 @@ from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 
+def build_report_sections(doc_text, summary=None, qa_pairs=None, vocab=None,
+                          mcqs=None, plan=None, resources=None):
+    """
+    Sections for export_docx from a document and whatever artifacts exist for it.
+    `doc_text` may be a str or a doc_store.DocHandle; only its preview is read.
+    """
+    sections = []
+
+    # ① Input Content Preview
+    preview = doc_text[:1000]
+    sections.append({
+        "title": "① Input Content Preview",
+        "content": preview + ("..." if len(doc_text) > 1000 else "")
+    })
+
+    # ② Concise Summary
+    summary = summary or "No summary generated."
+    sections.append({
+        "title": "② Concise Summary",
+        "content": summary.strip()
+    })
+
+    # ③ Q&A Section
+    if qa_pairs:
+        qa_content = "\n\n".join([f"Q{i+1}: {q}\nA{i+1}: {a}" for i, (q, a) in enumerate(qa_pairs)])
+    else:
+        qa_content = "No questions asked."
+    sections.append({
+        "title": "③ Q&A Section",
+        "content": qa_content
+    })
+
+    # ④ Vocabulary
+    if vocab:
+        vocab_content = "\n".join([f"{term}: {definition}" for term, definition in vocab.items()])
+    else:
+        vocab_content = "No terms extracted."
+    sections.append({
+        "title": "④ Vocabulary",
+        "content": vocab_content
+    })
+
+    # ⑤ Quiz (MCQs)
+    if mcqs:
+        quiz_content = ""
+        for i, q in enumerate(mcqs, 1):
+            opts = "\n".join([f"  - {opt}" for opt in q['options']])
+            quiz_content += f"Q{i}: {q['question']}\n{opts}\nAnswer: {q['answer']}\n\n"
+    else:
+        quiz_content = "No quiz generated."
+    sections.append({
+        "title": "⑤ Quiz",
+        "content": quiz_content
+    })
+
+    # ⑥ Personalized Study Plan
+    plan = plan or "No study plan generated."
+    sections.append({
+        "title": "⑥ Personalized Study Plan",
+        "content": plan.strip()
+    })
+
+    # ⑦ Related Resources
+    if resources:
+        resource_content = "\n\n".join([
+            f"{r['title']} ({r.get('source', 'Unknown')})\n{r['summary']}\nLink: {r['link']}"
+            for r in resources
+        ])
+    else:
+        resource_content = "No resources found."
+    sections.append({
+        "title": "⑦ Related Resources",
+        "content": resource_content
+    })
+
+    return sections
+
+
 def export_docx(sections, output_path):
     doc = Document()
     style = doc.styles['Normal']
@@ -1,30 +1,119 @@
 # ✅ flashcard_generator.py
 import csv
-import os
-import streamlit as st
-from transformers import pipeline
-from dotenv import load_dotenv
+import time
+from modules.chunker import iter_chunks
+from modules.dedup import dedup_chunks, record_cost
+from modules.config import get_setting
+from modules.inference_server import run_model
+from modules.model_registry import register_model, get_model
 
-# Load environment variables (for local testing)
-load_dotenv()
+# Hugging Face token from env, config file or Streamlit secrets
+HF_TOKEN = get_setting("HF_TOKEN")
 
-# Secure Hugging Face token from Streamlit secrets or fallback to env
-HF_TOKEN = st.secrets.get("HF_TOKEN", os.getenv("HF_TOKEN"))
+NER_MODEL = "dbmdz/bert-large-cased-finetuned-conll03-english"
+NER_BACKENDS = ("fp32", "int8", "onnx")
+NER_BACKEND = get_setting("NER_BACKEND", "fp32")
 
-# Load NER model with token
-nlp = pipeline(
-    "ner",
-    model="dbmdz/bert-large-cased-finetuned-conll03-english",
-    aggregation_strategy="simple",
-    token=HF_TOKEN
-)
+# NER models load lazily on first use via the shared registry
+def _load_ner():
+    from transformers import pipeline
+    return pipeline(
+        "ner",
+        model=NER_MODEL,
+        aggregation_strategy="simple",
+        token=HF_TOKEN
+    )
+
+
+def _load_ner_int8():
+    # Dynamic int8 quantization of every Linear layer; CPU-only, no calibration needed
+    import torch
+    ner = _load_ner()
+    ner.model = torch.quantization.quantize_dynamic(ner.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return ner
+
+
+def _load_ner_onnx():
+    try:
+        from optimum.onnxruntime import ORTModelForTokenClassification
+    except ImportError as e:
+        raise ImportError("NER_BACKEND=onnx needs `pip install optimum[onnxruntime]`") from e
+    from transformers import AutoTokenizer, pipeline
+    model = ORTModelForTokenClassification.from_pretrained(NER_MODEL, export=True, token=HF_TOKEN)
+    return pipeline("ner", model=model, tokenizer=AutoTokenizer.from_pretrained(NER_MODEL),
+                    aggregation_strategy="simple")
+
+register_model("bert-large-ner", _load_ner)
+register_model("bert-large-ner-int8", _load_ner_int8)
+register_model("bert-large-ner-onnx", _load_ner_onnx)
+
+
+def _ner_model_name(backend: str | None = None) -> str:
+    backend = backend or NER_BACKEND
+    if backend not in NER_BACKENDS:
+        raise ValueError(f"NER backend must be one of {NER_BACKENDS}, got '{backend}'")
+    return "bert-large-ner" if backend == "fp32" else f"bert-large-ner-{backend}"
+
+
+def _ner_pipeline(backend: str | None = None):
+    return get_model(_ner_model_name(backend))
+
+
+def nlp(*args, backend: str | None = None, **kwargs):
+    # In-process, or micro-batched with other sessions when INFERENCE_WORKERS > 0
+    return run_model(_ner_model_name(backend), *args, **kwargs)
+
+# ───────────────────────────── Chunked NER ─────────────────────────────
+def extract_entities(text: str,
+                     backend: str | None = None,
+                     batch_size: int = 8,
+                     max_tokens: int = 400,
+                     overlap_tokens: int = 50,
+                     dedup: bool = True) -> list[dict]:
+    """
+    Runs NER over overlapping, sentence-aligned chunks of at most `max_tokens`
+    BERT tokens (nothing is truncated at the 512-token limit), `batch_size`
+    chunks per forward pass. Entity offsets are mapped back to `text`, and
+    entities seen twice in an overlap, or cut by a chunk edge, are merged.
+    Near-duplicate chunks are tagged once (their first copy only) unless
+    `dedup` is False.
+    """
+    chunks = iter_chunks(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens, tokenizer=NER_MODEL)
+    chunks = dedup_chunks(chunks, stage="ner") if dedup else list(chunks)
+    if not chunks:
+        return []
+    start = time.perf_counter()
+    results = nlp([c.text for c in chunks], backend=backend, batch_size=batch_size)
+    record_cost("ner", sum(c.tokens for c in chunks), time.perf_counter() - start)
+    found = [{**ent, "start": chunk.start + ent["start"], "end": chunk.start + ent["end"]}
+             for chunk, ents in zip(chunks, results) for ent in ents]
+    return _merge_entities(found, text)
+
+
+def _merge_entities(entities: list[dict], text: str) -> list[dict]:
+    """Union overlapping spans of the same entity group; keep the best score."""
+    merged: list[dict] = []
+    for ent in sorted(entities, key=lambda e: (e["start"], -e["end"])):
+        last = merged[-1] if merged else None
+        if last and ent["start"] < last["end"] and ent["entity_group"] == last["entity_group"]:
+            last["end"] = max(last["end"], ent["end"])
+            last["score"] = max(float(last["score"]), float(ent["score"]))
+            last["word"] = text[last["start"]:last["end"]]
+        else:
+            merged.append({"entity_group": ent["entity_group"], "score": float(ent["score"]),
+                           "word": text[ent["start"]:ent["end"]],
+                           "start": ent["start"], "end": ent["end"]})
+    return merged
 
 # ───────────────────────────── Flashcard Generator ─────────────────────────────
-def generate_flashcards(text: str) -> list:
-    entities = nlp(text)
+def generate_flashcards(text: str, backend: str | None = None) -> list:
     flashcards = []
-    for ent in entities:
+    seen = set()
+    for ent in extract_entities(text, backend=backend):
         term = ent['word']
+        if term.lower() in seen:
+            continue
+        seen.add(term.lower())
         definition = f"Explain the term: {term}"
         flashcards.append({"term": term, "definition": definition})
     return flashcards
@@ -0,0 +1,274 @@
+# ✅ inference_server.py
+"""
+Cross-session micro-batching for the HF pipelines
+----------------------------------
+• INFERENCE_WORKERS > 0 moves the summarizer, flan-t5 and NER pipelines into
+  that many spawned worker processes, which own the models
+• Callers submit single texts; a batcher thread groups texts for the same
+  model and call options into micro-batches, dispatched when a worker is
+  free: up to INFERENCE_MAX_BATCH texts, or whatever has arrived
+  INFERENCE_MAX_WAIT_MS after the oldest one. Under load batches grow
+  instead of queues, so latency stays flat as users are added
+• Results come back through concurrent.futures.Future objects
+• metrics(): batch sizes and queue / end-to-end latency percentiles per model
+• INFERENCE_WORKERS=0 (default) calls the pipelines in-process, as before
+"""
+
+import atexit
+import importlib
+import itertools
+import json
+import multiprocessing as mp
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+from modules.config import get_setting
+from modules.model_registry import get_model, loader_for
+
+INFERENCE_WORKERS = int(get_setting("INFERENCE_WORKERS", 0))
+MAX_BATCH = int(get_setting("INFERENCE_MAX_BATCH", 16))
+MAX_WAIT_S = float(get_setting("INFERENCE_MAX_WAIT_MS", 10)) / 1000
+RESULT_TIMEOUT_S = 600
+METRIC_WINDOW = 1000          # recent requests / batches kept per model for percentiles
+
+
+# ─────────── Worker process ───────────────────────────
+def _worker_main(conn) -> None:
+    # One private pipe per worker: a killed worker cannot wedge a lock others share
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            return
+        batch_id, name, module, kwargs, texts = msg
+        try:
+            importlib.import_module(module)            # registers the model's loader
+            out = get_model(name)(texts, batch_size=len(texts), **kwargs)
+            conn.send((batch_id, list(out), None))
+        except Exception as e:
+            conn.send((batch_id, None, f"{type(e).__name__}: {e}"))
+
+
+def _percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+# ─────────── Server (lives in the Streamlit process) ──
+class InferenceServer:
+    def __init__(self, workers: int = 1, max_batch: int = MAX_BATCH, max_wait_s: float = MAX_WAIT_S):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self._ctx = mp.get_context("spawn")
+        self._procs = [self._start_worker() for _ in range(workers)]    # (process, conn)
+        self._busy: list[int | None] = [None] * workers                  # batch id per worker
+        self._broken: set[int] = set()                                    # unreachable; restart pending
+        self._closed = False
+
+        self._cond = threading.Condition()
+        self._queues: dict[tuple, deque] = {}           # (name, kwargs json) -> (text, future, t)
+        self._calls: dict[tuple, tuple] = {}              # key -> (loader module, kwargs)
+        self._inflight: dict[int, tuple] = {}            # batch id -> (name, batch)
+        self._ids = itertools.count()
+        self._metrics: dict[str, dict] = {}
+        threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True).start()
+        threading.Thread(target=self._result_loop, name="inference-results", daemon=True).start()
+
+    def _start_worker(self):
+        conn, child = self._ctx.Pipe()
+        p = self._ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        p.start()
+        child.close()
+        return p, conn
+
+    def submit(self, name: str, text: str, **kwargs) -> Future:
+        """Queue one input for model `name`; the future resolves to its pipeline output."""
+        key = (name, json.dumps(kwargs, sort_keys=True, default=str))
+        module = loader_for(name).__module__            # KeyError for unknown models, here
+        future = Future()
+        with self._cond:
+            self._calls.setdefault(key, (module, kwargs))
+            self._queues.setdefault(key, deque()).append((text, future, time.monotonic()))
+            self._cond.notify_all()
+        return future
+
+    def _next_batch_locked(self):
+        """(key, wait): a key whose batch is due now, else seconds until the next one is."""
+        now, best, wait = time.monotonic(), None, None
+        for key, pending in self._queues.items():
+            if not pending:
+                continue
+            oldest = pending[0][2]
+            due = oldest + self.max_wait_s
+            if len(pending) >= self.max_batch or due <= now:
+                if best is None or oldest < self._queues[best][0][2]:
+                    best = key
+            else:
+                wait = due - now if wait is None else min(wait, due - now)
+        return best, wait
+
+    def _batch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    free = [i for i, b in enumerate(self._busy) if b is None and i not in self._broken]
+                    idle = free[0] if free else None
+                    key, wait = self._next_batch_locked() if idle is not None else (None, None)
+                    if key is not None:
+                        break
+                    self._cond.wait(wait)
+                pending = self._queues[key]
+                batch = [pending.popleft() for _ in range(min(len(pending), self.max_batch))]
+                batch_id = next(self._ids)
+                self._inflight[batch_id] = (key[0], batch)
+                self._busy[idle] = batch_id
+                module, kwargs = self._calls[key]
+                conn = self._procs[idle][1]
+                self._record(key[0], "batch_sizes", len(batch))
+                now = time.monotonic()
+                for _, _, submitted in batch:
+                    self._record(key[0], "queue_ms", (now - submitted) * 1000)
+            try:
+                conn.send((batch_id, key[0], module, kwargs, [text for text, _, _ in batch]))
+            except OSError as e:
+                # Fail the batch now rather than when _check_workers next looks; it restarts the worker
+                with self._cond:
+                    lost = self._inflight.pop(batch_id, None)
+                    if self._busy[idle] == batch_id:
+                        self._busy[idle] = None
+                    if self._procs[idle][1] is conn:
+                        self._broken.add(idle)
+                if lost is not None:
+                    for _, future, _ in batch:
+                        future.set_exception(RuntimeError(f"{key[0]} inference worker unreachable: {e}"))
+
+    def _result_loop(self) -> None:
+        while not self._closed:
+            conns = {conn: i for i, (_, conn) in enumerate(self._procs)}
+            for conn in wait(list(conns), timeout=1.0):
+                try:
+                    batch_id, out, error = conn.recv()
+                except (EOFError, OSError):
+                    continue                    # worker died; handled below
+                self._resolve(conns[conn], batch_id, out, error)
+            self._check_workers()
+
+    def _resolve(self, worker: int, batch_id: int, out, error) -> None:
+        with self._cond:
+            name, batch = self._inflight.pop(batch_id)
+            self._busy[worker] = None
+            self._cond.notify_all()
+        now = time.monotonic()
+        for i, (_, future, submitted) in enumerate(batch):
+            if error is None:
+                future.set_result(out[i])
+            else:
+                future.set_exception(RuntimeError(f"{name} inference failed: {error}"))
+        with self._cond:
+            for _, _, submitted in batch:
+                self._record(name, "latency_ms", (now - submitted) * 1000)
+
+    def _check_workers(self) -> None:
+        """Restart dead or unreachable workers and fail the batch each one was running."""
+        for i, (proc, conn) in enumerate(self._procs):
+            with self._cond:
+                if self._closed:
+                    return                      # shut down: the workers exited on purpose
+                broken = i in self._broken
+            if proc.is_alive() and not broken:
+                continue
+            if proc.is_alive():
+                proc.kill()
+                proc.join(timeout=5)
+            conn.close()
+            self._procs[i] = self._start_worker()
+            with self._cond:
+                self._broken.discard(i)
+                batch_id, self._busy[i] = self._busy[i], None
+                lost = self._inflight.pop(batch_id, None)
+                self._cond.notify_all()
+            if lost is not None:
+                name, batch = lost
+                for _, future, _ in batch:
+                    future.set_exception(RuntimeError(f"{name} inference worker died"))
+
+    def _record(self, name: str, metric: str, value: float) -> None:
+        m = self._metrics.setdefault(name, {"batches": 0, "items": 0,
+                                            "batch_sizes": deque(maxlen=METRIC_WINDOW),
+                                            "queue_ms": deque(maxlen=METRIC_WINDOW),
+                                            "latency_ms": deque(maxlen=METRIC_WINDOW)})
+        if metric == "batch_sizes":
+            m["batches"] += 1
+            m["items"] += value
+        m[metric].append(value)
+
+    def metrics(self) -> dict:
+        """Per model: batch counts and sizes, queue wait and end-to-end latency percentiles."""
+        with self._cond:
+            report = {"workers": self.workers, "busy_workers": sum(b is not None for b in self._busy),
+                      "queued": sum(len(q) for q in self._queues.values()), "models": {}}
+            for name, m in self._metrics.items():
+                sizes = m["batch_sizes"]
+                report["models"][name] = {
+                    "batches": m["batches"],
+                    "items": m["items"],
+                    "mean_batch": round(sum(sizes) / len(sizes), 2) if sizes else None,
+                    "max_batch": max(sizes) if sizes else None,
+                    "queue_ms_p50": _percentile(m["queue_ms"], 0.5),
+                    "queue_ms_p95": _percentile(m["queue_ms"], 0.95),
+                    "latency_ms_p50": _percentile(m["latency_ms"], 0.5),
+                    "latency_ms_p95": _percentile(m["latency_ms"], 0.95),
+                }
+            return report
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+        for _, conn in self._procs:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc, _ in self._procs:
+            proc.join(timeout=5)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_server() -> InferenceServer | None:
+    """The process-wide server, started on first use; None when INFERENCE_WORKERS is 0."""
+    global _server
+    if INFERENCE_WORKERS <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = InferenceServer(INFERENCE_WORKERS)
+            atexit.register(_server.shutdown)
+        return _server
+
+
+def run_model(name: str, texts: list[str], **kwargs) -> list:
+    """
+    Run the pipeline registered as `name` over `texts`, one output per text.
+    With a server, each text joins the cross-session micro-batches (the
+    server picks batch sizes, so `batch_size` is ignored); otherwise the
+    pipeline is called in-process.
+    """
+    server = get_server()
+    if server is None:
+        return get_model(name)(texts, **kwargs)
+    kwargs.pop("batch_size", None)
+    futures = [server.submit(name, text, **kwargs) for text in texts]
+    return [f.result(timeout=RESULT_TIMEOUT_S) for f in futures]
+
+
+def metrics() -> dict:
+    server = get_server()
+    return server.metrics() if server else {"workers": 0}
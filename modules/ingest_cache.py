@@ -0,0 +1,77 @@
+# ✅ ingest_cache.py
+"""
+On-disk ingestion cache
+----------------------------------
+• Keys: YouTube video ID or SHA-256 of uploaded bytes, plus extractor/model version
+• Values: extracted text + metadata, zlib-compressed
+• Size-bounded LRU eviction; writes are atomic SQLite transactions, so
+  concurrent workers never see half-written entries
+"""
+
+import hashlib
+import re
+import time
+from typing import Callable, Optional
+
+from modules.config import get_setting
+from modules.disk_cache import DiskCache
+
+# Bump when an extractor's output changes so stale entries are never served
+EXTRACTOR_VERSIONS = {
+    "yt-transcript": "1",
+    "whisper": "1",
+    "pdf": "1",
+    "docx": "1",
+    "txt": "1",
+}
+
+_cache = DiskCache(
+    "ingest",
+    max_bytes=int(get_setting("INGEST_CACHE_MB", 512)) * 1024 * 1024,
+    compress=True,
+)
+
+
+def video_id(url: str) -> str:
+    """YouTube video ID from watch?v=, youtu.be/ and /shorts/ URLs (else the input)."""
+    m = re.search(r"(?:v=|youtu\.be/|/shorts/|/embed/)([\w-]{11})", url)
+    return m.group(1) if m else url.split("watch?v=")[-1].split("&")[0]
+
+
+def file_digest(uploaded_file, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file-like object's bytes, read in blocks; position is reset."""
+    h = hashlib.sha256()
+    uploaded_file.seek(0)
+    for block in iter(lambda: uploaded_file.read(block_size), b""):
+        h.update(block)
+    uploaded_file.seek(0)
+    return h.hexdigest()
+
+
+def cache_key(source_id: str, extractor: str, variant: str = "") -> str:
+    version = EXTRACTOR_VERSIONS[extractor]
+    return f"{source_id}:{extractor}{'-' + variant if variant else ''}:v{version}"
+
+
+def lookup(key: str) -> Optional[str]:
+    entry = _cache.get(key)
+    return entry["text"] if entry else None
+
+
+def store(key: str, text: str, **metadata) -> None:
+    _cache.set(key, {"text": text, "created": time.time(), **metadata})
+
+
+def cached(key: str, compute: Callable[[], Optional[str]], **metadata) -> Optional[str]:
+    """Return the cached text for `key`, else compute it and store non-empty results."""
+    text = lookup(key)
+    if text is not None:
+        return text
+    text = compute()
+    if text:
+        store(key, text, **metadata)
+    return text
+
+
+def stats() -> dict:
+    return _cache.info()
@@ -2,19 +2,26 @@
 """
 Unified ingestion module
 ----------------------------------
-• YouTube -> transcript (or Whisper fallback)
-• Audio   -> Whisper transcription
+• YouTube -> transcript (or Whisper fallback, streamed: the smallest adequate
+  audio-only format is decoded and transcribed while it downloads)
+• Audio   -> Whisper transcription (segmented, see transcriber.py)
 • PDF/DOCX/TXT -> raw text (your code reused)
+• PDF pages are read lazily from disk by iter_pdf_pages (optionally across a
+  process pool) and joined into the document text
+• Results are cached on disk by video ID / file hash (see ingest_cache.py)
 """
 
-import tempfile, os
-from typing import Optional
-import yt_dlp, whisper, fitz               # PyMuPDF
+import tempfile, os, shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import yt_dlp, fitz                        # PyMuPDF
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
 from docx import Document
 
-# Whisper model cached once
-_whisper = whisper.load_model("base")      # base is fine on M2; tiny is faster
+from modules import ingest_cache
+from modules.chunker import iter_chunks
+from modules.config import get_setting
+from modules.transcriber import transcribe, transcribe_stream
 
 # ----------  YOUR RESUME/PDF/TXT/DOCX EXTRACTOR  ----------
 def _extract_text_from_file(uploaded_file) -> Optional[str]:
@@ -28,16 +35,71 @@ def _extract_text_from_file(uploaded_file) -> Optional[str]:
         return "\n".join(p.text for p in doc.paragraphs)
 
     if file_type == "pdf":
-        text = ""
-        with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-            for page in doc:
-                text += page.get_text()
-        return text
+        return "".join(text for _, text in iter_pdf_pages(uploaded_file))
     return None
 # ----------------------------------------------------------
 
-def _transcribe(path: str) -> str:
-    return _whisper.transcribe(path)["text"]
+# -----------  STREAMING PDF EXTRACTION  -------------------
+PDF_PAGES_PER_TASK = 16
+PDF_POOL_MIN_PAGES = 200     # below this a process pool costs more than it saves
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> list[str]:
+    """Worker: text of pages [start, stop) (0-based) of the PDF at `path`."""
+    with fitz.open(path) as doc:
+        return [doc.load_page(i).get_text() for i in range(start, stop)]
+
+
+def _spool_to_disk(uploaded_file) -> str:
+    """Copy an upload to a temp file in fixed-size blocks; caller deletes it."""
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        shutil.copyfileobj(uploaded_file, tmp, length=1024 * 1024)
+        return tmp.name
+
+
+def iter_pdf_pages(source,
+                   first_page: int = 1,
+                   last_page: Optional[int] = None,
+                   workers: Optional[int] = None) -> Iterator[tuple[int, str]]:
+    """
+    Yields (page_number, text) for a PDF path or file-like upload, in page
+    order, 1-based. Pages are read lazily from disk so peak memory does not
+    grow with page count. `workers` > 1 spreads page ranges across a process
+    pool (None = automatic for large documents); at most two ranges per worker
+    are in flight at a time.
+    """
+    path = source if isinstance(source, (str, os.PathLike)) else _spool_to_disk(source)
+    try:
+        with fitz.open(path) as doc:
+            stop = min(last_page or doc.page_count, doc.page_count)
+            start = max(first_page, 1) - 1
+            if workers is None:
+                workers = (os.cpu_count() or 1) if stop - start >= PDF_POOL_MIN_PAGES else 1
+
+            if workers <= 1:
+                for i in range(start, stop):
+                    yield i + 1, doc.load_page(i).get_text()
+                return
+
+        ranges = [(a, min(a + PDF_PAGES_PER_TASK, stop))
+                  for a in range(start, stop, PDF_PAGES_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for a, b in ranges:
+                pending.append((a, pool.submit(_extract_page_range, path, a, b)))
+                if len(pending) >= workers * 2:
+                    a0, fut = pending.pop(0)
+                    yield from enumerate(fut.result(), a0 + 1)
+            for a0, fut in pending:
+                yield from enumerate(fut.result(), a0 + 1)
+    finally:
+        if path is not source:
+            os.unlink(path)
+
+def _transcribe(path: str, model_size: str = "base") -> str:
+    # base is fine on M2; tiny is faster, small is more accurate
+    return transcribe(path, model_size=model_size)["text"]
 
 def _download_audio(url: str, out_dir: str) -> str:
     ydl_opts = {
@@ -49,9 +111,50 @@ def _download_audio(url: str, out_dir: str) -> str:
         info = ydl.extract_info(url, download=True)
         return os.path.join(out_dir, f"{info['id']}.{info['ext']}")
 
+# -----------  STREAMING YOUTUBE AUDIO  ---------------------
+YT_STREAMING = str(get_setting("YT_STREAMING", "1")).lower() not in ("0", "false")
+YT_MIN_ABR = float(get_setting("YT_MIN_ABR", 32))     # kbps; plenty for 16 kHz speech
+
+
+def _pick_audio_format(formats: list[dict]) -> dict:
+    """Smallest audio-only format of at least YT_MIN_ABR kbps (else the smallest with audio)."""
+    with_audio = [f for f in formats if f.get("acodec") not in (None, "none") and f.get("url")]
+    if not with_audio:
+        raise ValueError("no downloadable audio format")
+    audio_only = [f for f in with_audio if f.get("vcodec") in (None, "none")]
+    adequate = [f for f in audio_only if (f.get("abr") or 0) >= YT_MIN_ABR]
+
+    def size(f):
+        return (f.get("filesize") or f.get("filesize_approx") or float("inf"),
+                f.get("abr") or f.get("tbr") or float("inf"))
+
+    return min(adequate or audio_only or with_audio, key=size)
+
+
+def _audio_stream(url: str) -> tuple[str, dict]:
+    """(media URL, HTTP headers) of the audio format to stream; nothing is downloaded."""
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    fmt = _pick_audio_format(info.get("formats") or [info])
+    return fmt["url"], fmt.get("http_headers") or info.get("http_headers") or {}
+
+
+def iter_stream_transcript(source: str, whisper_model: str = "base",
+                           headers: Optional[dict] = None) -> Iterator[str]:
+    """
+    Transcript text of `source` piece by piece as the audio streams in. A
+    video URL is resolved to its smallest adequate audio format first; a
+    local media file is decoded as is (handy as a stand-in for the network).
+    """
+    if headers is None and not os.path.exists(source):
+        source, headers = _audio_stream(source)
+    for seg in transcribe_stream(source, model_size=whisper_model, headers=headers):
+        yield seg["text"]
+
+
 def _yt_transcript(url: str) -> Optional[str]:
     try:
-        vid = url.split("watch?v=")[-1].split("&")[0]
+        vid = ingest_cache.video_id(url)
         data = YouTubeTranscriptApi.get_transcript(vid, languages=["en"])
         return " ".join(d["text"] for d in data)
     except TranscriptsDisabled:
@@ -60,29 +163,59 @@ def _yt_transcript(url: str) -> Optional[str]:
 # -----------  PUBLIC ENTRY POINT  -------------------------
 def handle_input(youtube_url: str = "",
                  uploaded_file=None,
-                 raw_text: str = "") -> str:
-    """Return plain text ready for downstream modules."""
-    # 1) YouTube pipeline
+                 raw_text: str = "",
+                 whisper_model: str = "base",
+                 on_partial=None) -> str:
+    """
+    Return plain text ready for downstream modules. When a YouTube video has
+    no transcript, its audio is streamed through Whisper (YT_STREAMING=0
+    downloads it first instead) and `on_partial(text)` receives each
+    transcribed piece as it is ready.
+    """
+    # 1) YouTube pipeline (cached by video ID)
     if youtube_url:
-        txt = _yt_transcript(youtube_url)
+        vid = ingest_cache.video_id(youtube_url)
+        txt = ingest_cache.cached(ingest_cache.cache_key(f"yt:{vid}", "yt-transcript"),
+                                  lambda: _yt_transcript(youtube_url), source=youtube_url)
         if txt:
             return txt            # transcript exists
-        # fallback: DL audio + Whisper
-        with tempfile.TemporaryDirectory() as tmp:
-            audio_fp = _download_audio(youtube_url, tmp)
-            return _transcribe(audio_fp)
 
-    # 2) File upload pipeline
+        # fallback: DL audio + Whisper
+        def _download_and_transcribe():
+            if YT_STREAMING:
+                pieces = []
+                for piece in iter_stream_transcript(youtube_url, whisper_model):
+                    pieces.append(piece)
+                    if on_partial:
+                        on_partial(piece)
+                return " ".join(pieces)
+            with tempfile.TemporaryDirectory() as tmp:
+                audio_fp = _download_audio(youtube_url, tmp)
+                return _transcribe(audio_fp, whisper_model)
+
+        return ingest_cache.cached(ingest_cache.cache_key(f"yt:{vid}", "whisper", whisper_model),
+                                   _download_and_transcribe, source=youtube_url) or ""
+
+    # 2) File upload pipeline (cached by SHA-256 of the bytes)
     if uploaded_file is not None:
-        txt = _extract_text_from_file(uploaded_file)
-        if txt:
-            return txt
+        file_type = uploaded_file.name.split('.')[-1].lower()
+        digest = f"file:{ingest_cache.file_digest(uploaded_file)}"
+        if file_type in ("txt", "docx", "pdf"):
+            txt = ingest_cache.cached(ingest_cache.cache_key(digest, file_type),
+                                      lambda: _extract_text_from_file(uploaded_file),
+                                      source=uploaded_file.name)
+            if txt:
+                return txt
         # If it’s an audio file
-        if uploaded_file.name.split('.')[-1].lower() in ("mp3", "wav"):
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(uploaded_file.getbuffer())
-                tmp.flush()
-                return _transcribe(tmp.name)
+        if file_type in ("mp3", "wav"):
+            def _transcribe_upload():
+                with tempfile.NamedTemporaryFile(suffix=f".{file_type}") as tmp:
+                    tmp.write(uploaded_file.getbuffer())
+                    tmp.flush()
+                    return _transcribe(tmp.name, whisper_model)
+
+            return ingest_cache.cached(ingest_cache.cache_key(digest, "whisper", whisper_model),
+                                       _transcribe_upload, source=uploaded_file.name) or ""
 
     # 3) Raw text
     if raw_text.strip():
@@ -93,6 +226,7 @@ def handle_input(youtube_url: str = "",
 def split_text_into_chunks(text: str, max_chunk_length: int = 200) -> list[str]:
     """
     Splits long text into smaller chunks for vector embedding.
+    Thin wrapper over the shared chunker (modules/chunker.py) with a character budget.
 
     Args:
         text (str): The input text to be split.
@@ -101,19 +235,4 @@ def split_text_into_chunks(text: str, max_chunk_length: int = 200) -> list[str]:
     Returns:
         list[str]: A list of text chunks.
     """
-    words = text.split()
-    chunks = []
-    current_chunk = []
-
-    for word in words:
-        if len(" ".join(current_chunk + [word])) <= max_chunk_length:
-            current_chunk.append(word)
-        else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
-
+    return [c.text for c in iter_chunks(text, max_tokens=max_chunk_length, tokenizer="chars")]
@@ -0,0 +1,174 @@
+# ✅ jobs.py
+"""
+Background jobs shared across Streamlit sessions
+----------------------------------
+• One worker pool per process; long steps (extract, summarize, quiz) run there
+• Each job has an ID, progress, partial output, cooperative cancellation
+  and a result handle
+• Sessions keep only the job ID; reruns poll status and never recompute
+• Identical in-flight jobs (same key) are coalesced: later submitters share
+  the running job, and it is only cancelled once every subscribing session
+  cancels (a session resubmitting the same job still counts once)
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from modules.config import get_setting
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_TTL = 3600           # seconds a finished job stays pollable
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key: str, label: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.partials: list[str] = []
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.subscribers: set[str] = set()
+        self._cancel = threading.Event()
+        self._future = None
+
+    # Called from inside the job function
+    def report(self, progress: float, message: str = "") -> None:
+        """Update progress (0..1); raises JobCancelled once the job is cancelled."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = max(0.0, min(1.0, progress))
+        self.message = message
+
+    def emit(self, partial: str) -> None:
+        """Publish a piece of output (e.g. a chunk summary) before the job finishes."""
+        self.partials.append(partial)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobManager:
+    def __init__(self, max_workers: int | None = None):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or int(get_setting("JOB_WORKERS", 4)),
+            thread_name_prefix="job")
+        self._jobs: dict[str, Job] = {}
+        self._inflight: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable[[Job], object], label: str = "",
+               session: str | None = None) -> Job:
+        """
+        Run fn(job) in the pool, or join the in-flight job with the same key,
+        subscribing `session` (each call without one is its own subscriber).
+        `fn` should call job.report(...) periodically so it can be cancelled.
+        """
+        session = session or uuid.uuid4().hex
+        with self._lock:
+            self._purge_locked()
+            job = self._inflight.get(key)
+            if job is not None and not job._cancel.is_set():    # a cancelled job is only winding down
+                job.subscribers.add(session)
+                return job
+            job = Job(key, label)
+            job.subscribers.add(session)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            job._future = self._pool.submit(self._run, job, fn)
+            return job
+
+    def get(self, job_id: str | None) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str, session: str | None = None) -> None:
+        """
+        Unsubscribe `session` (without one: every subscriber); the work stops
+        when nobody is waiting for it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            if session is None:
+                job.subscribers.clear()
+            else:
+                job.subscribers.discard(session)
+            if job.subscribers:
+                return
+            job._cancel.set()
+            if job._future.cancel():            # never started
+                self._finish_locked(job, CANCELLED)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(j.status == RUNNING for j in self._jobs.values())
+            queued = sum(j.status == QUEUED for j in self._jobs.values())
+            return {"running": running, "queued": queued, "tracked": len(self._jobs)}
+
+    def _run(self, job: Job, fn) -> None:
+        if job._cancel.is_set():
+            with self._lock:
+                self._finish_locked(job, CANCELLED)
+            return
+        job.status = RUNNING
+        try:
+            result = fn(job)
+            with self._lock:
+                job.result, job.progress = result, 1.0
+                self._finish_locked(job, DONE)
+        except JobCancelled:
+            with self._lock:
+                self._finish_locked(job, CANCELLED)
+        except Exception as e:
+            with self._lock:
+                job.error = str(e)
+                self._finish_locked(job, FAILED)
+
+    def _finish_locked(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished = time.time()
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def _purge_locked(self) -> None:
+        cutoff = time.time() - FINISHED_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """The process-wide manager shared by every session."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
+
+
+def job_key(step: str, *parts) -> str:
+    """Content key for coalescing, e.g. job_key("summary", doc_text)."""
+    h = hashlib.sha256(step.encode("utf-8"))
+    for part in parts:
+        h.update(b"\0")
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return f"{step}:{h.hexdigest()}"
@@ -0,0 +1,352 @@
+# ✅ keyterms.py
+"""
+Offline key-term extraction
+----------------------------------
+• Candidates: runs of content words between stopwords, digits and
+  punctuation (a cheap stand-in for noun-phrase chunking), as 1–3 word
+  phrases; plurals are folded into their singular. Phrases holding a
+  common verb form ("discuss gradient", "backpropagation computes") are
+  dropped, from a word list rather than a tagger
+• Vectorized: tokens become integer ids, n-grams are packed into int64 keys
+  and counted with np.unique, and occurrences form a sparse SciPy
+  term × window matrix
+• tfidf: (1 + log tf) × idf, with idf from a background corpus: the bundled
+  frequency-ranked English word list (Zipf estimate of document frequency),
+  or a df table written by build_background(). Words the background lacks
+  are weighed by their idf over the document's own chunks instead, so
+  vocabulary spread evenly through a long text ranks below concentrated
+  terms. A phrase counts its most specific word plus half of the others,
+  and must occur at least twice
+• textrank: personalised PageRank over the window co-occurrence graph
+  (X·Xᵀ), teleporting in proportion to the TF-IDF scores, times idf
+• No network or models; ~100k words take a few hundred milliseconds
+"""
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from modules.config import get_setting
+
+BACKGROUND_PATH = get_setting(
+    "KEY_TERMS_BACKGROUND", os.path.join(os.path.dirname(__file__), "data", "english_ranked.txt"))
+MAX_NGRAM = 3
+MIN_TF_TOKENS = 2000          # above this many tokens, terms seen once are dropped
+WINDOW_TOKENS = 10            # co-occurrence window for TextRank
+ZIPF_CONSTANT = 0.1           # p(word of rank r) ≈ 0.1 / r in English
+ZIPF_DOC_WORDS = 1000         # document length the Zipf df estimate assumes
+UNLISTED_RANK = 20000         # assumed rank of words missing from a ranked list
+MAX_GRAPH_TERMS = 5000        # TextRank runs over the best TF-IDF candidates only
+IDF_CHUNK_TOKENS = 250        # pseudo-document size for the document's own idf
+IDF_MIN_CHUNKS = 8            # shorter texts keep the background's idf for unlisted words
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+
+STOPWORDS = frozenset("""
+a about above after again against all almost also although am among an and another any anyone
+anything are around as at be because been before being below between both but by can cannot
+could did do does doing done down during each either else enough etc even ever every few for
+from further get gets getting got had has have having he her here hers herself him himself his
+how however i if in into is it its itself just least less let like made make makes many may me
+might more most much must my myself neither no nor not now of off often on once one only onto
+or other others otherwise our ours ourselves out over own per perhaps quite rather really said
+same say says see seen shall she should since so some such than that the their theirs them
+themselves then there therefore these they this those though through thus to too toward towards
+two under until up upon us use used uses using very via was we well were what whatever when
+where whether which while who whom whose why will with within without would yet you your yours
+yourself yourselves
+""".split())
+
+# Common verbs, minus those often used as nouns in terms ("support vector",
+# "learning rate", "test set"); -ing forms are left out for the same reason.
+_VERBS = """
+accept achieve add affect agree allow analyse analyze appear argue arise assume attempt avoid
+become begin believe belong bring compare compute concern conclude consider consist contain
+continue converge correspond create decide define demonstrate denote depend derive describe
+determine discuss emerge enable ensure establish evaluate exist expect explain explore express
+find follow give go happen illustrate imply improve include indicate introduce involve keep
+know learn leave let look mention obtain occur perform prefer prove provide reach realize
+receive recognize refer reflect regard relate rely remain remember represent require reveal
+seem show solve specify suggest suppose take talk tell tend think try understand want write
+""".split()
+_IRREGULAR_PAST = {
+    "arise": "arose arisen", "become": "became", "begin": "began begun", "bring": "brought",
+    "find": "found", "give": "gave given", "go": "went gone", "keep": "kept",
+    "know": "knew known", "leave": "left", "prove": "proved proven",
+    "show": "showed shown", "take": "took taken", "tell": "told", "think": "thought",
+    "write": "wrote written",
+}
+
+
+def _inflect(verb: str) -> tuple[list[str], list[str]]:
+    """([base, third person], past forms) of a verb."""
+    if verb.endswith(("s", "sh", "ch", "x", "o")):
+        third = verb + "es"
+    elif verb.endswith("y") and verb[-2] not in "aeiou":
+        third = verb[:-1] + "ies"
+    else:
+        third = verb + "s"
+    if verb in _IRREGULAR_PAST:
+        return [verb, third], _IRREGULAR_PAST[verb].split()
+    if third.endswith("ies"):
+        return [verb, third], [verb[:-1] + "ied"]
+    return [verb, third], [(verb[:-1] if verb.endswith("e") else verb) + "ed"]
+
+
+_TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:[-'’][A-Za-z0-9]+)*|[0-9]+|[^\sA-Za-z0-9]")
+_BREAK = -1
+
+
+def _normalize(word: str) -> str:
+    """Lower-case, drop a possessive, fold a regular plural into its singular."""
+    word = word.lower().replace("’", "'")
+    if word.endswith("'s"):
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+# Compared after _normalize, which folds "computes" into "compute". A present
+# form ends a candidate anywhere in it; a past form only at its end, since
+# participles often open terms ("hidden layer", "supervised learning").
+VERB_PRESENT = frozenset(_normalize(f) for v in _VERBS for f in _inflect(v)[0])
+VERB_PAST = frozenset(_normalize(f) for v in _VERBS for f in _inflect(v)[1])
+
+
+# ─────────── Background corpus ────────────────────────
+class Background:
+    """Word -> idf from a ranked word list or a `word<TAB>df` table."""
+
+    def __init__(self, idf: dict[str, float], unseen: float):
+        self.idf = idf
+        self.unseen = unseen
+
+    @classmethod
+    def load(cls, path: str) -> "Background":
+        with open(path, encoding="utf-8") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+        if lines and lines[0].startswith("#documents\t"):
+            documents = int(lines[0].split("\t")[1])
+            idf = {}
+            for line in lines[1:]:
+                word, df = line.split("\t")
+                idf[word] = math.log((documents + 1) / (int(df) + 1))
+            return cls(idf, math.log(documents + 1))
+
+        def zipf_idf(rank):
+            # Chance a ZIPF_DOC_WORDS-word document contains the word at this rank
+            return -math.log(-math.expm1(-ZIPF_DOC_WORDS * ZIPF_CONSTANT / rank))
+
+        idf = {}
+        for word in (line.strip() for line in lines if not line.startswith("#")):
+            idf.setdefault(_normalize(word), zipf_idf(len(idf) + 1))
+        return cls(idf, zipf_idf(max(UNLISTED_RANK, len(idf) + 1)))
+
+    def __getitem__(self, word: str) -> float:
+        return self.idf.get(word, self.unseen)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.idf
+
+
+def build_background(texts, path: str) -> int:
+    """
+    Write a document-frequency table over `texts` (e.g. the study library)
+    for use as KEY_TERMS_BACKGROUND; returns the number of documents.
+    """
+    df, documents = Counter(), 0
+    for text in texts:
+        df.update({_normalize(w) for w in _TOKEN.findall(text) if w[0].isalpha()})
+        documents += 1
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#documents\t{documents}\n")
+        f.writelines(f"{word}\t{n}\n" for word, n in df.most_common())
+    return documents
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def get_background() -> Background:
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = Background.load(BACKGROUND_PATH)
+        return _background
+
+
+# ─────────── Candidates ───────────────────────────────
+def _tokenize(text: str):
+    """(word id per token with _BREAK for stopwords / punctuation, words, display forms)."""
+    raw_ids, raw_vocab = [], {}
+    for raw in _TOKEN.findall(text):
+        raw_ids.append(raw_vocab.setdefault(raw, len(raw_vocab)) if raw[0].isalpha() else _BREAK)
+    counts = Counter(raw_ids)
+
+    words, word_ids, forms = [], {}, []
+    raw_to_word = np.full(len(raw_vocab) + 1, _BREAK, dtype=np.int64)    # last slot: _BREAK
+    for raw, i in raw_vocab.items():
+        word = _normalize(raw)
+        if word in STOPWORDS or raw.lower() in STOPWORDS or "'" in word or len(word) < 2:
+            continue
+        if word not in word_ids:
+            word_ids[word] = len(words)
+            words.append(word)
+            forms.append(Counter())
+        raw_to_word[i] = word_ids[word]
+        forms[word_ids[word]][raw] += counts[i]
+
+    def display(c: Counter) -> str:
+        # Most frequent spelling, but lower case unless the word is always capitalised
+        lower = [(n, f) for f, n in c.items() if not f[0].isupper()]
+        return max(lower)[1] if lower else c.most_common(1)[0][0]
+
+    ids = raw_to_word[np.asarray(raw_ids, dtype=np.int64)] if raw_ids else np.empty(0, np.int64)
+    return ids, words, [display(c) for c in forms]
+
+
+def _candidates(ids: np.ndarray, vocab_size: int):
+    """Per n: (unique n-gram keys, counts, occurrence positions, inverse index)."""
+    valid = ids >= 0
+    out = []
+    for n in range(1, MAX_NGRAM + 1):
+        if len(ids) < n:
+            break
+        m = len(ids) - n + 1                        # n-gram start positions
+        ok = np.ones(m, dtype=bool)
+        key = np.zeros(m, dtype=np.int64)
+        for j in range(n):
+            ok &= valid[j:j + m]
+            key = key * vocab_size + np.maximum(ids[j:j + m], 0)
+        positions = np.flatnonzero(ok)
+        keys, inverse, counts = np.unique(key[positions], return_inverse=True, return_counts=True)
+        out.append((keys, counts, positions, inverse))
+    return out
+
+
+def _decode(key: int, n: int, vocab_size: int) -> tuple[int, ...]:
+    parts = []
+    for _ in range(n):
+        key, word = divmod(key, vocab_size)
+        parts.append(word)
+    return tuple(reversed(parts))
+
+
+# ─────────── Scoring ──────────────────────────────────
+def _word_idf(ids: np.ndarray, words: list[str], background: Background) -> np.ndarray:
+    """
+    idf per word id: the background's where it lists the word. For the rest it
+    scales the background's unseen idf by the word's idf over the text's own
+    IDF_CHUNK_TOKENS-token chunks, normalised to 1 for a word in a single chunk.
+    """
+    idf = np.array([background[w] for w in words])
+    chunks = -(-len(ids) // IDF_CHUNK_TOKENS)
+    if chunks < IDF_MIN_CHUNKS:
+        return idf
+    pos = np.flatnonzero(ids >= 0)
+    pairs = np.unique(pos // IDF_CHUNK_TOKENS * len(words) + ids[pos])
+    df = np.bincount(pairs % len(words), minlength=len(words))
+    local = (np.log((chunks + 1) / (df + 1)) + 1) / (np.log((chunks + 1) / 2) + 1)
+    unlisted = np.array([w not in background for w in words])
+    idf[unlisted] *= local[unlisted]
+    return idf
+
+
+def _textrank(rows: np.ndarray, positions: np.ndarray, n_terms: int, teleport: np.ndarray) -> np.ndarray:
+    """Personalised PageRank over terms sharing a window (two offset windowings)."""
+    graph = None
+    for offset in (0, WINDOW_TOKENS // 2):
+        windows = (positions + offset) // WINDOW_TOKENS
+        X = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, windows)),
+                              shape=(n_terms, int(windows.max()) + 1))
+        X.data[:] = 1.0                                  # presence, not counts
+        C = X @ X.T
+        graph = C if graph is None else graph + C
+    graph.setdiag(0)
+    graph.eliminate_zeros()
+    degree = np.asarray(graph.sum(axis=0)).ravel()
+    P = graph @ sparse.diags(np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0))
+    p = teleport / teleport.sum()
+    r = p.copy()
+    dangling = degree == 0
+    for _ in range(TEXTRANK_ITERATIONS):
+        r = TEXTRANK_DAMPING * (P @ r + r[dangling].sum() * p) + (1 - TEXTRANK_DAMPING) * p
+    return r
+
+
+def extract_terms(text: str, top_k: int = 10, method: str = "tfidf") -> list[str]:
+    """
+    The `top_k` key terms of `text`, best first, computed locally.
+    method="tfidf" ranks candidates by TF-IDF against the background corpus;
+    "textrank" re-ranks them by co-occurrence centrality, seeded by TF-IDF.
+    A term overlapping a better-ranked one is skipped, unless it is a longer
+    phrase around it that occurs at least half as often, which replaces it.
+    """
+    if method not in ("tfidf", "textrank"):
+        raise ValueError(f"Unknown key-term method '{method}'")
+    ids, words, forms = _tokenize(text)
+    V = max(len(words), 1)
+    grams = _candidates(ids, V)
+    if not grams or not len(grams[0][0]):
+        return []
+
+    word_idf = _word_idf(ids, words, get_background())
+    verb_present = np.array([w in VERB_PRESENT for w in words])
+    verb_past = np.array([w in VERB_PAST for w in words])
+    min_tf = 2 if len(ids) > MIN_TF_TOKENS else 1
+
+    # One row per candidate term across all n
+    term_n, term_key, term_tf, term_idf, occ_rows, occ_pos = [], [], [], [], [], []
+    for n, (keys, counts, positions, inverse) in enumerate(grams, 1):
+        keep = counts >= (min_tf if n == 1 else max(min_tf, 2))   # a one-off phrase is just adjacency
+        word_at = np.stack([keys // V ** (n - 1 - j) % V for j in range(n)])
+        keep &= ~verb_present[word_at].any(axis=0) & ~verb_past[word_at[-1]]
+        parts = word_idf[word_at]
+        idf = parts.max(axis=0) + 0.5 * (parts.sum(axis=0) - parts.max(axis=0))
+        row_of = np.cumsum(keep) - 1 + sum(len(k) for k in term_key)
+        term_n.append(np.full(keep.sum(), n))
+        term_key.append(keys[keep])
+        term_tf.append(counts[keep])
+        term_idf.append(idf[keep])
+        if method == "textrank":
+            occ = keep[inverse]
+            occ_rows.append(row_of[inverse[occ]])
+            occ_pos.append(positions[occ])
+    term_n, term_key = np.concatenate(term_n), np.concatenate(term_key)
+    term_tf, term_idf = np.concatenate(term_tf), np.concatenate(term_idf)
+    if not len(term_tf):
+        return []
+    scores = (1 + np.log(term_tf)) * term_idf
+
+    if method == "textrank":
+        graph_terms = np.argsort(-scores, kind="stable")[:MAX_GRAPH_TERMS]
+        remap = np.full(len(scores), -1)
+        remap[graph_terms] = np.arange(len(graph_terms))
+        rows, pos = remap[np.concatenate(occ_rows)], np.concatenate(occ_pos)
+        in_graph = rows >= 0
+        rank = _textrank(rows[in_graph], pos[in_graph], len(graph_terms), scores[graph_terms])
+        scores = np.zeros(len(scores))
+        scores[graph_terms] = rank * term_idf[graph_terms]
+
+    picked = []                                          # (word set, tf, display)
+    for i in np.argsort(-scores, kind="stable"):
+        if len(picked) >= top_k or scores[i] <= 0:
+            break
+        term = _decode(int(term_key[i]), int(term_n[i]), V)
+        words_i, entry = set(term), (set(term), int(term_tf[i]), " ".join(forms[w] for w in term))
+        overlap = [j for j, (other, _, _) in enumerate(picked) if words_i <= other or other <= words_i]
+        if not overlap:
+            picked.append(entry)
+        elif len(overlap) == 1 and picked[overlap[0]][0] < words_i \
+                and 2 * term_tf[i] >= picked[overlap[0]][1]:
+            picked[overlap[0]] = entry
+    return [display for _, _, display in picked]
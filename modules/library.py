@@ -0,0 +1,231 @@
+# ✅ library.py
+"""
+Persistent study library on SQLite FTS5
+----------------------------------
+• Every ingested document (handle_input output) is split with the shared
+  chunker and stored with its summary, vocab and quiz
+• Chunks are indexed in an external-content FTS5 table (porter stemming),
+  kept in sync by triggers; search is BM25-ranked with highlighted snippets
+• add_documents inserts in batched transactions and skips texts already
+  in the library, so re-running an import only adds what is new
+• Lookups stay index-only, so queries take milliseconds at 10k+ documents
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from modules.chunker import iter_chunks
+from modules.config import get_setting
+from modules.disk_cache import CACHE_DIR
+
+LIBRARY_PATH = get_setting("SLC_LIBRARY", os.path.join(CACHE_DIR, "library.sqlite"))
+CHUNK_TOKENS = 200            # words per indexed chunk
+INSERT_BATCH = 200            # documents per transaction in add_documents
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id           INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    title        TEXT NOT NULL,
+    source       TEXT NOT NULL DEFAULT '',
+    chars        INTEGER NOT NULL,
+    added        REAL NOT NULL,
+    summary      TEXT,
+    vocab        TEXT,
+    quiz         TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id     INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    start  INTEGER NOT NULL,
+    end    INTEGER NOT NULL,
+    text   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _match_expression(query: str) -> str:
+    """Free text -> FTS5 query: every word quoted (no syntax errors), OR-ed for BM25 to rank."""
+    words = re.findall(r"\w+", query.lower())
+    return " OR ".join(f'"{w}"' for w in dict.fromkeys(words))
+
+
+class StudyLibrary:
+    def __init__(self, path: str = LIBRARY_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    # ─────────── Inserts ──────────────────────────────
+    def _insert_locked(self, text: str, title: str | None, source: str,
+                       summary, vocab, quiz) -> int:
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        row = self._conn.execute("SELECT id FROM documents WHERE content_hash = ?",
+                                 (content_hash,)).fetchone()
+        if row is not None:
+            self._update_locked(row[0], summary, vocab, quiz)
+            return row[0]
+        title = title or text.strip()[:80]
+        doc_id = self._conn.execute(
+            "INSERT INTO documents (content_hash, title, source, chars, added, summary, vocab, quiz) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (content_hash, title, source, len(text), time.time(), summary,
+             json.dumps(vocab) if vocab is not None else None,
+             json.dumps(quiz) if quiz is not None else None)).lastrowid
+        self._conn.executemany(
+            "INSERT INTO chunks (doc_id, start, end, text) VALUES (?, ?, ?, ?)",
+            ((doc_id, c.start, c.end, c.text) for c in iter_chunks(text, max_tokens=CHUNK_TOKENS)))
+        return doc_id
+
+    def _update_locked(self, doc_id: int, summary=None, vocab=None, quiz=None) -> None:
+        for column, value in (("summary", summary), ("vocab", vocab), ("quiz", quiz)):
+            if value is not None:
+                value = value if column == "summary" else json.dumps(value)
+                self._conn.execute(f"UPDATE documents SET {column} = ? WHERE id = ?", (value, doc_id))
+
+    def add_document(self, text: str, title: str | None = None, source: str = "",
+                     summary: str | None = None, vocab: dict | None = None,
+                     quiz: dict | None = None) -> int:
+        """
+        Store `text` (e.g. handle_input output) with its artifacts; returns the
+        document id. A text already in the library only has its artifacts updated.
+        """
+        return self.add_documents([dict(text=text, title=title, source=source,
+                                        summary=summary, vocab=vocab, quiz=quiz)])[0]
+
+    def add_documents(self, docs, batch_size: int = INSERT_BATCH) -> list[int]:
+        """
+        Bulk add_document over an iterable of dicts with key "text" and
+        optional title, source, summary, vocab, quiz; one transaction per batch.
+        """
+        ids, batch = [], []
+
+        def flush():
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for d in batch:
+                        ids.append(self._insert_locked(
+                            d["text"], d.get("title"), d.get("source") or "",
+                            d.get("summary"), d.get("vocab"), d.get("quiz")))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            batch.clear()
+
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return ids
+
+    def update_artifacts(self, doc_id: int, summary: str | None = None,
+                         vocab: dict | None = None, quiz: dict | None = None) -> None:
+        with self._lock:
+            self._update_locked(doc_id, summary, vocab, quiz)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def optimize(self) -> None:
+        """Merge FTS5 index segments; worth running after a large import."""
+        with self._lock:
+            self._conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('optimize')")
+
+    # ─────────── Queries ──────────────────────────────
+    def search(self, query: str, limit: int = 10, doc_ids: list[int] | None = None,
+               highlight: tuple[str, str] = ("**", "**"), snippet_tokens: int = 16) -> list[dict]:
+        """
+        BM25-ranked chunks matching `query` (best first), optionally limited to
+        `doc_ids`. Each hit has doc_id, title, start, end, text, snippet (with
+        matches wrapped in `highlight`) and score (lower bm25 is better; score
+        is its negation so higher is better).
+        """
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT c.doc_id, d.title, c.start, c.end, c.text, "
+            "       snippet(chunks_fts, 0, ?, ?, '…', ?), bm25(chunks_fts) AS rank "
+            "FROM chunks_fts "
+            "JOIN chunks c ON c.id = chunks_fts.rowid "
+            "JOIN documents d ON d.id = c.doc_id "
+            "WHERE chunks_fts MATCH ?")
+        params = [highlight[0], highlight[1], snippet_tokens, expression]
+        if doc_ids:
+            sql += f" AND c.doc_id IN ({','.join('?' * len(doc_ids))})"
+            params += list(doc_ids)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"doc_id": doc_id, "title": title, "start": start, "end": end, "text": text,
+                 "snippet": snippet, "score": round(-rank, 4)}
+                for doc_id, title, start, end, text, snippet, rank in rows]
+
+    def document(self, doc_id: int) -> dict | None:
+        """Metadata and stored artifacts of a document."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, source, chars, added, summary, vocab, quiz FROM documents WHERE id = ?",
+                (doc_id,)).fetchone()
+        if row is None:
+            return None
+        doc = dict(zip(("id", "title", "source", "chars", "added", "summary"), row[:6]))
+        doc["vocab"] = json.loads(row[6]) if row[6] else None
+        doc["quiz"] = json.loads(row[7]) if row[7] else None
+        return doc
+
+    def documents(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        """Most recently added documents first (id, title, source, chars, added)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, source, chars, added FROM documents "
+                "ORDER BY added DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [dict(zip(("id", "title", "source", "chars", "added"), r)) for r in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            docs, chars = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM documents").fetchone()
+            chunks = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {"documents": docs, "chunks": chunks, "chars": chars,
+                "bytes": os.path.getsize(self.path)}
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> StudyLibrary:
+    """The process-wide library at LIBRARY_PATH."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = StudyLibrary()
+        return _library
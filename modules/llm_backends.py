@@ -0,0 +1,288 @@
+# ✅ llm_backends.py
+"""
+LLM backends and the per-task router behind llm_client
+----------------------------------
+• LLMBackend: complete / stream / acomplete over chat messages
+• OpenAIBackend: gpt-3.5-turbo over the network; the async path is
+  rate-limited and retried with exponential backoff
+• LocalSeq2SeqBackend: flan-t5 on CPU (vocab_helper's registered pipeline);
+  no network. Longer prompts are cut to its input window (head and tail
+  kept), and it cannot produce JSON, so it only serves free-text tasks;
+  it is first choice for short ones (term definitions)
+• Router: an ordered backend preference per task type. Backends whose
+  prompt limit is exceeded or that failed in the last FAILURE_COOLDOWN_S
+  are tried last, a backend whose observed latency (EWMA) is
+  LATENCY_SWITCH_RATIO times better is promoted, and llm_client falls back
+  down the list when a call fails or its reply does not validate
+• LLM_BACKEND=openai|local pins every task to one backend (local = offline:
+  JSON tasks such as quizzes then fail); register_backend() lets tests
+  plug in their own
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+from modules.config import get_setting
+
+# From env, config file or Streamlit secrets
+OPENAI_API_KEY = get_setting("OPENAI_API_KEY")
+DEFAULT_MODEL = "gpt-3.5-turbo"
+LLM_BACKEND = get_setting("LLM_BACKEND", "auto")
+
+# Preferred backends per task, best first; unknown tasks use DEFAULT_ROUTE.
+# Tasks whose reply must be JSON stay on OpenAI: flan-t5 never produces it.
+# Free-text tasks fall back to local, which is also the offline backend;
+# one-line definitions are within flan-t5's reach, so they start there.
+TASK_ROUTES = {
+    "fill_blank": ("openai",),
+    "mcq": ("openai",),
+    "quiz": ("openai",),
+    "quiz_batch": ("openai",),
+    "key_terms": ("openai",),
+    "qa": ("openai", "local"),
+    "study_plan": ("openai", "local"),
+    "definition": ("local", "openai"),
+}
+DEFAULT_ROUTE = ("openai", "local")
+
+FAILURE_COOLDOWN_S = 60       # a failed backend is tried last for this long
+LATENCY_SWITCH_RATIO = 3.0    # promote the runner-up when it is this much faster
+EWMA_ALPHA = 0.2
+
+
+def _prompt_text(messages: list) -> str:
+    return "\n\n".join(m["content"] for m in messages)
+
+
+def approx_tokens(messages: list) -> int:
+    """Cheap prompt-size estimate (~1.3 tokens per word) for routing decisions."""
+    return int(len(_prompt_text(messages).split()) * 1.3) + 1
+
+
+# ─────────── Backends ─────────────────────────────────
+class LLMBackend:
+    name = "base"
+    max_prompt_tokens: int | None = None    # None = no limit
+
+    def cache_id(self, model: str) -> str:
+        """Model identity for the completion cache key."""
+        return model
+
+    def complete(self, messages: list, model: str, temperature: float, max_tokens: int) -> str:
+        raise NotImplementedError
+
+    def stream(self, messages: list, model: str, temperature: float, max_tokens: int):
+        yield self.complete(messages, model, temperature, max_tokens)
+
+    async def acomplete(self, messages: list, model: str, temperature: float, max_tokens: int) -> str:
+        return await asyncio.to_thread(self.complete, messages, model, temperature, max_tokens)
+
+
+class TokenBucket:
+    """
+    Requests-per-second limiter shared by every event loop and thread in the
+    process. acquire() reserves a token and sleeps until it is due; wait() is
+    the blocking form for worker threads.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def wait(self) -> None:
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+
+rate_limiter = TokenBucket(rate=float(get_setting("OPENAI_RPS", 10)),
+                           capacity=float(get_setting("OPENAI_BURST", 10)))
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, api_key: str | None = OPENAI_API_KEY, max_retries: int = 5):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self._client = None
+        # AsyncOpenAI's connection pool is bound to the loop that created it, and
+        # every asyncio.run() in a Streamlit rerun is a fresh loop.
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _sync_client(self):
+        # Created on first use so modules import without a key (CLI steps that never call OpenAI)
+        from openai import OpenAI
+        if self._client is None:
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    def _async_client(self):
+        from openai import AsyncOpenAI
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = AsyncOpenAI(api_key=self.api_key)
+        return self._async_clients[loop]
+
+    @staticmethod
+    def _is_retryable(e: Exception) -> bool:
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+        if isinstance(e, (RateLimitError, APIConnectionError)):
+            return True
+        return isinstance(e, APIStatusError) and e.status_code >= 500
+
+    def complete(self, messages, model, temperature, max_tokens) -> str:
+        rate_limiter.wait()
+        response = self._sync_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content or ""
+
+    def stream(self, messages, model, temperature, max_tokens):
+        rate_limiter.wait()
+        stream = self._sync_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                yield delta
+
+    async def acomplete(self, messages, model, temperature, max_tokens) -> str:
+        for attempt in range(self.max_retries + 1):
+            await rate_limiter.acquire()
+            try:
+                response = await self._async_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                )
+                return response.choices[0].message.content or ""
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+
+
+class LocalSeq2SeqBackend(LLMBackend):
+    """
+    flan-t5-base on CPU, shared with vocab_helper (and micro-batched when
+    INFERENCE_WORKERS > 0). Decoding is greedy, so `temperature` is ignored;
+    the OpenAI `model` name is ignored too.
+    """
+    name = "local"
+    max_prompt_tokens = 480       # flan-t5's 512-token input window
+    model_id = "flan-t5-base"
+    HEAD_SHARE = 0.3              # of a cut prompt: the instructions up front, then the end
+
+    def cache_id(self, model: str) -> str:
+        return self.model_id
+
+    def fit_prompt(self, messages: list) -> str:
+        """The prompt, cut to max_prompt_tokens by dropping words from its middle."""
+        words = _prompt_text(messages).split()
+        budget = int(self.max_prompt_tokens / 1.3)      # approx_tokens' words-to-tokens ratio
+        if len(words) <= budget:
+            return " ".join(words)
+        head = int(budget * self.HEAD_SHARE)
+        return " ".join(words[:head] + ["…"] + words[len(words) - (budget - head):])
+
+    def complete(self, messages, model, temperature, max_tokens) -> str:
+        # Imported late: vocab_helper registers flan-t5 and itself imports llm_client
+        from modules.vocab_helper import explain_pipe
+        out = explain_pipe([self.fit_prompt(messages)], max_length=max_tokens)
+        return out[0]["generated_text"].strip()
+
+
+# ─────────── Router ───────────────────────────────────
+class Router:
+    def __init__(self, backends: dict[str, LLMBackend], routes: dict = TASK_ROUTES,
+                 pinned: str | None = None):
+        self.backends = dict(backends)
+        self.routes = dict(routes)
+        self.pinned = pinned
+        self._stats: dict[tuple[str, str], dict] = {}
+        self._down_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, backend: str, task: str) -> dict:
+        return self._stats.setdefault((backend, task), {"calls": 0, "failures": 0, "ewma_ms": None})
+
+    def candidates(self, task: str, prompt_tokens: int) -> list[LLMBackend]:
+        """Backends to try for `task`, in order."""
+        names = [self.pinned] if self.pinned else self.routes.get(task, DEFAULT_ROUTE)
+        routed = [self.backends[n] for n in names if n in self.backends]
+        # A backend whose window the prompt overflows still serves it, cut, as a last resort
+        fitting = [b for b in routed if b.max_prompt_tokens is None or prompt_tokens <= b.max_prompt_tokens]
+        now = time.monotonic()
+        with self._lock:
+            up = [b for b in fitting if self._down_until.get(b.name, 0) <= now]
+            ordered = up + [b for b in fitting if b not in up]     # recently failed go last
+            ordered += [b for b in routed if b not in fitting]
+            if len(up) > 1:
+                first = self._entry(up[0].name, task)["ewma_ms"]
+                second = self._entry(up[1].name, task)["ewma_ms"]
+                if first and second and first > LATENCY_SWITCH_RATIO * second:
+                    ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+    def record(self, backend: LLMBackend, task: str, seconds: float | None = None,
+               error: Exception | None = None) -> None:
+        with self._lock:
+            entry = self._entry(backend.name, task)
+            entry["calls"] += 1
+            if error is not None:
+                entry["failures"] += 1
+                self._down_until[backend.name] = time.monotonic() + FAILURE_COOLDOWN_S
+                return
+            ms = seconds * 1000
+            entry["ewma_ms"] = round(ms if entry["ewma_ms"] is None
+                                     else EWMA_ALPHA * ms + (1 - EWMA_ALPHA) * entry["ewma_ms"], 1)
+            self._down_until.pop(backend.name, None)
+
+    def stats(self) -> list[dict]:
+        """Calls, failures and latency EWMA per (backend, task)."""
+        with self._lock:
+            return [{"backend": b, "task": t, **s} for (b, t), s in sorted(self._stats.items())]
+
+
+_router = Router({"openai": OpenAIBackend(), "local": LocalSeq2SeqBackend()},
+                 pinned=None if LLM_BACKEND == "auto" else LLM_BACKEND)
+
+
+def get_router() -> Router:
+    return _router
+
+
+def register_backend(backend: LLMBackend, pin: bool = False) -> None:
+    """Add or replace a backend under backend.name; `pin` routes every task to it."""
+    _router.backends[backend.name] = backend
+    if pin:
+        _router.pinned = backend.name
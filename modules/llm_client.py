@@ -0,0 +1,209 @@
+# ✅ llm_client.py
+"""
+Shared completion layer
+----------------------------------
+• One entry point for qa_engine, quiz_generator, vocab_helper and study_plan
+• Each call names its task; llm_backends.Router picks OpenAI or the local
+  flan-t5 backend for it and falls back to the next backend on errors, or
+  when the caller's `validate` rejects the reply (e.g. JSON that does not parse)
+• Content-addressed disk cache: key = hash(model, messages, temperature, max_tokens)
+• TTL + size-bounded LRU eviction, hit/miss stats via cache_stats()
+• use_cache=False bypasses the cache for non-deterministic use
+• stream_chat_completion: yields text deltas as they arrive and records
+  time-to-first-token / total latency; shares the same cache
+• achat_completion: asyncio variant; the OpenAI backend rate-limits and
+  retries 429 / 5xx / connection errors with exponential backoff
+"""
+
+import hashlib
+import json
+import time
+from typing import Callable
+
+from modules.config import get_setting
+from modules.disk_cache import DiskCache
+from modules.llm_backends import DEFAULT_MODEL, approx_tokens, get_router
+
+_cache = DiskCache(
+    "completions",
+    max_bytes=int(get_setting("COMPLETION_CACHE_MB", 64)) * 1024 * 1024,
+    ttl=float(get_setting("COMPLETION_CACHE_TTL_HOURS", 168)) * 3600,
+)
+
+
+def cache_key(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([model, messages, temperature, max_tokens],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _as_messages(messages: list | str) -> list:
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return messages
+
+
+def _no_backend(task: str, errors: list) -> Exception:
+    return errors[-1] if errors else RuntimeError(f"No LLM backend can serve task '{task}'")
+
+
+def _valid(validate, content: str) -> bool:
+    if validate is None:
+        return True
+    try:
+        validate(content)
+        return True
+    except Exception:
+        return False
+
+
+def chat_completion(messages: list | str,
+                    model: str = DEFAULT_MODEL,
+                    temperature: float = 0.3,
+                    max_tokens: int = 350,
+                    use_cache: bool = True,
+                    task: str = "general",
+                    validate: Callable[[str], object] | None = None) -> str:
+    """
+    Return the completion text for `messages` (a prompt string is wrapped as one
+    user message) from the backend the router picks for `task`. Identical
+    requests are served from the disk cache unless `use_cache` is False.
+    `validate(reply)` may raise to reject a reply (cached or new): it then
+    counts as that backend failing, is not cached, and the next one is tried.
+    If every backend fails, the last error propagates to the caller.
+    """
+    messages = _as_messages(messages)
+    router, errors = get_router(), []
+    for backend in router.candidates(task, approx_tokens(messages)):
+        key = cache_key(backend.cache_id(model), messages, temperature, max_tokens)
+        if use_cache:
+            cached = _cache.get(key)
+            if cached is not None and _valid(validate, cached):
+                return cached
+        start = time.perf_counter()
+        try:
+            content = backend.complete(messages, model, temperature, max_tokens)
+            if validate is not None:
+                validate(content)           # a rejected reply counts as a failure
+        except Exception as e:
+            router.record(backend, task, error=e)
+            errors.append(e)
+            continue
+        router.record(backend, task, time.perf_counter() - start)
+        if use_cache:
+            _cache.set(key, content)
+        return content
+    raise _no_backend(task, errors)
+
+
+def stream_chat_completion(messages: list | str,
+                           model: str = DEFAULT_MODEL,
+                           temperature: float = 0.3,
+                           max_tokens: int = 350,
+                           use_cache: bool = True,
+                           stats: dict | None = None,
+                           task: str = "general",
+                           validate: Callable[[str], object] | None = None):
+    """
+    Streaming chat_completion: yields text deltas as the backend produces them.
+    A cache hit yields the whole cached text at once. If `stats` is given it is
+    filled with ttft_s (time to first token), total_s, deltas, cached and backend.
+    The full text is cached only once the stream has been consumed to the end
+    and `validate` accepts it; a cached text it rejects is skipped.
+    A backend that fails before its first delta falls back to the next one.
+    A reply `validate` rejects at the end counts as that backend failing, and
+    its error is raised: the text has already been yielded.
+    """
+    messages = _as_messages(messages)
+    stats = {} if stats is None else stats
+    stats.update(ttft_s=None, total_s=None, deltas=0, cached=False, backend=None)
+    start = time.perf_counter()
+    router, errors = get_router(), []
+
+    for backend in router.candidates(task, approx_tokens(messages)):
+        stats["backend"] = backend.name
+        key = cache_key(backend.cache_id(model), messages, temperature, max_tokens)
+        if use_cache:
+            cached = _cache.get(key)
+            if cached is not None and _valid(validate, cached):
+                stats.update(ttft_s=round(time.perf_counter() - start, 3), deltas=1, cached=True)
+                yield cached
+                stats["total_s"] = round(time.perf_counter() - start, 3)
+                return
+
+        call_start = time.perf_counter()
+        parts = []
+        try:
+            for delta in backend.stream(messages, model, temperature, max_tokens):
+                if not parts:
+                    stats["ttft_s"] = round(time.perf_counter() - start, 3)
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            router.record(backend, task, error=e)
+            if parts:
+                raise                   # already shown to the user; no silent restart
+            errors.append(e)
+            continue
+
+        content = "".join(parts)
+        stats.update(total_s=round(time.perf_counter() - start, 3), deltas=len(parts))
+        if validate is not None:
+            try:
+                validate(content)
+            except Exception as e:
+                router.record(backend, task, error=e)
+                raise
+        router.record(backend, task, time.perf_counter() - call_start)
+        if use_cache:
+            _cache.set(key, content)
+        return
+    raise _no_backend(task, errors)
+
+
+async def achat_completion(messages: list | str,
+                           model: str = DEFAULT_MODEL,
+                           temperature: float = 0.3,
+                           max_tokens: int = 350,
+                           use_cache: bool = True,
+                           task: str = "general",
+                           validate: Callable[[str], object] | None = None) -> str:
+    """
+    Async chat_completion sharing the same cache, routing and `validate`. OpenAI calls
+    pass through the process-wide rate limiter and retry 429 / 5xx with
+    exponential backoff before the router falls back.
+    """
+    messages = _as_messages(messages)
+    router, errors = get_router(), []
+    for backend in router.candidates(task, approx_tokens(messages)):
+        key = cache_key(backend.cache_id(model), messages, temperature, max_tokens)
+        if use_cache:
+            cached = _cache.get(key)
+            if cached is not None and _valid(validate, cached):
+                return cached
+        start = time.perf_counter()
+        try:
+            content = await backend.acomplete(messages, model, temperature, max_tokens)
+            if validate is not None:
+                validate(content)           # a rejected reply counts as a failure
+        except Exception as e:
+            router.record(backend, task, error=e)
+            errors.append(e)
+            continue
+        router.record(backend, task, time.perf_counter() - start)
+        if use_cache:
+            _cache.set(key, content)
+        return content
+    raise _no_backend(task, errors)
+
+
+def cache_stats() -> dict:
+    return _cache.info()
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+def router_stats() -> list[dict]:
+    return get_router().stats()
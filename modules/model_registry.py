@@ -0,0 +1,160 @@
+# ✅ model_registry.py
+"""
+Lazy, shared model registry
+----------------------------------
+• Modules register a loader by name; nothing is loaded at import time
+• get_model(name) loads on first use and is shared by every Streamlit session
+• warm(...) pre-loads models on request (e.g. from a sidebar button or env)
+• LRU eviction keeps resident models under a configurable memory budget
+• model_stats() reports load time and resident size per model
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import psutil
+
+from modules.config import get_setting
+
+_MB = 1024 * 1024
+
+# Budget for all resident models together; 0 disables eviction.
+_memory_budget = int(get_setting("MODEL_MEMORY_BUDGET_MB", 0)) * _MB
+
+_loaders: dict[str, Callable[[], object]] = {}
+_models: "OrderedDict[str, object]" = OrderedDict()   # LRU order, oldest first
+_stats: dict[str, dict] = {}
+_lock = threading.RLock()
+_load_locks: dict[str, threading.Lock] = {}
+
+
+# ─────────── Registration ─────────────────────────────
+def register_model(name: str, loader: Callable[[], object]) -> None:
+    """Register a zero-argument loader under `name`. Re-registering replaces it."""
+    with _lock:
+        _loaders[name] = loader
+        _load_locks.setdefault(name, threading.Lock())
+        _stats.setdefault(name, {"loaded": False, "loads": 0, "hits": 0,
+                                 "load_seconds": None, "size_mb": None})
+
+
+def registered_models() -> list[str]:
+    return list(_loaders)
+
+
+def loader_for(name: str) -> Callable[[], object]:
+    """The loader registered as `name` (e.g. to locate its module from another process)."""
+    with _lock:
+        return _loaders[name]
+
+
+# ─────────── Access ───────────────────────────────────
+def get_model(name: str):
+    """Return the model registered as `name`, loading it on first use."""
+    with _lock:
+        if name in _models:
+            _models.move_to_end(name)
+            _stats[name]["hits"] += 1
+            return _models[name]
+        if name not in _loaders:
+            raise KeyError(f"Unknown model '{name}'. Registered: {registered_models()}")
+        load_lock = _load_locks[name]
+
+    # Load outside the registry lock so other models stay usable meanwhile;
+    # the per-model lock makes concurrent first calls share one load.
+    with load_lock:
+        with _lock:
+            if name in _models:
+                _models.move_to_end(name)
+                _stats[name]["hits"] += 1
+                return _models[name]
+
+        rss_before = _rss()
+        start = time.perf_counter()
+        model = _loaders[name]()
+        elapsed = time.perf_counter() - start
+        size = _model_bytes(model) or max(_rss() - rss_before, 0)
+
+        with _lock:
+            _models[name] = model
+            _stats[name].update(loaded=True, load_seconds=round(elapsed, 3),
+                                size_mb=round(size / _MB, 1))
+            _stats[name]["loads"] += 1
+            _enforce_budget(keep=name)
+        return model
+
+
+def warm(*names: str) -> dict[str, float]:
+    """Load the given models (all registered ones if none given); return load seconds."""
+    for name in names or registered_models():
+        get_model(name)
+    return {n: _stats[n]["load_seconds"] for n in names or registered_models()}
+
+
+def warm_from_env(var: str = "WARM_MODELS") -> None:
+    """Warm the comma-separated model names in env `var`, if any."""
+    names = [n.strip() for n in str(get_setting(var, "")).split(",") if n.strip()]
+    if names:
+        warm(*names)
+
+
+def evict(name: str) -> bool:
+    """Drop `name` from memory. It reloads transparently on next use."""
+    with _lock:
+        if _models.pop(name, None) is None:
+            return False
+        _stats[name]["loaded"] = False
+    gc.collect()
+    return True
+
+
+# ─────────── Budget & Stats ───────────────────────────
+def set_memory_budget(megabytes: int) -> None:
+    """Set the resident-model budget in MB (0 = unlimited) and evict if over it."""
+    global _memory_budget
+    with _lock:
+        _memory_budget = int(megabytes) * _MB
+        _enforce_budget()
+
+
+def model_stats() -> dict[str, dict]:
+    """Per-model load time, resident size, load count and cache hits."""
+    with _lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def resident_mb() -> float:
+    with _lock:
+        return round(sum(_stats[n]["size_mb"] or 0 for n in _models), 1)
+
+
+def _enforce_budget(keep: str | None = None) -> None:
+    if not _memory_budget:
+        return
+    evicted = False
+    while len(_models) > 1 and resident_mb() * _MB > _memory_budget:
+        oldest = next(n for n in _models if n != keep)
+        del _models[oldest]
+        _stats[oldest]["loaded"] = False
+        evicted = True
+    if evicted:
+        gc.collect()
+
+
+def _rss() -> int:
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+def _model_bytes(model) -> int:
+    """Parameter + buffer bytes for torch models / HF pipelines, else 0."""
+    module = getattr(model, "model", model)
+    if not hasattr(module, "parameters"):
+        return 0
+    total = sum(p.numel() * p.element_size() for p in module.parameters())
+    if hasattr(module, "buffers"):
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+    return total
@@ -1,33 +1,77 @@
 # ✅ qa_engine.py
-import os
-from openai import OpenAI
-#from dotenv import load_dotenv
+from modules.llm_client import chat_completion, stream_chat_completion
+from modules.vector_index import get_index
 
-#load_dotenv()
-#client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-from openai import OpenAI
-import streamlit as st
+def retrieve_passages(text: str, question: str, top_k: int = 4) -> list[dict]:
+    """Top-k passages of `text` for `question`, in document order, with char offsets."""
+    hits = get_index(text).search(question, top_k=top_k)
+    return sorted(hits, key=lambda h: h["start"])
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
+def _qa_prompt(passages: list[dict], question: str) -> str:
+    # Library hits carry a title; a single document's passages only have offsets
+    if any("title" in p for p in passages):
+        context = "\n\n".join(f"[{p['title']}, chars {p['start']}–{p['end']}]\n{p['text']}" for p in passages)
+        intro = """Given the following passages from several documents, answer the user's question clearly and concisely.
+    Each passage is labelled with its document title and its character offsets in that document."""
+    else:
+        context = "\n\n".join(f"[chars {p['start']}–{p['end']}]\n{p['text']}" for p in passages)
+        intro = """Given the following passages from a document, answer the user's question clearly and concisely.
+    Each passage is labelled with its character offsets in the source document."""
+    return f"""
+    {intro}
 
-def ask_question(text: str, question: str) -> str:
-    prompt = f"""
-    Given the following content, answer the user's question clearly and concisely.
-
-    Content:
-    {text}
+    Passages:
+    {context}
 
     Question: {question}
     """
+
+
+def ask_question(text: str, question: str, top_k: int = 4) -> str:
+    """
+    Answers from the passages retrieved out of the document's vector index,
+    not the whole document; the index is built once per document and reused.
+    """
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=350,
-            temperature=0.3,
-        )
-        return response.choices[0].message.content.strip()
+        passages = retrieve_passages(text, question, top_k=top_k)
     except Exception as e:
         return f"❌ QA failed: {str(e)}"
+    try:
+        return chat_completion(_qa_prompt(passages, question), max_tokens=350, temperature=0.3,
+                               task="qa").strip()
+    except Exception as e:
+        return f"❌ QA failed: {str(e)}"
+
+
+def ask_question_stream(text: str, question: str, top_k: int = 4, stats: dict | None = None):
+    """
+    ask_question that yields the answer token by token. `stats` receives
+    ttft_s and total_s (see llm_client.stream_chat_completion).
+    """
+    try:
+        passages = retrieve_passages(text, question, top_k=top_k)
+    except Exception as e:
+        yield f"❌ QA failed: {str(e)}"
+        return
+    try:
+        yield from stream_chat_completion(_qa_prompt(passages, question), max_tokens=350,
+                                          temperature=0.3, stats=stats, task="qa")
+    except Exception as e:
+        yield f"\n\n❌ QA failed: {str(e)}"
+
+
+def ask_library_stream(question: str, hits: list[dict], stats: dict | None = None):
+    """
+    Cross-document answer from library search hits (library.StudyLibrary.search),
+    yielded token by token; passages are labelled with their document titles.
+    """
+    if not hits:
+        yield "No matching passages in the library."
+        return
+    try:
+        yield from stream_chat_completion(_qa_prompt(hits, question), max_tokens=350,
+                                          temperature=0.3, stats=stats, task="qa")
+    except Exception as e:
+        yield f"\n\n❌ QA failed: {str(e)}"
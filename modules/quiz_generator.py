@@ -1,20 +1,20 @@
 # ✅ quiz_generator.py
-#import os
-#from openai import OpenAI
-from dotenv import load_dotenv
+import asyncio
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
-#client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from jsonschema import Draft202012Validator
 
+from modules.llm_client import chat_completion, achat_completion, stream_chat_completion
 
 
-import os
-import streamlit as st
-from openai import OpenAI
-
-api_key = os.getenv("OPENAI_API_KEY", st.secrets.get("OPENAI_API_KEY"))
-client = OpenAI(api_key=api_key)
-
+def _parse_json(reply: str):
+    """Strict JSON parse of a model reply (a surrounding ``` fence is tolerated)."""
+    reply = reply.strip()
+    if reply.startswith("```"):
+        reply = reply.strip("`").removeprefix("json").strip()
+    return json.loads(reply)
 
 
 # ─────────── 1. Bulk Quiz Generator ─────────────────────────
@@ -23,7 +23,7 @@ def generate_quiz(text: str, num_questions: int = 5) -> list:
     Generate {num_questions} multiple choice questions from the following text.
     Each question should include 4 options and identify the correct answer.
 
-    Format as a Python list of dictionaries like this:
+    Format as a JSON array of objects like this:
     [
       {{
         "question": "What is ...?",
@@ -37,67 +37,287 @@ def generate_quiz(text: str, num_questions: int = 5) -> list:
     \"\"\"{text}\"\"\"
     """
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=800,
-            temperature=0.5,
-        )
-        result = response.choices[0].message.content.strip()
-        return eval(result) if result.startswith("[") else []
+        response = chat_completion(prompt, max_tokens=800, temperature=0.5, task="quiz",
+                                   validate=_parse_json)
+        result = _parse_json(response)
+        return result if isinstance(result, list) else []
     except Exception as e:
         return [f"❌ Quiz generation failed: {str(e)}"]
 
 # ─────────── 2. Per-Term MCQ Generator ──────────────────────
-def generate_mcq(term: str, definition: str) -> dict:
-    prompt = f"""
+def _mcq_prompt(term: str, definition: str) -> str:
+    return f"""
     Create a multiple-choice question for the term "{term}".
     Use the definition: "{definition}"
     Include 4 options, and indicate the correct answer.
 
-    Format as:
+    Format as a JSON object:
     {{
         "question": "...?",
         "options": ["A", "B", "C", "D"],
         "answer": "Correct Option"
     }}
     """
+
+
+def _mcq_failure(term: str, e: Exception) -> dict:
+    return {
+        "question": f"❌ Failed to generate MCQ for '{term}'",
+        "options": [],
+        "answer": str(e)
+    }
+
+
+def generate_mcq(term: str, definition: str) -> dict:
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.4,
-        )
-        return eval(response.choices[0].message.content.strip())
+        response = chat_completion(_mcq_prompt(term, definition), max_tokens=300, temperature=0.4, task="mcq",
+                                   validate=_parse_json)
+        return _parse_json(response)
     except Exception as e:
-        return {
-            "question": f"❌ Failed to generate MCQ for '{term}'",
-            "options": [],
-            "answer": str(e)
-        }
+        return _mcq_failure(term, e)
 
 # ─────────── 3. Per-Term Fill-in-the-Blank Generator ───────
-def generate_fill_blank(term: str, definition: str) -> dict:
-    prompt = f"""
+def _fill_blank_prompt(term: str, definition: str) -> str:
+    return f"""
     Create a fill-in-the-blank question using the term "{term}" and its definition: "{definition}".
-    Return the result as a Python dictionary with keys 'question' and 'answer'.
+    Return the result as a JSON object with keys "question" and "answer".
     Example:
     {{
         "question": "____ is used for ...",
         "answer": "{term}"
     }}
     """
+
+
+def _fill_blank_failure(term: str, e: Exception) -> dict:
+    return {
+        "question": f"❌ Failed to generate fill-in-the-blank for '{term}'",
+        "answer": str(e)
+    }
+
+
+def generate_fill_blank(term: str, definition: str) -> dict:
+    try:
+        response = chat_completion(_fill_blank_prompt(term, definition), max_tokens=200, temperature=0.3,
+                                   task="fill_blank", validate=_parse_json)
+        return _parse_json(response)
+    except Exception as e:
+        return _fill_blank_failure(term, e)
+
+
+# ─────────── 4. Concurrent Quiz for All Terms ──────────────
+async def agenerate_quiz_for_terms(vocab: dict, max_concurrency: int = 8) -> tuple[list, list]:
+    """
+    MCQs and fill-in-the-blanks for every (term, definition) in `vocab`, all
+    requested concurrently (at most `max_concurrency` in flight, rate-limited
+    and retried by llm_client). Results keep the order of `vocab`.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def one(prompt, max_tokens, temperature, on_error, term, task):
+        async with sem:
+            try:
+                response = await achat_completion(prompt, max_tokens=max_tokens, temperature=temperature,
+                                                  task=task, validate=_parse_json)
+                return _parse_json(response)
+            except Exception as e:
+                return on_error(term, e)
+
+    items = list(vocab.items())
+    mcqs = [one(_mcq_prompt(t, d), 300, 0.4, _mcq_failure, t, "mcq") for t, d in items]
+    blanks = [one(_fill_blank_prompt(t, d), 200, 0.3, _fill_blank_failure, t, "fill_blank") for t, d in items]
+    results = await asyncio.gather(*mcqs, *blanks)
+    return results[:len(items)], results[len(items):]
+
+
+def generate_quiz_for_terms(vocab: dict, max_concurrency: int = 8) -> tuple[list, list]:
+    """Blocking wrapper around agenerate_quiz_for_terms."""
+    return asyncio.run(agenerate_quiz_for_terms(vocab, max_concurrency))
+
+
+# ─────────── 5. Batched Quiz (few calls, validated, streamed) ───
+QUIZ_BATCH_SIZE = 10          # terms per completion
+QUIZ_MAX_RETRIES = 2          # re-asks for items that fail validation
+QUIZ_CONCURRENCY = 4          # batch completions in flight at once
+
+QUIZ_ITEM_SCHEMA = {
+    "type": "object",
+    "required": ["term", "mcq", "fill_blank"],
+    "properties": {
+        "term": {"type": "string", "minLength": 1},
+        "mcq": {
+            "type": "object",
+            "required": ["question", "options", "answer"],
+            "properties": {
+                "question": {"type": "string", "minLength": 1},
+                "options": {"type": "array", "items": {"type": "string", "minLength": 1},
+                            "minItems": 4, "maxItems": 4, "uniqueItems": True},
+                "answer": {"type": "string", "minLength": 1},
+            },
+        },
+        "fill_blank": {
+            "type": "object",
+            "required": ["question", "answer"],
+            "properties": {
+                "question": {"type": "string", "pattern": "_{3,}"},
+                "answer": {"type": "string", "minLength": 1},
+            },
+        },
+    },
+}
+_validator = Draft202012Validator(QUIZ_ITEM_SCHEMA)
+
+
+def _batch_prompt(items: list[tuple[str, str]]) -> str:
+    terms = "\n".join(f"{i}. {json.dumps(t)}: {json.dumps(d)}" for i, (t, d) in enumerate(items, 1))
+    return f"""
+    For each term below, write one multiple-choice question and one fill-in-the-blank question,
+    using the given definition.
+
+    Terms:
+    {terms}
+
+    Return only a JSON array with one object per term, in the same order:
+    [
+      {{
+        "term": "<the term exactly as given>",
+        "mcq": {{"question": "...?", "options": ["A", "B", "C", "D"], "answer": "<one of the options>"}},
+        "fill_blank": {{"question": "____ is used for ...", "answer": "<the term>"}}
+      }}
+    ]
+    """
+
+
+def iter_json_array(deltas):
+    """
+    Yield each element of a streamed top-level JSON array as soon as it is
+    complete. `deltas` is an iterable of text pieces; text before the opening
+    "[" (e.g. a ``` fence) is skipped. Stops quietly at the first element that
+    cannot be parsed once the stream has ended.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, started = "", 0, False
+    for delta in deltas:
+        buf += delta
+        if not started:
+            start = buf.find("[")
+            if start < 0:
+                continue
+            pos, started = start + 1, True
+        if "}" not in delta and "]" not in delta:
+            continue               # an element can only end on a closing bracket
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf) or buf[pos] == "]":
+                break
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break              # incomplete; wait for more text
+            pos = end
+            yield value
+        buf, pos = buf[pos:], 0
+
+
+def _check_item(item, expected: dict[str, str]) -> str | None:
+    """The requested term an item answers, or None if it fails validation."""
+    if not _validator.is_valid(item):
+        return None
+    term = expected.get(item["term"].strip().lower())
+    if term is None or item["mcq"]["answer"] not in item["mcq"]["options"]:
+        return None
+    return term
+
+
+def _batch_validator(expected: dict[str, str]):
+    """validate= hook for a batch reply: every requested term answered by a valid item."""
+    def validate(reply: str):
+        items = _parse_json(reply)
+        if not isinstance(items, list):
+            raise ValueError("batch reply is not a JSON array")
+        answered = {_check_item(item, expected) for item in items}
+        missing = set(expected.values()) - answered
+        if missing:
+            raise ValueError(f"missing or invalid in batch reply: {', '.join(sorted(missing))}")
+    return validate
+
+
+def _ask_batch(batch: list[tuple[str, str]], attempt: int, out: queue.Queue) -> None:
+    """
+    Stream one batch's reply into `out`: ("item", term, mcq, fill_blank) for each
+    valid item as it arrives, then ("done", missing_pairs, error, attempt).
+    """
+    expected = {t.strip().lower(): t for t, _ in batch}
+    remaining = dict(batch)
+    error = None
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=200,
-            temperature=0.3,
-        )
-        return eval(response.choices[0].message.content.strip())
+        # Only a reply answering the whole batch is cached, so a retry never meets a failed one
+        stream = stream_chat_completion(_batch_prompt(batch), max_tokens=min(4000, 150 * len(batch) + 100),
+                                        temperature=0.4, task="quiz_batch",
+                                        validate=_batch_validator(expected))
+        for item in iter_json_array(stream):
+            term = _check_item(item, expected)
+            if term in remaining:
+                del remaining[term]
+                out.put(("item", term, item["mcq"], item["fill_blank"]))
     except Exception as e:
-        return {
-            "question": f"❌ Failed to generate fill-in-the-blank for '{term}'",
-            "answer": str(e)
-        }
+        error = e
+    out.put(("done", [(t, d) for t, d in batch if t in remaining], error, attempt))
+
+
+def iter_quiz_batch(vocab: dict, batch_size: int = QUIZ_BATCH_SIZE,
+                    max_retries: int = QUIZ_MAX_RETRIES, max_concurrency: int = QUIZ_CONCURRENCY):
+    """
+    Yield (term, mcq, fill_blank) for the terms of `vocab` as each question
+    pair arrives, asking for `batch_size` terms per streamed completion with up
+    to `max_concurrency` completions in flight (OpenAI calls also pass through
+    the process-wide rate limiter).
+    Items failing QUIZ_ITEM_SCHEMA (or naming an answer not among the options)
+    are re-asked, up to `max_retries` times, in a batch of just those terms;
+    terms still missing after that are yielded with failure placeholders.
+    """
+    pairs = list(vocab.items())
+    out = queue.Queue()
+    pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        running = 0
+        for i in range(0, len(pairs), batch_size):
+            pool.submit(_ask_batch, pairs[i:i + batch_size], 0, out)
+            running += 1
+        while running:
+            msg = out.get()
+            if msg[0] == "item":
+                yield msg[1:]
+                continue
+            _, missing, error, attempt = msg
+            running -= 1
+            if not missing:
+                continue
+            if attempt < max_retries:
+                pool.submit(_ask_batch, missing, attempt + 1, out)
+                running += 1
+                continue
+            error = error or ValueError("missing or invalid in batch reply")
+            for term, _ in missing:
+                yield term, _mcq_failure(term, error), _fill_blank_failure(term, error)
+    finally:
+        # A consumer that stops early does not wait for the batches still streaming
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_quiz_batch(vocab: dict, batch_size: int = QUIZ_BATCH_SIZE,
+                        max_retries: int = QUIZ_MAX_RETRIES, on_item=None,
+                        max_concurrency: int = QUIZ_CONCURRENCY) -> tuple[list, list]:
+    """
+    MCQs and fill-in-the-blanks for every term in `vocab` from a few batched
+    completions (see iter_quiz_batch), in the order of `vocab`.
+    `on_item(term, mcq, fill_blank)` fires as each pair arrives.
+    """
+    results = {}
+    for term, mcq, blank in iter_quiz_batch(vocab, batch_size, max_retries, max_concurrency):
+        results[term] = (mcq, blank)
+        if on_item:
+            on_item(term, mcq, blank)
+    ordered = [results[t] for t in vocab]
+    return [m for m, _ in ordered], [b for _, b in ordered]
@@ -1,18 +1,72 @@
-import os
+import math
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import feedparser
-import urllib.parse
-import streamlit as st
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+
+from modules.config import get_setting
+
+# From env, config file or Streamlit secrets
+SERPAPI_KEY = get_setting("SERPAPI_KEY")
+
+# Endpoints are overridable (settings or at runtime) so tests can point every
+# source at a local HTTP stub.
+SOURCE_URLS = {
+    "wikipedia": get_setting("WIKIPEDIA_API_URL", "https://en.wikipedia.org/api/rest_v1/page/summary/"),
+    "arxiv": get_setting("ARXIV_API_URL", "http://export.arxiv.org/api/query"),
+    "scholar": get_setting("SERPAPI_URL", "https://serpapi.com/search"),
+}
+
+# Per-source deadlines in seconds; a slow source is dropped, not waited for
+SOURCE_DEADLINES = {"wikipedia": 5.0, "arxiv": 6.0, "scholar": 6.0}
+
+CACHE_TTL = float(get_setting("RESOURCE_CACHE_TTL", 3600))
+
+# ─────────────── Shared HTTP session & cache ───────────────
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+MAX_WORKERS = 16
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="resources")
+_cache = TTLCache(maxsize=2048, ttl=CACHE_TTL)
+_cache_lock = threading.Lock()
 
-# Fallback to os.environ if running locally
-SERPAPI_KEY = st.secrets.get("SERPAPI_KEY", os.getenv("SERPAPI_KEY"))
+
+def configure(source_urls: dict | None = None, session: requests.Session | None = None) -> None:
+    """Swap endpoints and/or the HTTP session (e.g. for a local stub) and clear the cache."""
+    global _session
+    if source_urls:
+        SOURCE_URLS.update(source_urls)
+    if session is not None:
+        _session = session
+    with _cache_lock:
+        _cache.clear()
+
+
+def _cached(source: str, query: str, fetch, failed):
+    """TTL-cache successful results per (source, query); failures are not cached."""
+    key = (source, query)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    result = fetch(query)
+    if result != failed:
+        with _cache_lock:
+            _cache[key] = result
+    return result
 
 
 # ─────────────── Wikipedia Summary ───────────────
-def search_wikipedia(query):
-    url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}"
+def _fetch_wikipedia(query):
+    url = f"{SOURCE_URLS['wikipedia']}{urllib.parse.quote(query)}"
     try:
-        res = requests.get(url, timeout=5)
+        res = _session.get(url, timeout=SOURCE_DEADLINES["wikipedia"])
         if res.status_code == 200:
             data = res.json()
             summary = data.get("extract", "No summary found.")
@@ -23,12 +77,16 @@ def search_wikipedia(query):
     return "Wikipedia search failed.", ""
 
 
+def search_wikipedia(query):
+    return _cached("wikipedia", query, _fetch_wikipedia, ("Wikipedia search failed.", ""))
+
+
 # ─────────────── arXiv API ───────────────
-def get_arxiv_papers(query):
-    encoded_query = urllib.parse.quote(query)
-    url = f"http://export.arxiv.org/api/query?search_query=all:{encoded_query}&start=0&max_results=2"
+def _fetch_arxiv(query):
+    params = {"search_query": f"all:{query}", "start": 0, "max_results": 2}
     try:
-        feed = feedparser.parse(url)
+        res = _session.get(SOURCE_URLS["arxiv"], params=params, timeout=SOURCE_DEADLINES["arxiv"])
+        feed = feedparser.parse(res.content)
         papers = []
         for entry in feed.entries:
             title = entry.title.replace("\n", " ").strip()
@@ -45,10 +103,12 @@ def get_arxiv_papers(query):
         return []
 
 
-# ─────────────── Google Scholar via SerpAPI ───────────────
-def get_google_scholar_resources(query):
-    url = "https://serpapi.com/search"
+def get_arxiv_papers(query):
+    return _cached("arxiv", query, _fetch_arxiv, [])
+
 
+# ─────────────── Google Scholar via SerpAPI ───────────────
+def _fetch_google_scholar(query):
     params = {
         "engine": "google_scholar",
         "q": query,
@@ -57,7 +117,7 @@ def get_google_scholar_resources(query):
     }
 
     try:
-        res = requests.get(url, params=params, timeout=6)
+        res = _session.get(SOURCE_URLS["scholar"], params=params, timeout=SOURCE_DEADLINES["scholar"])
         data = res.json()
         papers = []
         for item in data.get("organic_results", []):
@@ -77,3 +137,62 @@ def get_google_scholar_resources(query):
     except Exception as e:
         print(f"[SerpAPI Scholar Error] {e}")
         return []
+
+
+def get_google_scholar_resources(query):
+    return _cached("scholar", query, _fetch_google_scholar, [])
+
+
+# ─────────────── Concurrent fan-out ───────────────
+_SOURCES = {
+    "wikipedia": (search_wikipedia, ("Wikipedia search failed.", "")),
+    "arxiv": (get_arxiv_papers, []),
+    "scholar": (get_google_scholar_resources, []),
+}
+
+
+def _collect(futures: dict, started: float, rounds: int = 1) -> tuple[dict, list]:
+    """
+    Wait for each source up to its own deadline (times `rounds` when more
+    requests than pool workers are queued); missing sources get their fallback.
+    """
+    results, timed_out = {}, []
+    for source, fut in futures.items():
+        fallback = _SOURCES[source][1]
+        remaining = SOURCE_DEADLINES[source] * rounds - (time.monotonic() - started)
+        try:
+            results[source] = fut.result(timeout=max(remaining, 0))
+        except Exception:
+            # A late result still lands in the cache for the next request
+            results[source] = fallback
+            timed_out.append(source)
+    return results, timed_out
+
+
+def _shape(results: dict, timed_out: list) -> dict:
+    wiki_summary, wiki_link = results["wikipedia"]
+    return {
+        "wikipedia": {"summary": wiki_summary, "link": wiki_link},
+        "papers": results["arxiv"] + results["scholar"],
+        "timed_out": timed_out,
+    }
+
+
+def fetch_resources(query: str) -> dict:
+    """
+    Queries Wikipedia, arXiv and Google Scholar concurrently over pooled
+    sessions. Returns {"wikipedia": {summary, link}, "papers": [...],
+    "timed_out": [sources]} with whatever arrived before each source's deadline.
+    """
+    started = time.monotonic()
+    futures = {name: _pool.submit(fn, query) for name, (fn, _) in _SOURCES.items()}
+    return _shape(*_collect(futures, started))
+
+
+def fetch_resources_bulk(terms: list[str]) -> dict[str, dict]:
+    """fetch_resources for every term, all (term, source) requests in flight at once."""
+    started = time.monotonic()
+    pending = {t: {name: _pool.submit(fn, t) for name, (fn, _) in _SOURCES.items()}
+               for t in dict.fromkeys(terms)}
+    rounds = max(1, math.ceil(len(pending) * len(_SOURCES) / MAX_WORKERS))
+    return {t: _shape(*_collect(futures, started, rounds)) for t, futures in pending.items()}
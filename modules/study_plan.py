@@ -1,20 +1,9 @@
 # ✅ study_plan.py
-import os
-import streamlit as st
-from openai import OpenAI
-from dotenv import load_dotenv
+from modules.llm_client import chat_completion, stream_chat_completion
 
-# Load local .env only if not running in Streamlit Cloud
-if not st.secrets:
-    load_dotenv()
 
-# Use Streamlit secrets if available, else fallback to os.getenv
-OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-
-def generate_study_plan(topic: str, hours_per_day=2, goal="exam") -> str:
-    prompt = f"""
+def _plan_prompt(topic: str, hours_per_day, goal) -> str:
+    return f"""
     You are an expert AI academic assistant.
     Create a **realistic, technically focused 7-day study plan** for the topic: "{topic}".
     The learner can dedicate {hours_per_day} hours per day.
@@ -25,13 +14,20 @@ def generate_study_plan(topic: str, hours_per_day=2, goal="exam") -> str:
     - Include self-evaluation like mock tests or concept checks.
     - Use technical terminology relevant to the topic.
     """
+
+
+def generate_study_plan(topic: str, hours_per_day=2, goal="exam") -> str:
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=850,
-            temperature=0.5,
-        )
-        return response.choices[0].message.content
+        return chat_completion(_plan_prompt(topic, hours_per_day, goal), max_tokens=850, temperature=0.5,
+                               task="study_plan")
     except Exception as e:
         return f"Failed to generate study plan: {str(e)}"
+
+
+def generate_study_plan_stream(topic: str, hours_per_day=2, goal="exam", stats: dict | None = None):
+    """generate_study_plan that yields the plan as tokens arrive; `stats` gets ttft_s / total_s."""
+    try:
+        yield from stream_chat_completion(_plan_prompt(topic, hours_per_day, goal), max_tokens=850,
+                                          temperature=0.5, stats=stats, task="study_plan")
+    except Exception as e:
+        yield f"\n\nFailed to generate study plan: {str(e)}"
@@ -1,54 +1,218 @@
 # ✅ summarizer.py (Hugging Face only)
+import hashlib
+import json
 import os
-import streamlit as st
-from dotenv import load_dotenv
-from transformers import pipeline
-
-# Load .env for local dev
-load_dotenv()
-
-# Load HF token from Streamlit secrets or fallback
-HF_TOKEN = st.secrets.get("HF_TOKEN", os.getenv("HF_TOKEN"))
-
-# Initialize summarizer with token and forced CPU
-hf_summarizer = pipeline(
-    "summarization",
-    model="sshleifer/distilbart-cnn-12-6",
-    device=-1,
-    token=HF_TOKEN
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules.chunker import iter_content_chunks
+from modules.config import get_setting
+from modules.dedup import dedup_chunks, record_cost
+from modules.disk_cache import DiskCache
+from modules.inference_server import run_model
+from modules.model_registry import register_model
+
+# HF token from env, config file or Streamlit secrets
+HF_TOKEN = get_setting("HF_TOKEN")
+
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+
+# Summarizer loads lazily on first use (forced CPU) via the shared registry
+def _load_summarizer():
+    from transformers import pipeline
+    return pipeline(
+        "summarization",
+        model=SUMMARIZER_MODEL,
+        device=-1,
+        token=HF_TOKEN
+    )
+
+register_model("distilbart-cnn", _load_summarizer)
+
+
+def hf_summarizer(*args, **kwargs):
+    # In-process, or micro-batched with other sessions when INFERENCE_WORKERS > 0
+    return run_model("distilbart-cnn", *args, **kwargs)
+
+# ──────────────── Utility: Token-aware chunking ────────────────
+def _content_chunks(text, max_tokens=900, target_tokens=600):
+    return iter_content_chunks(text, target_tokens=target_tokens, max_tokens=max_tokens,
+                               tokenizer=SUMMARIZER_MODEL)
+
+
+def chunk_text(text, max_tokens=900, target_tokens=600):
+    """
+    Sentence-aligned chunks within the summarizer's 1024-token input window.
+    Boundaries are content-defined, so editing the text only changes the
+    chunks around the edit and the rest hit the summary memo.
+    """
+    return [c.text for c in _content_chunks(text, max_tokens, target_tokens)]
+
+# ──────────────── Summary memo ────────────────
+# Every node of the summary tree (leaf chunk or joined child summaries) is
+# memoized by its text and the generation parameters.
+SUMMARY_PARAMS = {"max_length": 130, "min_length": 40, "do_sample": False}
+_FAILED = "[Summarization failed"
+
+_memo = DiskCache(
+    "summaries",
+    max_bytes=int(get_setting("SUMMARY_CACHE_MB", 64)) * 1024 * 1024,
 )
 
-# ──────────────── Utility: Word-aware chunking ────────────────
-def chunk_text(text, max_chunk_words=450):
-    words = text.split()
-    chunks = []
-    current_chunk = []
-
-    for word in words:
-        if len(current_chunk) + 1 <= max_chunk_words:
-            current_chunk.append(word)
-        else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
-
-# ──────────────── Summarizer Function ────────────────
-def summarize_text(text: str) -> str:
+
+def _memo_key(chunk: str) -> str:
+    payload = json.dumps([SUMMARIZER_MODEL, SUMMARY_PARAMS, chunk], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ──────────────── Map-Reduce Summarizer ────────────────
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_THREADS = max(1, (os.cpu_count() or 2) // 2)
+MIN_CHUNK_WORDS = 40
+MAX_LEVELS = 5
+
+
+def _summarize_batch(batch: list[str]) -> list[str]:
+    try:
+        out = hf_summarizer(batch, **SUMMARY_PARAMS, truncation=True, batch_size=len(batch))
+        return [r["summary_text"].strip() for r in out]
+    except Exception as e:
+        return [f"{_FAILED}: {str(e)}]"] * len(batch)
+
+
+def _summarize_level(chunks: list[str], batch_size: int, num_threads: int,
+                     on_batch_done) -> list[str]:
+    """
+    Summarize `chunks` in batches across a thread pool, keeping input order.
+    `on_batch_done(first_index, summaries)` fires as each batch completes; if
+    it raises (e.g. JobCancelled), queued batches are dropped, not run.
+    """
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    results: list[list[str]] = [None] * len(batches)
+    pool = ThreadPoolExecutor(max_workers=num_threads)
+    try:
+        futures = {pool.submit(_summarize_batch, b): i for i, b in enumerate(batches)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            on_batch_done(i * batch_size, results[i])
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return [s for batch in results for s in batch]
+
+
+def summarize_with_stats(text: str,
+                         target_words: int = 250,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         num_threads: int = DEFAULT_THREADS,
+                         progress_callback=None,
+                         partial_callback=None,
+                         use_cache: bool = True) -> tuple[str, dict]:
+    """
+    Map-reduce summary of `text`.
+
+    Chunk summaries run in batches across `num_threads` threads; the joined
+    summaries are summarized again, level by level, until they fit
+    `target_words`. `progress_callback(done, total, level)` fires after each
+    batch. `partial_callback(summary)` receives each first-level chunk summary
+    in document order as soon as it and everything before it are done.
+
+    Summarization is incremental: every chunk and every reduce-level node is
+    looked up in the memo first (unless `use_cache` is False), so after an
+    edit only the changed leaves and their ancestors are recomputed.
+
+    Near-duplicate chunks (repeated intros, recaps, slide boilerplate) are
+    dropped before the first level; see modules.dedup.
+
+    Returns (summary, stats) where stats includes chunks (nodes at every
+    level), reused / recomputed node counts, chunks_per_sec (recomputed
+    nodes only, so memo hits do not inflate it), duplicates / tokens_saved
+    (summarizer tokens) by dedup and first_partial_seconds (time until the
+    opening chunk summary was ready).
+    """
+    stats = {"chunks": 0, "levels": 0, "seconds": 0.0, "chunks_per_sec": 0.0,
+             "reused": 0, "recomputed": 0, "duplicates": 0, "tokens_saved": 0,
+             "first_partial_seconds": None}
     if len(text.strip()) < 300:
-        return "⚠️ Input too short to summarize meaningfully."
-
-    chunks = chunk_text(text)
-    results = []
-    for chunk in chunks:
-        if len(chunk.split()) < 40:
-            continue
-        try:
-            result = hf_summarizer(chunk, max_length=130, min_length=40, do_sample=False)
-            results.append(result[0]["summary_text"].strip())
-        except Exception as e:
-            results.append(f"[Summarization failed: {str(e)}]")
-
-    return " ".join(results).strip() or "⚠️ Text too short for summarization."
+        return "⚠️ Input too short to summarize meaningfully.", stats
+
+    start = time.perf_counter()
+    dedup = {}
+    leaves = dedup_chunks((c for c in _content_chunks(text) if len(c.text.split()) >= MIN_CHUNK_WORDS),
+                          stats=dedup, stage="summary")
+    stats["duplicates"], stats["tokens_saved"] = dedup["duplicates"], dedup["tokens_saved"]
+    leaf_tokens = {c.text: c.tokens for c in leaves}
+    chunks = [c.text for c in leaves]
+    current = ""
+    level = 0
+    while chunks and level < MAX_LEVELS:
+        level += 1
+        # Reduce levels keep short tail chunks verbatim rather than dropping them
+        todo = [c for c in chunks if len(c.split()) >= MIN_CHUNK_WORDS]
+        keys = [_memo_key(c) for c in todo]
+        results = [_memo.get(k) if use_cache else None for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        stats["reused"] += len(todo) - len(missing)
+        stats["recomputed"] += len(missing)
+        done = len(todo) - len(missing)
+        emitted = 0
+
+        def publish():
+            # First-level summaries go out in document order, reused ones at once
+            nonlocal emitted
+            while emitted < len(results) and results[emitted] is not None:
+                if emitted == 0:
+                    stats["first_partial_seconds"] = round(time.perf_counter() - start, 3)
+                if partial_callback:
+                    partial_callback(results[emitted])
+                emitted += 1
+
+        def on_batch_done(first, summaries, level=level, total=len(todo)):
+            nonlocal done
+            for j, summary in enumerate(summaries, first):
+                results[missing[j]] = summary
+                if use_cache and not summary.startswith(_FAILED):
+                    _memo.set(keys[missing[j]], summary)
+            done += len(summaries)
+            if progress_callback:
+                progress_callback(done, total, level)
+            if level == 1:
+                publish()
+
+        if level == 1:
+            publish()
+        if done and progress_callback:
+            progress_callback(done, len(todo), level)
+        if missing:
+            level_start = time.perf_counter()
+            _summarize_level([todo[i] for i in missing], batch_size, num_threads, on_batch_done)
+            if level == 1:            # prices the leaves dedup skipped
+                record_cost("summary", sum(leaf_tokens[todo[i]] for i in missing),
+                            time.perf_counter() - level_start)
+        summaries = iter(results)
+        stats["chunks"] += len(todo)
+        current = " ".join(next(summaries) if len(c.split()) >= MIN_CHUNK_WORDS else c
+                           for c in chunks).strip()
+
+        if len(current.split()) <= target_words:
+            break
+        next_chunks = chunk_text(current)
+        if len(next_chunks) >= len(chunks):
+            break                     # no longer shrinking
+        chunks = next_chunks
+
+    stats["levels"] = level
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    if stats["seconds"]:
+        stats["chunks_per_sec"] = round(stats["recomputed"] / stats["seconds"], 2)
+    return current or "⚠️ Text too short for summarization.", stats
+
+
+def summarize_text(text: str, **kwargs) -> str:
+    """Map-reduce summary of `text`; see summarize_with_stats for options."""
+    return summarize_with_stats(text, **kwargs)[0]
+
+
+def summary_cache_stats() -> dict:
+    return _memo.info()
@@ -0,0 +1,344 @@
+# ✅ transcriber.py
+"""
+Segmented Whisper transcription
+----------------------------------
+• Energy-based VAD splits audio into ≤30 s voiced segments; long silences are dropped.
+  Streams judge each window against speech-peak and noise-floor levels carried
+  over from the audio before it
+• Segments are transcribed across a process pool (one Whisper model per worker);
+  idle pools beyond WHISPER_MAX_POOLS are shut down, and all of them at exit.
+  Worker models live outside the model registry, so MODEL_MEMORY_BUDGET_MB
+  does not count them: budget workers × model size for them separately
+• Text is stitched back in timestamp order; segment timestamps are returned
+• Model size (tiny / base / small) is chosen per request
+• transcribe_stream: ffmpeg decodes a file or URL to 16 kHz mono in blocks
+  on a reader thread while the caller transcribes; closed VAD segments are
+  transcribed as they appear and yielded in order, so download, decoding and
+  inference overlap instead of adding up
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from collections import Counter, OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modules.config import get_setting
+from modules.model_registry import register_model, get_model
+
+SAMPLE_RATE = 16000
+MODEL_SIZES = ("tiny", "base", "small")
+MAX_SEGMENT_S = 30.0          # Whisper's native window
+CUT_SEARCH_S = 5.0            # an over-long segment is cut at the quietest frame this close to the cap
+MAX_POOLS = int(get_setting("WHISPER_MAX_POOLS", 1))   # idle worker pools kept alive
+STREAM_BLOCK_S = 2.0          # decoded audio handed over per read
+STREAM_WINDOW_S = 30.0        # audio buffered before segments are cut
+STREAM_GUARD_S = 1.0          # speech this close to the buffer end may continue
+SPEECH_RANGE_DB = 35          # frames this far below the speech peak may still be speech
+NOISE_MARGIN_DB = 6           # ... if they are this far above the noise floor
+LEVEL_DRIFT_DB = 1            # per window: how fast the peak falls and the floor rises
+
+
+def _load_whisper(size: str):
+    import whisper
+    return whisper.load_model(size)
+
+
+for _size in MODEL_SIZES:
+    register_model(f"whisper-{_size}", lambda size=_size: _load_whisper(size))
+
+
+# ─────────── Voice activity detection ─────────────────
+class VadLevels:
+    """
+    Speech-peak and noise-floor estimates (dB) carried across the windows of
+    a stream. The peak follows louder windows at once and falls back by
+    LEVEL_DRIFT_DB per window; the floor mirrors it for quieter ones. A window
+    of only noise is then judged against the speech before it, not against
+    its own loudest frames.
+    """
+
+    def __init__(self):
+        self.peak = None
+        self.floor = None
+
+    def threshold(self, db: np.ndarray) -> float:
+        """Fold in one window's frame levels; the level above which a frame is speech."""
+        peak, floor = np.percentile(db, 95), np.percentile(db, 10)
+        if self.peak is not None:
+            peak = max(peak, self.peak - LEVEL_DRIFT_DB)
+            floor = min(floor, self.floor + LEVEL_DRIFT_DB)
+        self.peak, self.floor = peak, floor
+        # The floor counts only well below the peak: audio with no pauses is all speech
+        return max(peak - SPEECH_RANGE_DB, min(floor + NOISE_MARGIN_DB, peak - 10), -60)
+
+
+def vad_segments(audio: np.ndarray,
+                 frame_ms: int = 30,
+                 min_silence_s: float = 0.6,
+                 pad_s: float = 0.2,
+                 max_segment_s: float = MAX_SEGMENT_S,
+                 levels: VadLevels | None = None) -> list[tuple[int, int]]:
+    """
+    (start, end) sample ranges of voiced audio. Frames whose RMS energy is
+    within SPEECH_RANGE_DB of the loudest frames and NOISE_MARGIN_DB above
+    the quietest count as speech (see VadLevels; pass one to carry the levels
+    across calls). Gaps shorter than `min_silence_s` are bridged and segments
+    are capped at `max_segment_s`, cut at the quietest frame within
+    CUT_SEARCH_S of the cap (a pause between words rather than mid-word).
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    db = 20 * np.log10(np.sqrt((frames ** 2).mean(axis=1)) + 1e-10)
+    voiced = db > (levels or VadLevels()).threshold(db)
+
+    # Run-length encode voiced frames, then bridge short silences
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+    gap = int(min_silence_s * 1000 / frame_ms)
+    merged = []
+    for a, b in runs:
+        if merged and a - merged[-1][1] < gap:
+            merged[-1][1] = b
+        else:
+            merged.append([a, b])
+
+    pad = int(pad_s * SAMPLE_RATE)
+    cap = int(max_segment_s * SAMPLE_RATE)
+    search = min(int(CUT_SEARCH_S * SAMPLE_RATE), cap // 2)
+    segments = []
+    for a, b in merged:
+        start, end = max(a * frame - pad, 0), min(b * frame + pad, len(audio))
+        while end - start > cap:
+            lo, hi = (start + cap - search) // frame, (start + cap) // frame
+            quietest = lo + int(np.argmin(db[lo:hi])) if hi > lo else hi
+            cut = min(max(quietest * frame + frame // 2, start + 1), start + cap)
+            segments.append((start, cut))
+            start = cut
+        segments.append((start, end))
+    return segments
+
+
+# ─────────── Worker pool ──────────────────────────────
+_worker_model = None
+_pools: "OrderedDict[tuple[str, int], ProcessPoolExecutor]" = OrderedDict()   # LRU, oldest first
+_leases: Counter = Counter()                     # callers currently using each pool
+_pools_lock = threading.Lock()
+
+
+def _init_worker(size: str, threads: int) -> None:
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = _load_whisper(size)
+
+
+def _transcribe_segment(model, audio: np.ndarray, offset_s: float) -> list[dict]:
+    result = model.transcribe(audio, condition_on_previous_text=False, fp16=False)
+    return [{"start": round(offset_s + seg["start"], 2),
+             "end": round(offset_s + seg["end"], 2),
+             "text": seg["text"].strip()}
+            for seg in result["segments"] if seg["text"].strip()]
+
+
+def _worker_transcribe(audio: np.ndarray, offset_s: float) -> list[dict]:
+    return _transcribe_segment(_worker_model, audio, offset_s)
+
+
+def _shrink_pools_locked() -> None:
+    """Shut down least recently used idle pools beyond MAX_POOLS; pools in use are kept."""
+    for key in list(_pools):
+        if len(_pools) <= MAX_POOLS:
+            break
+        if not _leases[key]:
+            _pools.pop(key).shutdown(wait=False, cancel_futures=True)
+
+
+@contextmanager
+def _leased_pool(size: str, workers: int):
+    """
+    The worker pool for (size, workers), created on first use so worker
+    models load only once, and never shut down while leased.
+    """
+    key = (size, workers)
+    with _pools_lock:
+        if key not in _pools:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            _pools[key] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=mp.get_context("spawn"),
+                initializer=_init_worker, initargs=(size, threads))
+        _pools.move_to_end(key)
+        _leases[key] += 1
+        pool = _pools[key]
+        _shrink_pools_locked()
+    try:
+        yield pool
+    finally:
+        with _pools_lock:
+            _leases[key] -= 1
+            _shrink_pools_locked()
+
+
+@atexit.register
+def _shutdown_pools() -> None:
+    with _pools_lock:
+        while _pools:
+            _pools.popitem()[1].shutdown(wait=False, cancel_futures=True)
+
+
+# ─────────── Public API ───────────────────────────────
+def transcribe(path: str, model_size: str = "base", workers: int | None = None) -> dict:
+    """
+    Transcribe the audio file at `path`. Returns
+    {"text": str, "segments": [{"start", "end", "text"}, ...], "speech_seconds", "audio_seconds"}.
+    `workers` defaults to WHISPER_WORKERS, else half the CPU cores; 1 runs in-process.
+    """
+    import whisper
+
+    if model_size not in MODEL_SIZES:
+        raise ValueError(f"model_size must be one of {MODEL_SIZES}, got '{model_size}'")
+    if workers is None:
+        workers = int(get_setting("WHISPER_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+    audio = whisper.load_audio(path)
+    spans = vad_segments(audio)
+    if workers <= 1 or len(spans) <= 1:
+        model = get_model(f"whisper-{model_size}")
+        parts = [_transcribe_segment(model, audio[a:b], a / SAMPLE_RATE) for a, b in spans]
+    else:
+        with _leased_pool(model_size, workers) as pool:
+            futures = [pool.submit(_worker_transcribe, audio[a:b], a / SAMPLE_RATE) for a, b in spans]
+            parts = [f.result() for f in futures]
+
+    segments = sorted((seg for part in parts for seg in part), key=lambda s: s["start"])
+    return {
+        "text": " ".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "speech_seconds": round(sum(b - a for a, b in spans) / SAMPLE_RATE, 1),
+        "audio_seconds": round(len(audio) / SAMPLE_RATE, 1),
+    }
+
+
+# ─────────── Streaming ────────────────────────────────
+def iter_pcm(source: str, headers: dict | None = None, block_s: float = STREAM_BLOCK_S,
+             readrate: float | None = None):
+    """
+    Decode `source` (file path or media URL) with ffmpeg and yield float32
+    16 kHz mono blocks of about `block_s` seconds while it is still being read.
+    A reader thread drains ffmpeg's output, so a slow consumer never stalls
+    the download; ffmpeg's log goes to a temporary file, so it cannot fill a
+    pipe and stall ffmpeg either. `readrate` caps input speed (x realtime),
+    e.g. to stand in for a network with a local file.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if headers:
+        cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    if readrate:
+        cmd += ["-readrate", str(readrate)]
+    cmd += ["-i", source, "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log)
+    blocks: queue.Queue = queue.Queue()
+    block_bytes = int(block_s * SAMPLE_RATE) * 2
+
+    def pump():
+        try:
+            while data := proc.stdout.read(block_bytes):
+                blocks.put(data)
+        finally:
+            blocks.put(None)
+
+    threading.Thread(target=pump, name="ffmpeg-reader", daemon=True).start()
+    try:
+        while (data := blocks.get()) is not None:
+            pcm = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+            yield pcm.astype(np.float32) / 32768.0
+        if proc.wait() != 0:
+            log.seek(0)
+            raise RuntimeError(f"ffmpeg failed: {log.read().decode(errors='replace')[-500:]}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        log.close()
+
+
+def _closed_spans(buf: np.ndarray, final: bool, levels: VadLevels) -> tuple[list[tuple[int, int]], int]:
+    """
+    VAD spans of `buf` that cannot grow any more, and how much of `buf` they
+    consume. A span reaching the buffer end may run on into the next block,
+    so it is held back and the buffer is kept from its start.
+    """
+    spans = vad_segments(buf, levels=levels)
+    if final:
+        return spans, len(buf)
+    guard = int(STREAM_GUARD_S * SAMPLE_RATE)
+    if spans and spans[-1][1] >= len(buf) - guard:
+        return spans[:-1], spans[-1][0]
+    return spans, (spans[-1][1] if spans else max(len(buf) - guard, 0))
+
+
+def transcribe_stream(source: str | None = None, model_size: str = "base",
+                      workers: int | None = None, headers: dict | None = None, blocks=None):
+    """
+    Yield transcript segments {"start", "end", "text"} in order while
+    `source` is still being downloaded and decoded (see iter_pcm). Audio is
+    cut into VAD segments every STREAM_WINDOW_S of buffered audio; each
+    segment is transcribed as soon as it is closed (across the worker pool
+    when `workers` > 1). `blocks` may replace `source` with any iterable of
+    float32 16 kHz sample arrays.
+    """
+    if model_size not in MODEL_SIZES:
+        raise ValueError(f"model_size must be one of {MODEL_SIZES}, got '{model_size}'")
+    if workers is None:
+        workers = int(get_setting("WHISPER_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+    pcm = iter_pcm(source, headers=headers) if blocks is None else None
+    try:
+        with ExitStack() as lease:                   # the pool stays up while the stream runs
+            pool = lease.enter_context(_leased_pool(model_size, workers)) if workers > 1 else None
+            yield from _stream_segments(blocks if pcm is None else pcm, pool,
+                                        None if pool else get_model(f"whisper-{model_size}"))
+    finally:
+        if pcm is not None:
+            pcm.close()                              # stops ffmpeg if the caller stops early
+
+
+def _stream_segments(blocks, pool, model):
+    pending: deque = deque()                         # in-flight pool futures, in order
+
+    def submit(audio, offset_s):
+        offset_s = float(offset_s)
+        if pool:
+            pending.append(pool.submit(_worker_transcribe, audio, offset_s))
+            return []
+        return _transcribe_segment(model, audio, offset_s)
+
+    buf, consumed = np.empty(0, dtype=np.float32), 0  # samples dropped before buf
+    levels = VadLevels()
+    window = int(STREAM_WINDOW_S * SAMPLE_RATE)
+    for block in blocks:
+        buf = np.concatenate((buf, block))
+        if len(buf) >= window:
+            spans, cut = _closed_spans(buf, final=False, levels=levels)
+            for a, b in spans:
+                yield from submit(buf[a:b], (consumed + a) / SAMPLE_RATE)
+            buf, consumed = buf[cut:], consumed + cut
+        while pending and pending[0].done():
+            yield from pending.popleft().result()
+
+    spans, _ = _closed_spans(buf, final=True, levels=levels)
+    for a, b in spans:
+        yield from submit(buf[a:b], (consumed + a) / SAMPLE_RATE)
+    while pending:
+        yield from pending.popleft().result()
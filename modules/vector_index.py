@@ -0,0 +1,102 @@
+# ✅ vector_index.py
+"""
+Per-document vector index for retrieval
+----------------------------------
+• Chunks a document (shared chunker, MiniLM tokens, with overlap) with character offsets;
+  near-duplicate chunks are embedded once
+• Embeds chunks in batches (MiniLM, CPU) into one NumPy matrix
+• Vectorized top-k cosine search over the matrix
+• Indexes are cached by document hash, so each document is embedded once
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from modules.chunker import iter_chunks
+from modules.dedup import dedup_chunks, record_cost
+from modules.model_registry import register_model, get_model
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_CACHED_INDEXES = 8
+
+
+def _load_embedder():
+    from transformers import AutoTokenizer, AutoModel
+    tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL)
+    model = AutoModel.from_pretrained(EMBED_MODEL).eval()
+    model.tokenizer = tokenizer
+    return model
+
+register_model("minilm-embedder", _load_embedder)
+
+
+# ─────────── Embeddings ───────────────────────────────
+def embed_texts(texts: list[str], batch_size: int = 32) -> np.ndarray:
+    """Return an (n, dim) float32 matrix of L2-normalised embeddings."""
+    import torch
+
+    model = get_model("minilm-embedder")
+    out = []
+    with torch.inference_mode():
+        for i in range(0, len(texts), batch_size):
+            batch = model.tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                    max_length=256, return_tensors="pt")
+            hidden = model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            out.append(pooled.numpy())
+    if not out:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    matrix = np.vstack(out).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+    return matrix
+
+
+# ─────────── Index ────────────────────────────────────
+class DocumentIndex:
+    """Chunks of one document, their char offsets and embedding matrix."""
+
+    def __init__(self, text: str, max_tokens: int = 200, overlap_tokens: int = 32,
+                 batch_size: int = 32):
+        chunks = dedup_chunks(iter_chunks(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                                          tokenizer=EMBED_MODEL), stage="embedding")
+        self.spans = [(c.start, c.end) for c in chunks]
+        self.chunks = [c.text for c in chunks]
+        start = time.perf_counter()
+        self.matrix = embed_texts(self.chunks, batch_size=batch_size)
+        record_cost("embedding", sum(c.tokens for c in chunks), time.perf_counter() - start)
+
+    def search(self, query: str, top_k: int = 4) -> list[dict]:
+        """Top-k chunks by cosine similarity, best first."""
+        if not self.chunks:
+            return []
+        q = embed_texts([query])[0]
+        scores = self.matrix @ q
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"text": self.chunks[i], "start": self.spans[i][0], "end": self.spans[i][1],
+                 "score": float(scores[i])} for i in top]
+
+
+_indexes: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(text: str) -> DocumentIndex:
+    """Return the cached index for `text`, building it on first request."""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = DocumentIndex(text)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
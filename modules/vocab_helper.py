@@ -1,64 +1,234 @@
 # ✅ vocab_helper.py
-import os
-import streamlit as st
-from openai import OpenAI
-from dotenv import load_dotenv
-from transformers import pipeline
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
 
-# Load environment variables only if not on Streamlit Cloud
-if not st.secrets:
-    load_dotenv()
-
-# Get OpenAI API key from Streamlit secrets or .env
-OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
-client = OpenAI(api_key=OPENAI_API_KEY)
+from modules.chunker import iter_chunks, get_token_counter
+from modules.config import get_setting
+from modules.dedup import dedup_chunks, record_cost
+from modules.disk_cache import DiskCache
+from modules.llm_client import chat_completion, achat_completion
+from modules.inference_server import run_model
+from modules.keyterms import extract_terms
+from modules.llm_backends import LLM_BACKEND, LocalSeq2SeqBackend, approx_tokens, get_router
+from modules.model_registry import register_model, get_model
 
 # Hugging Face token (optional, not used here but safe to include for consistency)
-HF_TOKEN = st.secrets.get("HF_TOKEN", os.getenv("HF_TOKEN", None))
-
-# HF local explanation pipeline (runs on CPU)
-explain_pipe = pipeline(
-    "text2text-generation",
-    model="google/flan-t5-base",
-    device=-1,
-    token=HF_TOKEN  # if needed in other HF-auth models
-)
+HF_TOKEN = get_setting("HF_TOKEN")
+
+# HF local explanation pipeline (runs on CPU), loaded lazily via the shared registry
+def _load_explainer():
+    from transformers import pipeline
+    return pipeline(
+        "text2text-generation",
+        model="google/flan-t5-base",
+        device=-1,
+        token=HF_TOKEN  # if needed in other HF-auth models
+    )
+
+register_model("flan-t5-base", _load_explainer)
+
+
+def explain_pipe(*args, **kwargs):
+    # In-process, or micro-batched with other sessions when INFERENCE_WORKERS > 0
+    return run_model("flan-t5-base", *args, **kwargs)
 
 # ─────────────────────────────────────────────────────
-def extract_key_terms(text: str, top_k: int = 10) -> list:
+MAX_PROMPT_TOKENS = 3000      # leaves room for the instructions and reply in a 4k context
+MAP_CHUNK_TOKENS = 1500       # per-chunk budget in map-reduce mode
+MAP_CANDIDATES = 15           # candidates requested per chunk
+KEY_TERMS_MODE = get_setting("KEY_TERMS_MODE", "auto")
+LOCAL_MODES = ("tfidf", "textrank")
+
+
+def _load_lemmatizer():
+    import spacy
+    return spacy.load("en_core_web_sm", disable=["parser", "ner"])
+
+register_model("spacy-en-sm", _load_lemmatizer)
+
+
+def _terms_prompt(text: str, k: int) -> str:
+    return f"""
+    From the following text, extract the {k} most relevant technical terms or domain-specific keywords.
+    Ignore vague English words, slang, or general terms.
+    Return only a JSON array of strings. No explanations.
+
+    Text:
+    \"\"\"{text}\"\"\"
+    """
+
+
+def _parse_term_list(reply: str) -> list[str]:
+    """Strict JSON parse of a list of strings (a surrounding ``` fence is tolerated)."""
+    reply = reply.strip()
+    if reply.startswith("```"):
+        reply = reply.strip("`").removeprefix("json").strip()
+    terms = json.loads(reply)
+    if not isinstance(terms, list) or not all(isinstance(t, str) for t in terms):
+        raise ValueError("expected a JSON array of strings")
+    return [t.strip() for t in terms if t.strip()]
+
+
+def extract_key_terms(text: str, top_k: int = 10, mode: str | None = None) -> list:
     """
     Extracts the top technical terms or domain-specific keywords from the given text.
     Uses OpenAI to ensure high-quality, relevant terms. 
     Returns a Python list of terms (strings).
-    """
-    prompt = f"""
-    From the following text, extract the {top_k} most relevant technical terms or domain-specific keywords.
-    Ignore vague English words, slang, or general terms.
-    Return only a valid Python list of strings. No explanations.
 
-    Text:
-    \"\"\"{text}\"\"\"
+    mode="single" sends one prompt (input cut to MAX_PROMPT_TOKENS at a sentence
+    boundary); mode="map_reduce" extracts candidates from every chunk in parallel
+    and ranks them globally; "auto" picks map_reduce when the text does not fit.
+    mode="tfidf" / "textrank" extract offline with modules.keyterms, in well
+    under a second and without an API call. The default is KEY_TERMS_MODE;
+    "auto" also goes offline when LLM_BACKEND=local.
     """
+    mode = mode or KEY_TERMS_MODE
+    if mode == "auto" and LLM_BACKEND == "local":
+        mode = "tfidf"
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=250,
-            temperature=0.2,
-        )
-        terms = response.choices[0].message.content.strip()
-        return eval(terms) if terms.startswith("[") else []
+        if mode in LOCAL_MODES:
+            return extract_terms(text, top_k, method=mode)
+        if mode == "auto":
+            mode = "map_reduce" if get_token_counter("openai")(text) > MAX_PROMPT_TOKENS else "single"
+        if mode == "map_reduce":
+            chunks = dedup_chunks(iter_chunks(text, max_tokens=MAP_CHUNK_TOKENS, tokenizer="openai"),
+                                  stage="key_terms")
+            start = time.perf_counter()
+            terms = asyncio.run(_extract_key_terms_map_reduce([c.text for c in chunks], top_k))
+            record_cost("key_terms", sum(c.tokens for c in chunks), time.perf_counter() - start)
+            return terms
+        first = next(iter_chunks(text, max_tokens=MAX_PROMPT_TOKENS, tokenizer="openai"), None)
+        reply = chat_completion(_terms_prompt(first.text if first else "", top_k),
+                                max_tokens=250, temperature=0.2, task="key_terms",
+                                validate=_parse_term_list)
+        return _parse_term_list(reply)[:top_k]
     except Exception as e:
         return [f"❌ Extraction failed: {str(e)}"]
 
+
+async def _extract_key_terms_map_reduce(chunks: list[str], top_k: int) -> list[str]:
+    # Map: every chunk at once, so latency is that of the slowest chunk
+    async def candidates(chunk):
+        try:
+            reply = await achat_completion(_terms_prompt(chunk, MAP_CANDIDATES),
+                                           max_tokens=250, temperature=0.2, task="key_terms",
+                                           validate=_parse_term_list)
+            return _parse_term_list(reply)
+        except Exception:
+            return []           # one bad chunk must not sink the whole document
+
+    per_chunk = await asyncio.gather(*(candidates(c) for c in chunks))
+    return rank_candidates(per_chunk, top_k)
+
+
+def rank_candidates(per_chunk: list[list[str]], top_k: int) -> list[str]:
+    """
+    Reduce: merge candidate lists from each chunk, dedupe case- and
+    lemma-insensitively, and rank by how many chunks mention a term times how
+    widely those chunks are spread over the document.
+    """
+    surfaces = list({t for terms in per_chunk for t in terms})
+    if not surfaces:
+        return []
+    lemmatizer = get_model("spacy-en-sm")
+    key_of = {t: " ".join(tok.lemma_.lower() for tok in doc if not tok.is_space)
+              for t, doc in zip(surfaces, lemmatizer.pipe(surfaces))}
+
+    positions: dict[str, set] = defaultdict(set)
+    forms: dict[str, Counter] = defaultdict(Counter)
+    for i, terms in enumerate(per_chunk):
+        for t in terms:
+            positions[key_of[t]].add(i)
+            forms[key_of[t]][t] += 1
+
+    n = len(per_chunk)
+
+    def score(key):
+        pos = positions[key]
+        spread = (max(pos) - min(pos)) / (n - 1) if n > 1 else 0.0
+        return len(pos) * (1 + spread)
+
+    ranked = sorted(positions, key=lambda k: (-score(k), k))
+    return [forms[k].most_common(1)[0][0] for k in ranked[:top_k]]
+
 # ─────────────────────────────────────────────────────
+# Persistent term -> explanation store shared by all documents and users.
+# Keys carry the route and prompt version so a model swap never serves stale text.
+EXPLAIN_MODEL_VERSION = "definition:v2"
+_term_store = DiskCache(
+    "term_explanations",
+    max_bytes=int(get_setting("TERM_STORE_MB", 32)) * 1024 * 1024,
+    memory_items=int(get_setting("TERM_STORE_MEMORY_ITEMS", 5000)),
+)
+_term_store.warm()
+
+
+def _term_key(term: str) -> str:
+    return f"{EXPLAIN_MODEL_VERSION}:{' '.join(term.lower().split())}"
+
+
+def _explain_prompt(term: str) -> str:
+    return f"Explain the term '{term}' in simple words suitable for a student."
+
+
+def _explain_batch(batch: list[str]) -> list[str]:
+    """
+    Explanations for `batch` along the "definition" route. When the router puts
+    the local model first, it explains the whole batch in one padded call, and
+    its per-term latency is recorded so the router can compare it with OpenAI;
+    otherwise (or if that call fails) each term is its own completion.
+    """
+    router = get_router()
+    prompts = [_explain_prompt(t) for t in batch]
+    route = router.candidates("definition", max(approx_tokens([{"content": p}]) for p in prompts))
+    if route and isinstance(route[0], LocalSeq2SeqBackend):
+        start = time.perf_counter()
+        try:
+            results = explain_pipe(prompts, max_length=64, do_sample=False, batch_size=len(batch))
+        except Exception as e:
+            router.record(route[0], "definition", error=e)
+        else:
+            router.record(route[0], "definition", (time.perf_counter() - start) / len(batch))
+            return [(r[0] if isinstance(r, list) else r)["generated_text"].strip() for r in results]
+
+    async def each():
+        return await asyncio.gather(*(achat_completion(p, max_tokens=64, temperature=0.0, task="definition")
+                                      for p in prompts))
+    return [text.strip() for text in asyncio.run(each())]
+
+
+def get_vocab_explanations(terms: list[str], batch_size: int = 16) -> dict[str, str]:
+    """
+    Explains every term in `terms`, returning {term: explanation} in input order.
+    Known terms come from the persistent store; the rest are generated along
+    the local-first "definition" route (see _explain_batch) and then stored.
+    """
+    explanations = {t: _term_store.get(_term_key(t)) for t in terms}
+    missing = list(dict.fromkeys(t for t, e in explanations.items() if e is None))
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i:i + batch_size]
+        try:
+            for term, text in zip(batch, _explain_batch(batch)):
+                explanations[term] = text
+                _term_store.set(_term_key(term), text)
+        except Exception as e:
+            for term in batch:
+                explanations[term] = f"❌ Explanation failed: {str(e)}"
+
+    return explanations
+
+
 def get_vocab_explanation(term: str) -> str:
     """
-    Provides a simple explanation for the given technical term using a local HuggingFace model.
+    Provides a simple explanation for the given technical term, from the local
+    HuggingFace model unless the router has found OpenAI much faster.
     """
-    prompt = f"Explain the term '{term}' in simple words suitable for a student."
-    try:
-        result = explain_pipe(prompt, max_length=64, do_sample=False)
-        return result[0]["generated_text"].strip()
-    except Exception as e:
-        return f"❌ Explanation failed: {str(e)}"
+    return get_vocab_explanations([term])[term]
+
+
+def term_store_stats() -> dict:
+    """Hit rate, size and eviction counts of the term explanation store."""
+    return _term_store.info()
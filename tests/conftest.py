@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Caches must not land in the working tree; set before any module import reads it
+os.environ.setdefault("SLC_CACHE_DIR", tempfile.mkdtemp(prefix="slc-test-cache-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
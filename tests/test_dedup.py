@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from modules import dedup
+from modules.chunker import Chunk
+
+BOILERPLATE = ("Welcome back to the course. Please remember to like and subscribe, and check the "
+               "slides linked in the description before the next lecture on Thursday.")
+
+
+def _distinct(n: int, words: int = 60, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(5000)]
+    return [" ".join(rng.choices(vocab, k=words)) for _ in range(n)]
+
+
+def test_repeated_boilerplate_is_dropped_and_distinct_chunks_kept():
+    distinct = _distinct(20)
+    chunks = []
+    for i, text in enumerate(distinct):
+        chunks += [text, BOILERPLATE if i % 2 else BOILERPLATE.replace("Thursday", "Friday")]
+    stats = {}
+
+    kept = dedup.dedup_chunks(chunks, threshold=0.8, stats=stats)
+
+    assert kept[:2] == chunks[:2]                    # the first copy stands in for the rest
+    assert [c for c in kept if c not in (BOILERPLATE, chunks[1])] == distinct
+    assert stats["chunks"] == 40 and stats["duplicates"] == 19
+    assert stats["tokens_saved"] == stats["tokens"] - sum(len(c.split()) for c in kept)
+
+
+def test_chunk_objects_count_their_model_tokens():
+    chunks = [Chunk(BOILERPLATE, 0, 10, 57), Chunk(BOILERPLATE, 10, 20, 57), Chunk("Something else", 20, 30, 3)]
+    stats = {}
+
+    kept = dedup.dedup_chunks(chunks, threshold=0.8, stats=stats)
+
+    assert kept == [chunks[0], chunks[2]]
+    assert stats["tokens"] == 117 and stats["tokens_saved"] == 57
+
+
+def test_threshold_is_read_per_call(monkeypatch):
+    chunks = [BOILERPLATE, BOILERPLATE]
+    monkeypatch.setenv("DEDUP_JACCARD", "0")
+    assert dedup.dedup_chunks(chunks) == chunks
+    monkeypatch.setenv("DEDUP_JACCARD", "0.9")
+    assert dedup.dedup_chunks(chunks) == chunks[:1]
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.7, 0.8, 0.9])
+def test_bands_put_the_lsh_threshold_just_below_the_jaccard_threshold(threshold):
+    bands, rows = dedup._bands(threshold)
+    assert bands * rows == dedup.NUM_PERM
+    lsh = (1 / bands) ** (1 / rows)
+    assert lsh <= threshold
+    options = [(b, dedup.NUM_PERM // b) for b in range(1, dedup.NUM_PERM + 1) if dedup.NUM_PERM % b == 0]
+    assert all((1 / b) ** (1 / r) > threshold or (1 / b) ** (1 / r) <= lsh for b, r in options)
+    # Pairs a little above the threshold almost always share a bucket
+    assert 1 - (1 - min(1.0, threshold + 0.15) ** rows) ** bands > 0.95
+
+
+@pytest.mark.parametrize("n", [100, 400])
+def test_comparisons_stay_linear(n):
+    chunks = []
+    for text in _distinct(n, seed=n):
+        chunks += [text, BOILERPLATE]
+    stats = {}
+
+    dedup.dedup_chunks(chunks, threshold=0.8, stats=stats)
+
+    # Each boilerplate copy meets only the first one; distinct chunks meet (almost) nothing
+    assert stats["duplicates"] == n - 1
+    assert stats["comparisons"] <= 1.1 * n
+
+
+def test_stage_totals_price_the_skipped_tokens():
+    before = dedup.dedup_stats()["stages"].get("test", {"tokens_saved": 0})["tokens_saved"]
+    dedup.dedup_chunks([Chunk(BOILERPLATE, 0, 1, 100), Chunk(BOILERPLATE, 1, 2, 100)], stage="test")
+    dedup.record_cost("test", tokens=100, seconds=2.0)
+
+    stage = dedup.dedup_stats()["stages"]["test"]
+
+    assert stage["tokens_saved"] - before == 100
+    assert stage["seconds_saved"] == pytest.approx(stage["tokens_saved"] * 2.0 / 100)
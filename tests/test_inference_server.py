@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from modules.inference_server import InferenceServer
+from modules.model_registry import register_model
+
+
+def _load_echo():
+    def echo(texts, batch_size=None):
+        for text in texts:
+            if text.startswith("sleep:"):
+                time.sleep(float(text.split(":")[1]))
+        return [text.upper() for text in texts]
+    return echo
+
+
+# Workers import this module to find the loader, so it is registered at import time
+register_model("test-echo", _load_echo)
+
+
+@pytest.fixture
+def server():
+    s = InferenceServer(workers=1, max_wait_s=0.01)
+    yield s
+    s.shutdown()
+
+
+def _wait_busy(server, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while server._busy[0] is None:
+        assert time.monotonic() < deadline, "the batch never reached the worker"
+        time.sleep(0.01)
+
+
+def test_batches_run_in_the_worker(server):
+    futures = [server.submit("test-echo", t) for t in ("a", "b", "c")]
+
+    assert [f.result(timeout=60) for f in futures] == ["A", "B", "C"]
+    assert server.metrics()["models"]["test-echo"]["items"] == 3
+
+
+def test_killing_a_worker_mid_batch_fails_that_batch_and_restarts_it(server):
+    assert server.submit("test-echo", "warm").result(timeout=60) == "WARM"
+    hung = server.submit("test-echo", "sleep:30")
+    _wait_busy(server)
+    old = server._procs[0][0]
+
+    old.kill()
+
+    with pytest.raises(RuntimeError, match="test-echo inference worker"):
+        hung.result(timeout=10)
+    assert server.submit("test-echo", "again").result(timeout=60) == "AGAIN"
+    assert server._procs[0][0] is not old and server._busy == [None]
+
+
+def test_a_send_to_a_dead_worker_fails_fast(server):
+    assert server.submit("test-echo", "warm").result(timeout=60) == "WARM"
+    proc, conn = server._procs[0]
+    server._check_workers = lambda: None            # keep the restart path out of the way
+    proc.kill()
+    proc.join()
+
+    lost = server.submit("test-echo", "lost")
+
+    with pytest.raises(RuntimeError, match="unreachable"):
+        lost.result(timeout=5)
+    assert server._broken == {0} and server._busy == [None]
+    del server._check_workers
+    assert server.submit("test-echo", "again").result(timeout=60) == "AGAIN"
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+pytest.importorskip("scipy")
+
+from modules import keyterms
+from modules.keyterms import VERB_PAST, VERB_PRESENT, extract_terms
+
+LECTURE = ("Backpropagation computes the gradient of the loss. In this lecture we discuss gradient descent "
+           "and momentum. Stochastic gradient descent converges quickly, as the results shown below "
+           "suggest. A hidden layer learns features. ") * 30
+
+
+@pytest.mark.parametrize("method", ["tfidf", "textrank"])
+def test_no_phrase_holds_a_verb_or_ends_in_a_past_form(method):
+    terms = [t.lower() for t in extract_terms(LECTURE, top_k=20, method=method)]
+
+    assert "stochastic gradient descent" in terms and "hidden layer" in terms
+    for term in terms:
+        words = [keyterms._normalize(w) for w in term.split()]
+        assert not VERB_PRESENT.intersection(words), term
+        assert words[-1] not in VERB_PAST, term
+
+
+def test_unlisted_words_spread_through_a_long_text_rank_below_concentrated_ones():
+    rng = random.Random(0)
+    filler = [f"filler{i}" for i in range(3000)]
+    paragraphs = []
+    for i in range(40):                                   # 40 chunks of IDF_CHUNK_TOKENS
+        words = rng.choices(filler, k=keyterms.IDF_CHUNK_TOKENS - 10)
+        words[::24] = ["basically"] * 10                  # 400 times, in every chunk
+        if i < 4:
+            words[5::12] = ["eigenvalue"] * 20            # 80 times, in four chunks
+        paragraphs.append(" ".join(words) + ".")
+
+    terms = extract_terms(" ".join(paragraphs), top_k=5)
+
+    assert terms[0] == "eigenvalue" and "basically" not in terms
+
+
+def test_short_texts_keep_the_background_idf():
+    ids, words, _ = keyterms._tokenize("Eigenvalue decomposition of a matrix. " * 10)
+    background = keyterms.get_background()
+
+    idf = keyterms._word_idf(ids, words, background)
+
+    assert list(idf) == [background[w] for w in words]
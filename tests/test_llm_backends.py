@@ -0,0 +1,226 @@
+import json
+import re
+import time
+
+import pytest
+
+pytest.importorskip("jsonschema")
+pytest.importorskip("scipy")
+
+from modules import chunker, llm_backends, llm_client, quiz_generator, vocab_helper
+from modules.llm_backends import LLMBackend, LocalSeq2SeqBackend, Router
+from modules.qa_engine import ask_library_stream
+from modules.study_plan import generate_study_plan, generate_study_plan_stream
+
+
+class FakeBackend(LLMBackend):
+    """Answers each app prompt with a well-formed reply, like a JSON-capable model would."""
+
+    def __init__(self, name: str = "fake", reply=None):
+        self.name = name
+        self.reply = reply
+        self.prompts = []
+
+    def complete(self, messages, model, temperature, max_tokens) -> str:
+        prompt = llm_backends._prompt_text(messages)
+        self.prompts.append(prompt)
+        if self.reply is not None:
+            return self.reply
+        if "For each term below" in prompt:
+            terms = [json.loads(t) for t in re.findall(r'^\s*\d+\. ("(?:[^"\\]|\\.)*"):', prompt, re.M)]
+            return json.dumps([{
+                "term": t,
+                "mcq": {"question": f"What is {t}?", "options": [t, "b", "c", "d"], "answer": t},
+                "fill_blank": {"question": f"____ is {t}", "answer": t},
+            } for t in terms])
+        if "multiple-choice question for the term" in prompt:
+            return json.dumps({"question": "What is it?", "options": ["a", "b", "c", "d"], "answer": "a"})
+        if "fill-in-the-blank question" in prompt:
+            return json.dumps({"question": "____ is used for ...", "answer": "term"})
+        if "technical terms or domain-specific keywords" in prompt:
+            return json.dumps(["entropy", "gradient descent"])
+        return "Day 1: read. Day 2: practise."
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """The process router with its state restored afterwards, and an empty completion cache."""
+    r = llm_backends.get_router()
+    saved = (dict(r.backends), dict(r.routes), r.pinned, dict(r._stats), dict(r._down_until))
+    r._stats.clear()
+    r._down_until.clear()
+    llm_client.clear_cache()
+    # No tokenizer download: count OpenAI tokens as words
+    words = chunker.get_token_counter("words")
+    monkeypatch.setattr(chunker, "get_token_counter", lambda name="words": words)
+    monkeypatch.setattr(vocab_helper, "get_token_counter", lambda name="words": words)
+    yield r
+    r.backends, r.routes, r.pinned = saved[0], saved[1], saved[2]
+    r._stats.clear()
+    r._stats.update(saved[3])
+    r._down_until.clear()
+    r._down_until.update(saved[4])
+    llm_client.clear_cache()
+
+
+def test_app_flows_run_on_a_pinned_backend(router):
+    fake = FakeBackend()
+    llm_backends.register_backend(fake, pin=True)
+
+    mcq = quiz_generator.generate_mcq("entropy", "a measure of disorder")
+    assert mcq["options"] == ["a", "b", "c", "d"]
+    assert quiz_generator.generate_fill_blank("entropy", "a measure of disorder")["answer"] == "term"
+
+    vocab = {"entropy": "a measure of disorder", "enthalpy": "heat content"}
+    mcqs, blanks = quiz_generator.generate_quiz_batch(vocab)
+    assert [m["answer"] for m in mcqs] == ["entropy", "enthalpy"]
+    assert [b["answer"] for b in blanks] == ["entropy", "enthalpy"]
+
+    assert generate_study_plan("thermodynamics").startswith("Day 1")
+    stats = {}
+    assert "".join(generate_study_plan_stream("thermodynamics", stats=stats)).startswith("Day 1")
+    assert stats["backend"] == "fake"
+
+    text = "Entropy and gradient descent. " * 20
+    assert vocab_helper.extract_key_terms(text, top_k=2, mode="single") == ["entropy", "gradient descent"]
+
+    hits = [{"title": "Notes", "start": 0, "end": 7, "text": "Entropy"}]
+    assert "".join(ask_library_stream("What is entropy?", hits)).startswith("Day 1")
+
+    assert {s["backend"] for s in router.stats()} == {"fake"}
+    assert not any(s["failures"] for s in router.stats())
+
+
+def test_invalid_reply_falls_back_and_is_not_cached(router):
+    bad, good = FakeBackend("bad", reply="Sure! Here is your question."), FakeBackend("good")
+    llm_backends.register_backend(bad)
+    llm_backends.register_backend(good)
+    router.routes["mcq"] = ("bad", "good")
+
+    mcq = quiz_generator.generate_mcq("entropy", "a measure of disorder")
+
+    assert mcq["answer"] == "a"
+    assert len(bad.prompts) == len(good.prompts) == 1
+    failures = {s["backend"]: s["failures"] for s in router.stats()}
+    assert failures == {"bad": 1, "good": 0}
+    # Both fakes share a cache id, so only the valid reply may sit under it
+    messages = [{"role": "user", "content": bad.prompts[0]}]
+    assert json.loads(llm_client._cache.get(llm_client.cache_key("gpt-3.5-turbo", messages, 0.4, 300)))
+
+
+def test_pinned_backend_gets_json_errors_not_garbage(router):
+    llm_backends.register_backend(FakeBackend("local", reply="entropy, gradient descent"), pin=True)
+
+    mcq = quiz_generator.generate_mcq("entropy", "a measure of disorder")
+
+    assert mcq["question"].startswith("❌") and mcq["options"] == []
+
+
+def test_oversized_prompts_go_to_the_local_backend_last():
+    local = LocalSeq2SeqBackend()
+    remote = FakeBackend("openai")
+    r = Router({"openai": remote, "local": local})
+
+    assert r.candidates("qa", 10_000) == [remote, local]
+    assert r.candidates("mcq", 10_000) == [remote]
+    assert Router({"local": local}, pinned="local").candidates("qa", 10_000) == [local]
+
+
+def test_local_backend_keeps_head_and_tail_of_a_long_prompt():
+    local = LocalSeq2SeqBackend()
+    words = [f"w{i}" for i in range(2000)]
+    fitted = local.fit_prompt([{"role": "user", "content": " ".join(words)}]).split()
+
+    budget = int(local.max_prompt_tokens / 1.3)
+    assert len(fitted) == budget + 1                     # plus the "…" marker
+    assert fitted[0] == "w0" and fitted[-1] == "w1999"
+    assert llm_backends.approx_tokens([{"content": " ".join(fitted)}]) <= local.max_prompt_tokens + 2
+
+
+def test_quiz_batch_caches_only_fully_valid_replies(router):
+    class FlakyFirstReply(FakeBackend):
+        def complete(self, messages, model, temperature, max_tokens):
+            reply = json.loads(super().complete(messages, model, temperature, max_tokens))
+            if len(self.prompts) == 1:
+                reply[1]["mcq"]["options"] = reply[1]["mcq"]["options"][:3]    # one broken item
+            return json.dumps(reply)
+
+    fake = FlakyFirstReply()
+    llm_backends.register_backend(fake, pin=True)
+    vocab = {"entropy": "a measure of disorder", "enthalpy": "heat content"}
+
+    mcqs, blanks = quiz_generator.generate_quiz_batch(vocab)
+    assert [b["answer"] for b in blanks] == ["entropy", "enthalpy"]
+    assert len(fake.prompts) == 2                       # the whole batch, then just "enthalpy"
+
+    # The broken reply was not cached; the retry's reply was
+    mcqs, blanks = quiz_generator.generate_quiz_batch(vocab)
+    assert [m["answer"] for m in mcqs] == ["entropy", "enthalpy"]
+    assert len(fake.prompts) == 3
+    quiz_generator.generate_quiz_batch({"enthalpy": "heat content"})
+    assert len(fake.prompts) == 3
+
+
+def test_stream_skips_a_cached_reply_that_fails_validation(router):
+    fake = FakeBackend(reply='{"ok": true}')
+    llm_backends.register_backend(fake, pin=True)
+    messages = [{"role": "user", "content": "Give me JSON"}]
+    llm_client._cache.set(llm_client.cache_key("gpt-3.5-turbo", messages, 0.3, 350), "Sure! Here it is.")
+
+    text = "".join(llm_client.stream_chat_completion(messages, validate=json.loads))
+
+    assert text == '{"ok": true}' and len(fake.prompts) == 1
+
+
+def test_quiz_batches_run_concurrently(router):
+    class SlowBackend(FakeBackend):
+        def complete(self, messages, model, temperature, max_tokens):
+            time.sleep(0.3)
+            return super().complete(messages, model, temperature, max_tokens)
+
+    llm_backends.register_backend(SlowBackend(), pin=True)
+    vocab = {f"term{i}": f"definition {i}" for i in range(8)}
+
+    start = time.perf_counter()
+    mcqs, _ = quiz_generator.generate_quiz_batch(vocab, batch_size=2, max_concurrency=4)
+
+    assert [m["answer"] for m in mcqs] == list(vocab)
+    assert time.perf_counter() - start < 0.6          # four 0.3 s batches side by side, not 1.2 s
+
+
+def test_per_term_quiz_keeps_the_order_of_vocab(router):
+    llm_backends.register_backend(FakeBackend(), pin=True)
+    vocab = {"entropy": "a measure of disorder", "enthalpy": "heat content"}
+
+    mcqs, blanks = quiz_generator.generate_quiz_for_terms(vocab)
+
+    assert [m["answer"] for m in mcqs] == ["a", "a"]
+    assert [b["answer"] for b in blanks] == ["term", "term"]
+
+
+def test_definitions_go_local_first_and_follow_latency():
+    local = LocalSeq2SeqBackend()
+    remote = FakeBackend("openai")
+    r = Router({"openai": remote, "local": local})
+
+    assert r.candidates("definition", 20) == [local, remote]
+    assert r.candidates("mcq", 20) == [remote]
+
+    r.record(local, "definition", 0.9)
+    r.record(remote, "definition", 0.1)               # over 3x faster: promoted
+    assert r.candidates("definition", 20) == [remote, local]
+
+    r.record(remote, "definition", 2.0)               # EWMA 480 ms: no longer 3x faster
+    assert r.candidates("definition", 20) == [local, remote]
+
+
+def test_vocab_explanations_take_the_definition_route(router):
+    local, remote = FakeBackend("local", reply=" A measure of disorder. "), FakeBackend("openai")
+    llm_backends.register_backend(local)
+    llm_backends.register_backend(remote)
+    router.pinned = None
+
+    explanations = vocab_helper.get_vocab_explanations(["negentropy", "exergy"])
+
+    assert explanations == {"negentropy": "A measure of disorder.", "exergy": "A measure of disorder."}
+    assert len(local.prompts) == 2 and not remote.prompts
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("feedparser")
+pytest.importorskip("cachetools")
+
+from modules import resource_recommender as rr
+
+ATOM = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry><title>{q} paper</title><summary>About {q}.</summary>
+    <link href="http://arxiv.test/{q}"/><id>http://arxiv.test/{q}</id></entry>
+</feed>"""
+
+
+class Stub:
+    """
+    Local stand-in for Wikipedia, arXiv and SerpAPI; `fail` / `slow` hold
+    source names. A slow source trickles its reply over SLOW_S seconds: no
+    single read times out, but the reply lands well past any deadline.
+    """
+    SLOW_S = 1.5
+
+    def __init__(self):
+        self.hits = Counter()
+        self.fail, self.slow = set(), set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                source = url.path.split("/")[1]
+                params = urllib.parse.parse_qs(url.query)
+                query = (urllib.parse.unquote(url.path.split("/", 2)[2]) if source == "wikipedia"
+                         else params.get("q", params.get("search_query", [""]))[0].removeprefix("all:"))
+                stub.hits[(source, query)] += 1
+                if source in stub.fail:
+                    return self._send(500, "text/plain", "boom")
+                if source == "wikipedia":
+                    body = json.dumps({"extract": f"{query} summary",
+                                       "content_urls": {"desktop": {"page": f"http://wiki.test/{query}"}}})
+                    return self._send(200, "application/json", body)
+                if source == "arxiv":
+                    return self._send(200, "application/atom+xml", ATOM.format(q=query))
+                body = json.dumps({"organic_results": [
+                    {"title": f"{query} scholar", "snippet": "s", "link": f"http://scholar.test/{query}"}]})
+                self._send(200, "application/json", body)
+
+            def _send(self, status, kind, body):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                source = urllib.parse.urlparse(self.path).path.split("/")[1]
+                pieces = 15 if source in stub.slow else 1
+                step = -(-len(data) // pieces)
+                try:
+                    for i in range(0, len(data), step):
+                        if pieces > 1:
+                            time.sleep(stub.SLOW_S / pieces)
+                        self.wfile.write(data[i:i + step])
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass                             # the client gave up at its deadline
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    s = Stub()
+    saved = dict(rr.SOURCE_URLS)
+    rr.configure(source_urls={"wikipedia": f"{s.base}/wikipedia/",
+                              "arxiv": f"{s.base}/arxiv",
+                              "scholar": f"{s.base}/scholar"})
+    yield s
+    s.server.shutdown()
+    rr.configure(source_urls=saved)
+
+
+def test_fetch_resources_queries_every_source(stub):
+    result = rr.fetch_resources("entropy")
+
+    assert result["wikipedia"] == {"summary": "entropy summary", "link": "http://wiki.test/entropy"}
+    assert [p["source"] for p in result["papers"]] == ["arXiv", "Google Scholar"]
+    assert result["timed_out"] == []
+    assert stub.hits == Counter({(s, "entropy"): 1 for s in ("wikipedia", "arxiv", "scholar")})
+
+
+def test_bulk_fans_out_once_per_term_and_source(stub):
+    results = rr.fetch_resources_bulk(["a", "b", "c", "a"])
+
+    assert list(results) == ["a", "b", "c"]
+    assert all(r["wikipedia"]["summary"] == f"{t} summary" for t, r in results.items())
+    assert sum(stub.hits.values()) == 9 and set(stub.hits.values()) == {1}
+
+
+def test_results_are_cached_until_configure(stub):
+    rr.fetch_resources("entropy")
+    rr.fetch_resources("entropy")
+    assert sum(stub.hits.values()) == 3
+
+    rr.configure()                                   # clears the cache
+    rr.fetch_resources("entropy")
+    assert sum(stub.hits.values()) == 6
+
+
+def test_cached_results_expire_after_ttl(stub, monkeypatch):
+    monkeypatch.setattr(rr, "_cache", rr.TTLCache(maxsize=16, ttl=0.2))
+    rr.fetch_resources("entropy")
+    time.sleep(0.3)
+    rr.fetch_resources("entropy")
+    assert stub.hits[("wikipedia", "entropy")] == 2
+
+
+def test_failed_source_falls_back_and_is_retried(stub):
+    stub.fail.add("scholar")
+    stub.fail.add("wikipedia")
+    result = rr.fetch_resources("entropy")
+
+    assert result["wikipedia"]["summary"] == "Wikipedia search failed."
+    assert [p["source"] for p in result["papers"]] == ["arXiv"]
+
+    stub.fail.clear()                                # failures were not cached
+    result = rr.fetch_resources("entropy")
+    assert result["wikipedia"]["summary"] == "entropy summary"
+    assert stub.hits[("scholar", "entropy")] == 2 and stub.hits[("arxiv", "entropy")] == 1
+
+
+def test_slow_source_is_dropped_at_its_deadline(stub, monkeypatch):
+    monkeypatch.setitem(rr.SOURCE_DEADLINES, "arxiv", 0.3)
+    stub.slow.add("arxiv")
+    started = time.monotonic()
+    result = rr.fetch_resources("entropy")
+
+    assert time.monotonic() - started < 0.9
+    assert result["timed_out"] == ["arxiv"]
+    assert result["wikipedia"] == {"summary": "entropy summary", "link": "http://wiki.test/entropy"}
+    assert [p["source"] for p in result["papers"]] == ["Google Scholar"]
@@ -0,0 +1,141 @@
+import shutil
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from modules import transcriber
+from modules.transcriber import SAMPLE_RATE
+
+BLOCK = int(2.0 * SAMPLE_RATE)
+
+
+class StubWhisper:
+    """Transcribes any audio as one segment spanning all of it, and remembers what it saw."""
+
+    def __init__(self):
+        self.seen = []
+
+    def transcribe(self, audio, **kwargs):
+        self.seen.append(len(audio))
+        return {"segments": [{"start": 0.0, "end": len(audio) / SAMPLE_RATE, "text": f"{len(audio)}"}]}
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    model = StubWhisper()
+    monkeypatch.setattr(transcriber, "get_model", lambda name: model)
+    monkeypatch.setenv("WHISPER_WORKERS", "1")
+    return model
+
+
+def _speech(seconds: float, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, 0.3, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+
+def _blocks(audio: np.ndarray):
+    for i in range(0, len(audio), BLOCK):
+        yield audio[i:i + BLOCK]
+
+
+def test_continuous_speech_loses_nothing_at_window_edges(stub_model):
+    audio = _speech(40.0)
+
+    segments = list(transcriber.transcribe_stream(blocks=_blocks(audio)))
+
+    assert [s["start"] for s in segments] == sorted(s["start"] for s in segments)
+    assert segments[0]["start"] == 0.0 and segments[-1]["end"] == pytest.approx(40.0, abs=0.05)
+    for before, after in zip(segments, segments[1:]):
+        assert after["start"] == pytest.approx(before["end"], abs=0.05)    # no gap, no overlap
+    assert sum(stub_model.seen) == len(audio)
+    assert max(stub_model.seen) <= transcriber.MAX_SEGMENT_S * SAMPLE_RATE
+
+
+def test_speech_across_a_window_edge_is_kept_whole(stub_model):
+    audio = np.zeros(int(60 * SAMPLE_RATE), dtype=np.float32)
+    bursts = [(5.0, 12.0), (26.0, 36.0), (50.0, 55.0)]              # the second straddles 30 s
+    for i, (a, b) in enumerate(bursts):
+        audio[int(a * SAMPLE_RATE):int(b * SAMPLE_RATE)] = _speech(b - a, seed=i)
+
+    segments = list(transcriber.transcribe_stream(blocks=_blocks(audio)))
+
+    assert len(segments) == len(bursts)
+    for seg, (a, b) in zip(segments, bursts):
+        assert seg["start"] <= a and seg["end"] >= b
+        assert seg["end"] - seg["start"] < (b - a) + 1.0             # padding, not silence
+
+
+def test_windows_of_only_noise_are_not_speech(stub_model):
+    audio = np.random.default_rng(1).normal(0, 0.003, int(120 * SAMPLE_RATE)).astype(np.float32)   # -40 dB
+    speech = [(0.0, 20.0), (110.0, 120.0)]
+    for i, (a, b) in enumerate(speech):
+        audio[int(a * SAMPLE_RATE):int(b * SAMPLE_RATE)] = _speech(b - a, seed=i)
+
+    segments = list(transcriber.transcribe_stream(blocks=_blocks(audio)))
+
+    assert segments
+    for seg in segments:
+        assert any(seg["start"] < b and seg["end"] > a for a, b in speech), seg
+
+
+def test_stopping_early_closes_the_decoder(stub_model, monkeypatch):
+    closed, decoders = [], []
+
+    def pcm(source, headers=None):
+        try:
+            yield from _blocks(_speech(120.0))
+        finally:
+            closed.append(source)
+
+    def iter_pcm(source, headers=None):
+        decoders.append(pcm(source, headers))       # held here, so only an explicit close() ends it
+        return decoders[-1]
+
+    monkeypatch.setattr(transcriber, "iter_pcm", iter_pcm)
+    stream = transcriber.transcribe_stream("media://stream")
+    next(stream)
+
+    stream.close()
+
+    assert closed == ["media://stream"]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_iter_pcm_decodes_a_wav_in_blocks(tmp_path):
+    audio = _speech(5.0)
+    path = tmp_path / "speech.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+
+    blocks = list(transcriber.iter_pcm(str(path), block_s=1.0))
+
+    assert len(blocks) >= 5
+    assert sum(len(b) for b in blocks) == len(audio)
+    assert np.abs(np.concatenate(blocks) - audio).max() < 1e-3
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_iter_pcm_reports_ffmpeg_errors(tmp_path):
+    path = tmp_path / "broken.wav"
+    path.write_bytes(b"not audio")
+    with pytest.raises(RuntimeError, match="ffmpeg failed"):
+        list(transcriber.iter_pcm(str(path)))
+
+
+def test_youtube_without_transcript_streams_partials(stub_model, monkeypatch):
+    input_processor = pytest.importorskip("modules.input_processor")
+    audio = _speech(70.0)
+    monkeypatch.setattr(input_processor, "_yt_transcript", lambda url: None)
+    monkeypatch.setattr(input_processor, "_audio_stream", lambda url: ("media://stream", {}))
+    monkeypatch.setattr(transcriber, "iter_pcm", lambda source, headers=None: _blocks(audio))
+    partials = []
+
+    text = input_processor.handle_input(youtube_url="https://www.youtube.com/watch?v=streamtest01",
+                                        on_partial=partials.append)
+
+    assert len(partials) > 1
+    assert text == " ".join(partials)